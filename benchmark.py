@@ -0,0 +1,478 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tkinter as tk
+from tkinter import filedialog, messagebox
+from types import SimpleNamespace
+
+from text_editor import TextEditor, FindWindow
+from headless import HeadlessEditor
+from large_file import LARGE_FILE_SIZE
+
+# version of the results file : a baseline of another version is not compared
+RESULTS_VERSION = 1
+
+# the document sizes measured by default ; 1G can be asked for with --sizes
+DEFAULT_SIZES = '1K,64K,1M,16M'
+UNITS = {'K' : 1024, 'M' : 1024 ** 2, 'G' : 1024 ** 3}
+
+# the word the find benchmarks look for, put in one line out of NEEDLE_EVERY
+NEEDLE = 'needle'
+NEEDLE_EVERY = 40
+
+# number of commands run by one measure of a benchmark (find steps, dd, Ctrl + Backspace ...)
+OPERATIONS = 100
+# number of tabs opened by one measure of new_tab
+TABS = 10
+
+# a benchmark is slower than its baseline when its median grows by more than the tolerance
+# and by more than this (seconds) : the smallest ones are mostly noise
+MIN_DIFFERENCE = 0.005
+
+WORDS = ('lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit', 'sed', 'do',
+         'eiusmod', 'tempor', 'incididunt', 'ut', 'labore', 'et', 'dolore', 'magna', 'aliqua',
+         'self.value', 'return', 'x = 1;', '(a, b)', '[i]', '{key: 42}', '#', '->', '"text"')
+
+
+def parse_size(text):
+    """'64K' -> 65536"""
+    text = text.strip().upper()
+    if text[-1:] in UNITS:
+        return int(text[:-1]) * UNITS[text[-1]]
+    return int(text)
+
+
+def make_block(seed = 0, size = 1024 ** 2):
+    """return: about 'size' characters of synthetic source-like lines, always the same for a seed"""
+    generator = random.Random(seed)
+    lines = []
+    length = 0
+    while length < size:
+        count = generator.randint(0, 14)
+        line = ' ' * (4 * generator.randint(0, 3)) + ' '.join(generator.choice(WORDS) for _ in range(count))
+        if generator.randrange(NEEDLE_EVERY) == 0:
+            line += ' ' + NEEDLE
+        lines.append(line)
+        length += len(line) + 1
+    return '\n'.join(lines) + '\n'
+
+
+def make_document(directory, size, seed = 0):
+    """Writes a synthetic document of 'size' bytes (cut at the end of a line) in 'directory' ;
+    a document already there is reused, the content only depends on the size and the seed
+    return: its path"""
+    path = os.path.join(directory, f"document-{size}-{seed}.txt")
+    if os.path.exists(path) and os.path.getsize(path) == size:
+        return path
+    block = make_block(seed, min(size, 1024 ** 2))
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding = 'utf-8') as f:
+        written = 0
+        # big documents repeat the block, streamed so 1G never is in memory
+        while written + len(block) <= size:
+            f.write(block)
+            written += len(block)
+        rest = block[:size - written]
+        # the last line is cut at its end, the size is padded with a short line of spaces
+        cut = rest.rfind('\n') + 1
+        f.write(rest[:cut])
+        if size - written - cut > 0:
+            f.write(' ' * (size - written - cut - 1) + '\n')
+    os.replace(temp_path, path)
+    return path
+
+
+def key_event(key):
+    """return: what VimEditor.on_key reads of a tk key event, for one character key"""
+    return SimpleNamespace(keysym = key, char = key, state = 0)
+
+
+class HeadlessBackend():
+    """Runs the benchmarks on the headless core (HeadlessText over the TextBuffer) : no display needed"""
+    name = 'headless'
+
+    def __init__(self):
+        # the word commands of the editor only use the widget of their event
+        self.editor = TextEditor.__new__(TextEditor)
+
+    def open(self, path):
+        """load_file : return the tab holding the file"""
+        return HeadlessEditor(path)
+
+    def new_tab(self):
+        return HeadlessEditor()
+
+    def close(self, tab):
+        pass
+
+    def editable(self, tab):
+        return True
+
+    def text(self, tab):
+        return tab.text
+
+    def buffer(self, tab):
+        return tab.buffer
+
+    def vim(self, tab):
+        return tab.vim
+
+    def save(self, tab, path):
+        tab.path = path
+        tab.save()
+
+    def find(self, tab, query, backwards):
+        """the plain search of FindWindow.find : from the cursor, in the buffer"""
+        text = tab.text
+        buffer = tab.buffer
+        cursor = buffer.offset(*map(int, text.index('insert').split('.')))
+        if backwards:
+            found = buffer.table.rfind(query, 0, cursor)
+        else:
+            found = buffer.table.find(query, cursor)
+        if found != -1:
+            text.mark_set('insert', buffer.index(found if backwards else found + len(query)))
+
+    def settle(self):
+        pass
+
+    def finish(self):
+        pass
+
+
+class GuiBackend():
+    """Runs the benchmarks on a TextEditor window : on the display of $DISPLAY, or on a virtual one
+    (Xvfb, through the xvfbwrapper package) when there is none"""
+    name = 'gui'
+
+    def __init__(self):
+        self.xvfb = None
+        if not os.environ.get('DISPLAY'):
+            try:
+                from xvfbwrapper import Xvfb
+            except ImportError:
+                raise SystemExit("benchmark.py: the gui backend needs a display ($DISPLAY) or the "
+                                 "xvfbwrapper package and Xvfb")
+            self.xvfb = Xvfb(width = 1280, height = 800)
+            self.xvfb.start()
+        # 'Word not found' would wait for a click : the warnings are dropped while measuring
+        self.showwarning = messagebox.showwarning
+        messagebox.showwarning = lambda *args, **options: None
+        self.root = tk.Tk()
+        self.editor = TextEditor(self.root)
+        # one Find window per tab, created outside of the measures
+        self.finders = {}
+        self.settle()
+
+    def current(self):
+        return self.editor.notebook.nametowidget(self.editor.notebook.select())
+
+    def open(self, path):
+        """load_file in a new tab, the file dialog answering 'path' ; return the tab once loaded"""
+        self.editor.new_tab()
+        frame = self.current()
+        dialog = filedialog.askopenfilename
+        filedialog.askopenfilename = lambda **options: path
+        try:
+            self.editor.load_file()
+        finally:
+            filedialog.askopenfilename = dialog
+        while frame in self.editor.loaders:
+            self.root.update()
+        return frame
+
+    def new_tab(self):
+        self.editor.new_tab()
+        return self.current()
+
+    def close(self, frame):
+        finder = self.finders.pop(frame, None)
+        if finder is not None:
+            finder.close()
+        self.editor.destroy_tab(frame)
+        self.settle()
+
+    def editable(self, frame):
+        # large file mode is read-only
+        return frame not in self.editor.viewers
+
+    def text(self, frame):
+        return self.editor.tabs[frame]
+
+    def buffer(self, frame):
+        return self.editor.buffers[frame]
+
+    def vim(self, frame):
+        return self.editor.add_controller(frame)
+
+    def save(self, frame, path):
+        self.editor.notebook.select(frame)
+        self.editor.file_paths[frame] = path
+        job = self.editor.save_file()
+        job.wait()
+        while frame in self.editor.saving:
+            self.root.update()
+
+    def finder(self, frame, query):
+        """return: the Find window of a tab, searching for 'query'"""
+        if frame not in self.finders:
+            self.finders[frame] = FindWindow(self.root, self.text(frame), self.buffer(frame),
+                                             view = self.editor.viewers.get(frame),
+                                             status_label = self.editor.status_bar)
+        finder = self.finders[frame]
+        if finder.entry.get() != query:
+            finder.entry.delete(0, 'end')
+            finder.entry.insert(0, query)
+        return finder
+
+    def find(self, frame, query, backwards):
+        finder = self.finders[frame]
+        if backwards:
+            finder.find_prev()
+        else:
+            finder.find_next()
+
+    def settle(self):
+        """lets tk draw what the last commands changed"""
+        self.root.update()
+
+    def finish(self):
+        for frame in list(self.finders):
+            self.finders.pop(frame).close()
+        self.editor.close_journals()
+        self.root.destroy()
+        messagebox.showwarning = self.showwarning
+        if self.xvfb is not None:
+            self.xvfb.stop()
+
+
+def measure(backend, run, setup = None, cleanup = None, repeat = 3):
+    """times run(state) 'repeat' times, state being what setup() returns ; cleanup(state) is not timed
+    return: the list of the durations (seconds)"""
+    durations = []
+    for _ in range(repeat):
+        state = setup() if setup is not None else None
+        start = time.perf_counter()
+        run(state)
+        backend.settle()
+        durations.append(time.perf_counter() - start)
+        if cleanup is not None:
+            cleanup(state)
+    return durations
+
+
+def restore(backend, tab):
+    """undoes the edits of a benchmark : every measure starts from the loaded file"""
+    text = backend.text(tab)
+    buffer = backend.buffer(tab)
+    while buffer.dirty:
+        try:
+            text.edit_undo()
+        except tk.TclError:
+            break
+    text.mark_set('insert', '1.0')
+    backend.vim(tab).enter_normal()
+
+
+def go_to_middle(backend, tab):
+    """puts the cursor at the end of the middle line of the document"""
+    text = backend.text(tab)
+    middle = int(text.index('end-1c').split('.')[0]) // 2 or 1
+    text.mark_set('insert', f"{middle}.0 lineend")
+
+
+def type_keys(backend, tab, keys, times = 1):
+    """sends keys one event at a time to the vim key handler, as tk does when they are typed"""
+    vim = backend.vim(tab)
+    events = [key_event(key) for key in keys]
+    for _ in range(times):
+        for event in events:
+            vim.on_key(event)
+
+
+def bench_document(backend, path, repeat, only, output_dir):
+    """runs the benchmarks of one document ; return: {benchmark : durations | None (not measured)}"""
+    results = {}
+
+    def wanted(name):
+        return not only or name in only
+
+    # load_file : every measure loads in a new tab, the last one is kept for the next benchmarks
+    tabs = []
+    def load(state):
+        tabs.append(backend.open(path))
+    def close_previous(state):
+        while len(tabs) > 1:
+            backend.close(tabs.pop(0))
+    results['load_file'] = measure(backend, load, cleanup = close_previous, repeat = repeat if wanted('load_file') else 1)
+    if not wanted('load_file'):
+        del results['load_file']
+    tab = tabs[-1]
+
+    if wanted('save_file'):
+        saved = os.path.join(output_dir, 'saved-' + os.path.basename(path))
+        results['save_file'] = measure(backend, lambda state: backend.save(tab, saved), repeat = repeat)
+        os.remove(saved)
+
+    editable = backend.editable(tab)
+    text = backend.text(tab)
+    vim = backend.vim(tab)
+    vim.enable()
+
+    def at_start():
+        text.mark_set('insert', '1.0')
+    def at_end():
+        text.mark_set('insert', 'end-1c')
+    def find_setup(position):
+        def setup():
+            position()
+            if isinstance(backend, GuiBackend):
+                backend.finder(tab, NEEDLE)
+        return setup
+
+    benchmarks = {
+        # Find window : next / previous match of a plain word, OPERATIONS times
+        'find_next' : (lambda state: [backend.find(tab, NEEDLE, False) for _ in range(OPERATIONS)],
+                       find_setup(at_start), None, False),
+        'find_prev' : (lambda state: [backend.find(tab, NEEDLE, True) for _ in range(OPERATIONS)],
+                       find_setup(at_end), None, False),
+        # Ctrl + Backspace in the middle of the document
+        'delete_whole_word' : (
+            lambda state: [backend.editor.delete_whole_word(SimpleNamespace(widget = text)) for _ in range(OPERATIONS)],
+            lambda: go_to_middle(backend, tab), lambda state: restore(backend, tab), True),
+        # vim normal mode : one key event at a time through VimEditor.on_key
+        'vim_motions' : (lambda state: type_keys(backend, tab, 'jjjjwwwwkkkkbbbb', OPERATIONS // 4),
+                         lambda: go_to_middle(backend, tab), None, False),
+        'vim_dd' : (lambda state: type_keys(backend, tab, 'dd', OPERATIONS),
+                    lambda: go_to_middle(backend, tab), lambda state: restore(backend, tab), True),
+        'vim_yy' : (lambda state: type_keys(backend, tab, 'yyj', OPERATIONS),
+                    lambda: go_to_middle(backend, tab), None, False),
+        'vim_p' : (lambda state: type_keys(backend, tab, 'p', OPERATIONS),
+                   lambda: (go_to_middle(backend, tab), type_keys(backend, tab, 'yy')),
+                   lambda state: restore(backend, tab), True),
+    }
+    for name, (run, setup, cleanup, edits) in benchmarks.items():
+        if not wanted(name):
+            continue
+        # large file mode : the tab cannot be edited, nor searched by the Find window's Find Next
+        if not editable:
+            results[name] = None
+            continue
+        results[name] = measure(backend, run, setup, cleanup, repeat)
+
+    if wanted('new_tab'):
+        opened = []
+        def open_tabs(state):
+            opened.extend(backend.new_tab() for _ in range(TABS))
+        def close_tabs(state):
+            while opened:
+                backend.close(opened.pop())
+        results['new_tab'] = measure(backend, open_tabs, cleanup = close_tabs, repeat = repeat)
+
+    vim.disable()
+    backend.close(tab)
+    return results
+
+
+def summarize(durations):
+    if durations is None:
+        return None
+    return {'min' : min(durations), 'median' : statistics.median(durations), 'runs' : durations}
+
+
+def run_benchmarks(backend, sizes, repeat, only, data_dir, verbose = True):
+    """return: the results, as written to the JSON file"""
+    results = {}
+    for label in sizes:
+        size = parse_size(label)
+        path = make_document(data_dir, size)
+        if verbose:
+            print(f"{label} ({os.path.getsize(path)} bytes) :", file = sys.stderr)
+        measured = bench_document(backend, path, repeat, only, data_dir)
+        results[label] = {name : summarize(durations) for name, durations in measured.items()}
+        if verbose:
+            for name, summary in results[label].items():
+                shown = 'skipped' if summary is None else f"{summary['median'] * 1000:10.2f} ms"
+                print(f"  {name:<20} {shown}", file = sys.stderr)
+    return {
+        'version' : RESULTS_VERSION,
+        'backend' : backend.name,
+        'python' : platform.python_version(),
+        'tk' : tk.TkVersion,
+        'platform' : platform.platform(),
+        'repeat' : repeat,
+        'operations' : OPERATIONS,
+        'large_file_size' : LARGE_FILE_SIZE,
+        'results' : results,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """return: the list of (size, benchmark, baseline median, median) that got slower than the
+    baseline ; raises ValueError if the two were not measured the same way"""
+    for key in ('version', 'backend', 'operations'):
+        if results.get(key) != baseline.get(key):
+            raise ValueError(f"the baseline was measured with another {key} "
+                             f"({baseline.get(key)} instead of {results.get(key)})")
+    slower = []
+    for label, measured in results['results'].items():
+        for name, summary in measured.items():
+            reference = baseline['results'].get(label, {}).get(name)
+            if summary is None or reference is None:
+                continue
+            before, after = reference['median'], summary['median']
+            if after > before * (1 + tolerance) and after - before > MIN_DIFFERENCE:
+                slower.append((label, name, before, after))
+    return slower
+
+
+def main(argv = None):
+    """python benchmark.py [--backend gui] [--sizes 1K,1M,1G] [-o results.json] [--baseline base.json]"""
+    parser = argparse.ArgumentParser(description = 'Times the editor operations on synthetic documents.')
+    parser.add_argument('--backend', choices = ('headless', 'gui'), default = 'headless',
+                        help = "headless : no display needed ; gui : a TextEditor window ($DISPLAY or Xvfb)")
+    parser.add_argument('--sizes', default = DEFAULT_SIZES, help = f"document sizes (default {DEFAULT_SIZES})")
+    parser.add_argument('--repeat', type = int, default = 3, help = "measures per benchmark (the median is kept)")
+    parser.add_argument('--only', default = '', help = "comma separated benchmarks to run (default : all)")
+    parser.add_argument('--data-dir', default = os.path.join(tempfile.gettempdir(), 'text_editor_benchmark'),
+                        help = "where the documents are generated (they are reused)")
+    parser.add_argument('-o', '--output', help = "write the results to this JSON file")
+    parser.add_argument('--baseline', help = "compare with the results of an earlier run (JSON file)")
+    parser.add_argument('--tolerance', type = float, default = 0.25,
+                        help = "slowdown allowed against the baseline (0.25 : 25%%)")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.data_dir, exist_ok = True)
+    only = set(filter(None, args.only.split(',')))
+    backend = GuiBackend() if args.backend == 'gui' else HeadlessBackend()
+    try:
+        results = run_benchmarks(backend, args.sizes.split(','), max(1, args.repeat), only, args.data_dir)
+    finally:
+        backend.finish()
+
+    if args.output:
+        with open(args.output, 'w', encoding = 'utf-8') as f:
+            json.dump(results, f, indent = 2)
+    if not args.baseline:
+        return 0
+
+    with open(args.baseline, 'r', encoding = 'utf-8') as f:
+        baseline = json.load(f)
+    try:
+        slower = compare(results, baseline, args.tolerance)
+    except ValueError as error:
+        print(f"benchmark.py: {error}", file = sys.stderr)
+        return 2
+    for label, name, before, after in slower:
+        print(f"SLOWER {label} {name}: {before * 1000:.2f} ms -> {after * 1000:.2f} ms", file = sys.stderr)
+    return 1 if slower else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
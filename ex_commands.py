@@ -0,0 +1,131 @@
+import re
+
+# one address of a range : a line number, '.' (current line), '$' (last line) or a mark ('<, '>),
+# followed by offsets (.+1, $-2)
+ADDRESS = r"(?:\d+|\.|\$|'[a-z<>])(?:\s*[+-]\s*\d*)*"
+
+# the range in front of an ex command : '%' (whole file) or one or two addresses
+RANGE = re.compile(rf"\s*(%|{ADDRESS}(?:\s*[,;]\s*{ADDRESS})?)?\s*")
+
+ADDRESS_PART = re.compile(r"(\d+|\.|\$|'[a-z<>])|([+-])\s*(\d*)")
+
+
+class ExError(Exception):
+    """An ex command that cannot run : the message is shown in the status bar"""
+
+
+def split_range(command):
+    """return: (range text, rest of the command) ; the range text is '' if there is none"""
+    match = RANGE.match(command)
+    return (match.group(1) or ''), command[match.end():]
+
+
+def resolve_address(text, current, last, marks):
+    """return: the line number an address stands for"""
+    line = None
+    for match in ADDRESS_PART.finditer(text):
+        base, sign, number = match.groups()
+        if base:
+            if base == '.':
+                line = current
+            elif base == '$':
+                line = last
+            elif base.startswith("'"):
+                if base[1] not in marks:
+                    raise ExError(f"Mark not set: {base}")
+                line = marks[base[1]]
+            else:
+                line = int(base)
+        else:
+            step = int(number) if number else 1
+            line = (current if line is None else line) + (step if sign == '+' else -step)
+    if line is None or line < 0 or line > last:
+        raise ExError(f"Invalid range: {text}")
+    return max(1, line)
+
+
+def parse_range(text, current, last, marks = None):
+    """return: (first line, last line) of a range ; the current line if there is no range"""
+    marks = marks or {}
+    if not text:
+        return current, current
+    if text == '%':
+        return 1, last
+    parts = re.split(r"\s*[,;]\s*", text, maxsplit = 1)
+    first = resolve_address(parts[0], current, last, marks)
+    end = resolve_address(parts[1], current, last, marks) if len(parts) > 1 else first
+    # a backwards range is turned around, like vim does after asking
+    return min(first, end), max(first, end)
+
+
+def split_pattern(argument, maxsplit = None):
+    """Splits '/pat/repl/flags' on its delimiter (the first character, any non-alphanumeric one).
+    An escaped delimiter stands for itself ; after 'maxsplit' parts the rest is kept as it is.
+    return: the list of the parts (missing trailing parts are not in the list)"""
+    if not argument:
+        raise ExError("Missing pattern")
+    delimiter = argument[0]
+    if delimiter.isalnum() or delimiter in ' \\"|':
+        raise ExError("Invalid delimiter")
+    parts = ['']
+    i = 1
+    while i < len(argument):
+        char = argument[i]
+        if char == '\\' and i + 1 < len(argument):
+            following = argument[i + 1]
+            # \/ : the delimiter itself ; other escapes stay for the regex
+            parts[-1] += following if following == delimiter else char + following
+            i += 2
+            continue
+        if char == delimiter:
+            if maxsplit is not None and len(parts) == maxsplit:
+                parts.append(argument[i + 1:])
+                break
+            parts.append('')
+        else:
+            parts[-1] += char
+        i += 1
+    return parts
+
+
+def translate_replacement(replacement):
+    """return: a vim replacement as a python re template : & and \\0 are the whole match,
+    \\r and \\n a newline, \\& a plain &"""
+    template = ''
+    i = 0
+    while i < len(replacement):
+        char = replacement[i]
+        if char == '\\' and i + 1 < len(replacement):
+            following = replacement[i + 1]
+            if following in 'rn':
+                template += '\\n'
+            elif following == '&':
+                template += '&'
+            elif following == '0':
+                template += '\\g<0>'
+            else:
+                template += char + following
+            i += 2
+            continue
+        template += '\\g<0>' if char == '&' else char
+        i += 1
+    return template
+
+
+def parse_substitute(argument):
+    """'/pat/repl/flags' -> (pattern, python template, flags)
+    patterns are python regular expressions"""
+    parts = split_pattern(argument)
+    pattern = parts[0]
+    replacement = parts[1] if len(parts) > 1 else ''
+    flags = parts[2].strip() if len(parts) > 2 else ''
+    unknown = set(flags) - set('egiIn')
+    if unknown:
+        raise ExError(f"Unsupported flags: {''.join(sorted(unknown))}")
+    return pattern, translate_replacement(replacement), flags
+
+
+def parse_global(argument):
+    """'/pattern/command' -> (pattern, command) ; the command may hold the delimiter (:g/a/s/b/c/)"""
+    parts = split_pattern(argument, maxsplit = 1)
+    return parts[0], (parts[1].strip() if len(parts) > 1 else '')
@@ -0,0 +1,157 @@
+import codecs
+import io
+import os
+import queue
+import threading
+import time
+
+# bytes read from disk at once
+CHUNK_SIZE = 64 * 1024
+
+# decoded chunks waiting to be inserted, bounds the memory used by a fast disk and a slow widget
+QUEUE_SIZE = 64
+
+# time spent inserting chunks before giving the mainloop back (seconds)
+BATCH_TIME = 0.03
+
+# delay between two batches (milliseconds)
+BATCH_DELAY = 1
+
+
+def read_chunks(path, stop_event = None, chunk_size = CHUNK_SIZE, encoding = 'utf-8'):
+    """yields (text, bytes_read) for a file read in fixed-size chunks and decoded incrementally,
+    with '\\r\\n' and '\\r' translated to '\\n' like open(path, 'r') does"""
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(encoding)(), translate = True)
+    done = 0
+    with open(path, 'rb') as f:
+        while stop_event is None or not stop_event.is_set():
+            data = f.read(chunk_size)
+            done += len(data)
+            text = decoder.decode(data, final = not data)
+            if text:
+                yield text, done
+            if not data:
+                return
+
+
+class ChunkedLoader():
+    """Loads a file into a text widget without freezing the mainloop.
+    A reader thread reads and decodes the file chunk by chunk, the chunks are inserted in small
+    batches through root.after so the window can be scrolled (and the load cancelled) meanwhile"""
+    def __init__(self, root, text, path, status_label = None, on_done = None):
+        self.root = root
+        self.text = text
+        self.path = path
+        self.status_label = status_label
+        # on_done(completed) : called once, completed is False if the load was cancelled
+        self.on_done = on_done
+
+        self.size = os.path.getsize(path)
+        self.name = os.path.basename(path)
+        self.bytes_read = 0
+        self.running = False
+        self.error = None
+
+        self._queue = queue.Queue(maxsize = QUEUE_SIZE)
+        self._stop = threading.Event()
+        self._thread = None
+        self._job = None
+        # a trailing newline is held back : the last one of the file is the one tk.Text keeps
+        self._pending_newline = False
+
+    def start(self):
+        """clears the widget and starts loading"""
+        self.running = True
+        # the load itself should not be undoable, one step per chunk
+        self.undo = self.text.cget('undo')
+        self.text.config(undo = False)
+        self.text.delete('1.0', 'end')
+        # the user can scroll while loading, but not type into a half loaded file
+        self.text.config(state = 'disabled')
+
+        self._thread = threading.Thread(target = self._read, daemon = True)
+        self._thread.start()
+        # the first screen is inserted as soon as the first chunk arrives
+        self._job = self.root.after(BATCH_DELAY, self._insert_batch)
+
+    def cancel(self):
+        """stops loading, what was loaded so far stays in the widget"""
+        if self.running:
+            self._finish(False)
+
+    def _read(self):
+        """reader thread : pushes decoded chunks in the queue, None marks the end"""
+        try:
+            for text, done in read_chunks(self.path, self._stop):
+                while not self._stop.is_set():
+                    try:
+                        self._queue.put((text, done), timeout = 0.1)
+                        break
+                    except queue.Full:
+                        pass
+        except (OSError, UnicodeDecodeError) as error:
+            self.error = error
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            # only happens when cancelled, nobody is reading the queue anymore
+            pass
+
+    def _insert_batch(self):
+        """inserts chunks until the time budget is spent, then schedules the next batch"""
+        self._job = None
+        if not self.running:
+            return
+        if not self.text.winfo_exists():
+            self._finish(False)
+            return
+
+        deadline = time.perf_counter() + BATCH_TIME
+        inserted = False
+        finished = False
+        self.text.config(state = 'normal')
+        # the time budget includes the inserts, which are what actually costs
+        while time.perf_counter() < deadline:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                finished = True
+                break
+            text, self.bytes_read = item
+            if self._pending_newline:
+                text = '\n' + text
+            self._pending_newline = text.endswith('\n')
+            self.text.insert('end', text[:-1] if self._pending_newline else text)
+            inserted = True
+        self.text.config(state = 'disabled')
+
+        if inserted:
+            self.show_progress()
+
+        if finished:
+            self._finish(self.error is None)
+        else:
+            self._job = self.root.after(BATCH_DELAY, self._insert_batch)
+
+    def show_progress(self):
+        """shows how much of the file is loaded in the status bar"""
+        if self.status_label is None:
+            return
+        percent = (self.bytes_read * 100 // self.size) if self.size else 100
+        self.status_label.config(text = f"Loading {self.name}: {percent}%  (Esc to cancel)")
+
+    def _finish(self, completed):
+        """restores the widget and reports the result"""
+        self.running = False
+        self._stop.set()
+        if self._job is not None:
+            self.root.after_cancel(self._job)
+            self._job = None
+        if self.text.winfo_exists():
+            self.text.config(state = 'normal', undo = self.undo)
+            self.text.edit_reset()
+            self.text.mark_set('insert', '1.0')
+        if self.on_done:
+            self.on_done(completed)
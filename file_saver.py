@@ -0,0 +1,162 @@
+import os
+import threading
+import time
+
+# how often the mainloop checks if a save has finished (milliseconds)
+POLL_DELAY = 20
+
+# permissions given to new files, read once : os.umask can only be read by setting it
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+# one lock per path, two saves of the same file never write at the same time
+_path_locks = {}
+_path_locks_guard = threading.Lock()
+
+
+def _lock_for(path):
+    """return: the lock serializing the saves of 'path'"""
+    with _path_locks_guard:
+        return _path_locks.setdefault(os.path.realpath(path), threading.Lock())
+
+
+def write_atomic(path, chunks, encoding = 'utf-8'):
+    """Streams 'chunks' into a temporary file in the directory of 'path', fsyncs it and renames it
+    over 'path'. A crash at any moment leaves either the old or the new file, never half of one.
+    A symlink is followed, the file it points to is the one replaced. A file with other hard links
+    is written over in place once the new content is safely in the temporary file : renaming
+    would split it from its other names
+    return: number of bytes written"""
+    import tempfile
+    path = os.path.realpath(path)
+    directory = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(prefix = '.' + os.path.basename(path) + '.', suffix = '.tmp', dir = directory)
+    try:
+        with os.fdopen(fd, 'w', encoding = encoding) as f:
+            for chunk in chunks:
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+            written = os.fstat(f.fileno()).st_size
+
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            stat = None
+        if stat is not None and stat.st_nlink > 1:
+            import shutil
+            shutil.copyfile(temp_path, path)
+            with open(path, 'rb+') as f:
+                os.fsync(f.fileno())
+            os.unlink(temp_path)
+            return written
+
+        # the new file keeps the permissions, owner and group of the one it replaces
+        if stat is not None:
+            os.chmod(temp_path, stat.st_mode & 0o7777)
+            if hasattr(os, 'chown') and (stat.st_uid, stat.st_gid) != (os.getuid(), os.getgid()):
+                try:
+                    os.chown(temp_path, stat.st_uid, stat.st_gid)
+                except OSError:
+                    # only root can give a file away : the group alone may still be kept
+                    try:
+                        os.chown(temp_path, -1, stat.st_gid)
+                    except OSError:
+                        pass
+        else:
+            os.chmod(temp_path, 0o666 & ~_UMASK)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+    # the rename itself is only durable once the directory is synced
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(dir_fd)
+    return written
+
+
+class SaveJob():
+    """Saves a buffer snapshot from a worker thread.
+    The mainloop polls the job with root.after and calls on_done(job) once the file is on disk
+    (or the save failed : job.error is then set).
+    previous : the save of the same tab still running, written (and reported) before this one so
+    an older snapshot never ends up on disk last"""
+    def __init__(self, root, path, buffer, on_done = None, previous = None):
+        self.root = root
+        self.path = path
+        # a frozen copy : the user can keep typing while it is written
+        self.snapshot = buffer.snapshot()
+        self.on_done = on_done
+        self.previous = previous
+
+        self.bytes_written = 0
+        self.seconds = 0.0
+        self.error = None
+        self._completed = False
+
+        self._thread = threading.Thread(target = self._write, daemon = True)
+        self._thread.start()
+        self._job = self.root.after(POLL_DELAY, self._poll)
+
+    def _write(self):
+        """worker thread"""
+        if self.previous is not None:
+            self.previous._thread.join()
+        start = time.perf_counter()
+        try:
+            with _lock_for(self.path):
+                self.bytes_written = write_atomic(self.path, self.snapshot.chunks())
+        except (OSError, UnicodeEncodeError) as error:
+            self.error = error
+        self.seconds = time.perf_counter() - start
+
+    def _poll(self):
+        """checks on the worker from the mainloop"""
+        self._job = None
+        if self._thread.is_alive():
+            self._job = self.root.after(POLL_DELAY, self._poll)
+        else:
+            self._complete()
+
+    def wait(self):
+        """blocks until the file is written and reports it right away (used before closing)"""
+        self._thread.join()
+        if self._job is not None:
+            self.root.after_cancel(self._job)
+            self._job = None
+        self._complete()
+
+    @property
+    def done(self):
+        """True once the file is written and on_done was called"""
+        return self._completed
+
+    def _complete(self):
+        """calls on_done exactly once"""
+        if self._completed:
+            return
+        if self.previous is not None:
+            self.previous.wait()
+            self.previous = None
+        self._completed = True
+        if self.on_done:
+            self.on_done(self)
+
+    def summary(self):
+        """return: a short status text with the size, latency and throughput of the save"""
+        name = os.path.basename(self.path)
+        if self.error:
+            return f"Saving {name} failed"
+        megabytes = self.bytes_written / (1024 * 1024)
+        speed = megabytes / self.seconds if self.seconds else 0
+        return f"Saved {name}: {megabytes:.1f} MB in {self.seconds * 1000:.0f} ms ({speed:.1f} MB/s)"
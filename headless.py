@@ -0,0 +1,368 @@
+import argparse
+import re
+import sys
+import tkinter as tk
+
+from text_buffer import TextBuffer
+from vim_editor import VimEditor
+from vim_keys import split_keys
+from ex_commands import ExError
+from file_saver import write_atomic
+
+# a tk.Text index : a base position followed by modifiers ('insert', '3.0 lineend', 'end-1c', '1.0+42c')
+INDEX_BASE = re.compile(r'\s*(?:(\d+)\.(\d+|end)|(@-?\d+,-?\d+)|([\w.]+))')
+INDEX_MODIFIER = re.compile(r'\s*(?:([+-])\s*(\d+)\s*(chars|char|c|lines|line|l)?|(linestart|lineend))')
+
+
+class HeadlessText():
+    """Stands in for the tk.Text of a tab when there is no window : the part of the widget API the
+    editing code uses (indexes, marks, insert / delete / replace, undo / redo), working on the
+    TextBuffer directly. Tags, scrolling and bindings do nothing"""
+    def __init__(self, content = ''):
+        self.buffer = TextBuffer(content)
+        # the buffer sends its replaces and multi-range deletes to its widget : this one
+        self.buffer.widget = self
+        self.marks = {'insert' : 0}
+        self.options = {'state' : 'normal', 'autoseparators' : True}
+        self.clipboard = None
+        self.destroyed = False
+
+        # undo groups : lists of ('insert' | 'delete', offset, text), as the Tk undo stack
+        self.undo_stack = []
+        self.redo_stack = []
+        self.separated = True
+        self.replaying = False
+
+    # INDEXES :
+    def _offset(self, index):
+        """return: the offset of a tk index ; len(buffer) + 1 stands for 'end' (after the final newline)"""
+        table = self.buffer.table
+        size = len(table)
+        index = str(index)
+        match = INDEX_BASE.match(index)
+        if match is None:
+            raise tk.TclError(f'bad text index "{index}"')
+        line, col, position, name = match.groups()
+        if line is not None:
+            line = int(line)
+            if line > table.line_count():
+                offset = size + 1
+            elif col == 'end':
+                offset = table.line_end(max(1, line))
+            else:
+                line = max(1, line)
+                offset = min(table.line_start(line) + int(col), table.line_end(line))
+        elif position is not None:
+            # no screen : every pixel is the top of the text
+            offset = 0
+        elif name == 'end':
+            offset = size + 1
+        elif name in self.marks:
+            offset = self.marks[name]
+        else:
+            raise tk.TclError(f'bad text index "{index}"')
+
+        # the modifiers start from 'end' itself (line count + 1, column 0) : 'end-1c' is the last character
+        for match in INDEX_MODIFIER.finditer(index, match.end()):
+            sign, number, unit, word = match.groups()
+            if word is not None:
+                # 'end' is alone on its line : its start and its end
+                if offset <= size:
+                    line = table.offset_to_index(offset)[0]
+                    offset = table.line_start(line) if word == 'linestart' else table.line_end(line)
+            elif unit and unit.startswith('l'):
+                line, col = table.offset_to_index(offset) if offset <= size else (table.line_count() + 1, 0)
+                line += int(number) if sign == '+' else -int(number)
+                if line < 1:
+                    offset = 0
+                elif line > table.line_count():
+                    offset = size + 1
+                else:
+                    offset = min(table.line_start(line) + col, table.line_end(line))
+            else:
+                offset += int(number) if sign == '+' else -int(number)
+                offset = max(0, min(offset, size + 1))
+        return offset
+
+    def index(self, index):
+        offset = self._offset(index)
+        if offset > len(self.buffer.table):
+            return f"{self.buffer.table.line_count() + 1}.0"
+        line, col = self.buffer.table.offset_to_index(offset)
+        return f"{line}.{col}"
+
+    def _edit_offset(self, index):
+        """return: the offset of an index where the text can be edited (before the final newline)"""
+        return min(self._offset(index), len(self.buffer.table))
+
+    # READING :
+    def get(self, start, end = None):
+        first = self._offset(start)
+        last = first + 1 if end is None else self._offset(end)
+        size = len(self.buffer.table)
+        text = self.buffer.get_text(min(first, size), min(last, size)) if last > first else ''
+        # the newline tk.Text always keeps at the end
+        if last > size >= first:
+            text += '\n'
+        return text
+
+    # EDITING :
+    def insert(self, index, chars, *args):
+        text = chars + ''.join(args[1::2])
+        if text and self.options['state'] != 'disabled':
+            self._insert(self._edit_offset(index), text)
+
+    def delete(self, *indexes):
+        if self.options['state'] == 'disabled':
+            return
+        offsets = [self._edit_offset(index) for index in indexes]
+        # a lone index deletes one character
+        if len(offsets) % 2:
+            offsets.append(min(offsets[-1] + 1, len(self.buffer.table)))
+        ranges = sorted(zip(offsets[::2], offsets[1::2]))
+        for start, end in reversed(ranges):
+            if end > start:
+                self._delete(start, end)
+
+    def replace(self, start, end, chars, *args):
+        if self.options['state'] == 'disabled':
+            return
+        first, last = self._edit_offset(start), self._edit_offset(end)
+        if last > first:
+            self._delete(first, last)
+        text = chars + ''.join(args[1::2])
+        if text:
+            self._insert(first, text)
+
+    def _insert(self, offset, text):
+        self._record('insert', offset, text)
+        self.buffer.insert(offset, text)
+        # marks move with the text after them (the insert mark included, as in tk)
+        for name, position in self.marks.items():
+            if position >= offset:
+                self.marks[name] = position + len(text)
+
+    def _delete(self, start, end):
+        self._record('delete', start, self.buffer.get_text(start, end))
+        self.buffer.delete(start, end)
+        for name, position in self.marks.items():
+            if position > start:
+                self.marks[name] = max(start, position - (end - start))
+
+    # UNDO :
+    def _record(self, kind, offset, text):
+        """adds an edit to the undo stack ; like tk, switching between inserting and deleting starts a
+        new undo step when autoseparators is on"""
+        if self.replaying:
+            return
+        self.redo_stack.clear()
+        if (self.separated or not self.undo_stack
+                or (self.options['autoseparators'] and self.undo_stack[-1][-1][0] != kind)):
+            self.undo_stack.append([])
+        self.undo_stack[-1].append((kind, offset, text))
+        self.separated = False
+
+    def edit_separator(self):
+        self.separated = True
+
+    def edit_reset(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+
+    def _replay(self, edits, action):
+        """applies a group of edits, backwards for an undo"""
+        self.replaying = True
+        def replay():
+            for kind, offset, text in (reversed(edits) if action == 'undo' else edits):
+                if (kind == 'insert') == (action == 'undo'):
+                    self._delete(offset, offset + len(text))
+                else:
+                    self._insert(offset, text)
+                self.marks['insert'] = offset
+        try:
+            self.buffer.replaying(action, replay)
+        finally:
+            self.replaying = False
+        self.separated = True
+
+    def edit_undo(self):
+        if not self.undo_stack:
+            raise tk.TclError('nothing to undo')
+        edits = self.undo_stack.pop()
+        self._replay(edits, 'undo')
+        self.redo_stack.append(edits)
+
+    def edit_redo(self):
+        if not self.redo_stack:
+            raise tk.TclError('nothing to redo')
+        edits = self.redo_stack.pop()
+        self._replay(edits, 'redo')
+        self.undo_stack.append(edits)
+
+    # MARKS, OPTIONS :
+    def mark_set(self, name, index):
+        self.marks[name] = self._edit_offset(index)
+
+    def config(self, **options):
+        self.options.update(options)
+
+    configure = config
+
+    def cget(self, option):
+        return self.options.get(option, '')
+
+    # CLIPBOARD :
+    def clipboard_clear(self):
+        self.clipboard = ''
+
+    def clipboard_append(self, text):
+        self.clipboard = (self.clipboard or '') + text
+
+    def clipboard_get(self):
+        if self.clipboard is None:
+            raise tk.TclError('CLIPBOARD selection doesn\'t exist')
+        return self.clipboard
+
+    # WITHOUT A SCREEN :
+    def see(self, index):
+        pass
+
+    def bind(self, *args, **options):
+        pass
+
+    def tag_config(self, *args, **options):
+        pass
+
+    def tag_add(self, *args):
+        pass
+
+    def tag_remove(self, *args):
+        pass
+
+    def winfo_height(self):
+        return 0
+
+    def winfo_exists(self):
+        return not self.destroyed
+
+    def after(self, delay, function):
+        # no mainloop : background jobs are waited for (see BackgroundJob.wait)
+        return None
+
+    def after_cancel(self, job):
+        pass
+
+
+class HeadlessEditor():
+    """One file and its VimEditor, without a window : runs ex commands and vim keys on it"""
+    def __init__(self, path = None, content = None):
+        self.path = path
+        if content is None:
+            content = ''
+            if path is not None:
+                with open(path, 'r', encoding = 'utf-8') as f:
+                    content = f.read()
+                # the final newline is the one tk.Text keeps, it is written back on save
+                if content.endswith('\n'):
+                    content = content[:-1]
+        self.text = HeadlessText(content)
+        self.buffer = self.text.buffer
+        self.vim = VimEditor(self.text, None, buffer = self.buffer)
+        self.vim.save_callback = self.save
+        self.vim.exit_callback = self.quit
+        self.vim.enable()
+
+    def save(self):
+        """:w"""
+        if self.path is None:
+            raise ExError("No file name")
+        write_atomic(self.path, self.buffer.chunks())
+        self.buffer.mark_saved()
+
+    def quit(self):
+        """:q"""
+        self.text.destroyed = True
+
+    def command(self, cmd):
+        """runs one ex command (the ':' is optional) ; :normal {keys} runs vim keys
+        return: the message of the command, None if it has none ; raises ExError if it fails"""
+        cmd = cmd.strip()
+        if cmd.startswith(':'):
+            cmd = cmd[1:]
+        if cmd in ('w', 'write'):
+            self.save()
+            return None
+        if cmd in ('q', 'quit'):
+            self.quit()
+            return None
+        if cmd in ('wq', 'x'):
+            self.save()
+            self.quit()
+            return None
+        self.vim.enter_normal()
+        return self.vim.run_ex(cmd)
+
+    def keys(self, keys):
+        """runs vim keys as if they were typed in normal mode"""
+        self.vim.run_keys(split_keys(keys))
+
+
+def run_file(path, commands):
+    """runs the commands on one file, until :q ; like vim -c, a command failing does not stop the
+    next ones (:s/a/b/e does not fail when there is no match)
+    return: (path, messages, errors)"""
+    messages = []
+    errors = []
+    try:
+        editor = HeadlessEditor(path)
+    except (OSError, UnicodeDecodeError) as error:
+        return path, messages, [str(error)]
+    for cmd in commands:
+        if editor.text.destroyed:
+            break
+        try:
+            message = editor.command(cmd)
+        except (ExError, OSError) as error:
+            errors.append(f"{cmd}: {error}")
+            continue
+        if message:
+            messages.append(message)
+    return path, messages, errors
+
+
+def main(argv = None):
+    """python text_editor.py --headless -c ':%s/a/b/g' -c ':w' file ... : batch editing, no window"""
+    parser = argparse.ArgumentParser(prog = 'text_editor.py --headless',
+                                     description = 'Runs ex commands on files, without a window.')
+    parser.add_argument('-c', dest = 'commands', action = 'append', default = [], metavar = 'COMMAND',
+                        help = "an ex command (:%%s/a/b/g, :g/x/d, :normal dd, :w), run in order")
+    parser.add_argument('-j', '--jobs', type = int, default = 1,
+                        help = "number of files edited at the same time, in separate processes")
+    parser.add_argument('-v', '--verbose', action = 'store_true', help = "print the messages of the commands")
+    parser.add_argument('files', nargs = '+')
+    args = parser.parse_args(argv)
+
+    if args.jobs > 1 and len(args.files) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers = args.jobs) as pool:
+            results = pool.map(run_file, args.files, [args.commands] * len(args.files),
+                               chunksize = max(1, len(args.files) // (args.jobs * 4)))
+            return report(results, args.verbose)
+    return report((run_file(path, args.commands) for path in args.files), args.verbose)
+
+
+def report(results, verbose):
+    """prints the errors (and the messages if verbose) ; return: the exit status"""
+    status = 0
+    for path, messages, errors in results:
+        if verbose:
+            for message in messages:
+                print(f"{path}: {message}")
+        for error in errors:
+            print(f"{path}: {error}", file = sys.stderr)
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,275 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+import tkinter as tk
+from bisect import bisect_left
+from functools import wraps
+
+# upper bounds (seconds) of the histogram buckets : 0.1 ms to about 1 minute, each 25% wider than
+# the one before, so a percentile is never more than 25% off whatever the latency
+BUCKETS = [0.0001 * 1.25 ** i for i in range(60)]
+
+# a handler running longer than this (milliseconds) is a slow event, logged with its stack
+SLOW_EVENT = 50
+# the heartbeat : an 'after' timer whose lateness is the time the Tk event queue was stuck
+HEARTBEAT = 100
+# how often the overlay in the status bar is refreshed (milliseconds)
+OVERLAY_REFRESH = 500
+
+# the handlers of these events are keystrokes, for the overlay
+KEY_EVENTS = ('<Key>', '<KeyPress>')
+
+logger = logging.getLogger('text_editor.latency')
+
+
+class Histogram():
+    """Durations of one handler, counted in BUCKETS : the memory does not grow with the events"""
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, duration):
+        self.counts[bisect_left(BUCKETS, duration)] += 1
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+    def percentile(self, percent):
+        """return: the duration (seconds) under which 'percent' % of the events took, 0 if there is none"""
+        if not self.count:
+            return 0.0
+        rank = percent / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return self.max
+
+    def summary(self):
+        """return: the statistics of the histogram, in milliseconds"""
+        return {
+            'count' : self.count,
+            'total_ms' : self.total * 1000,
+            'mean_ms' : self.total / self.count * 1000 if self.count else 0.0,
+            'p50_ms' : self.percentile(50) * 1000,
+            'p90_ms' : self.percentile(90) * 1000,
+            'p99_ms' : self.percentile(99) * 1000,
+            'max_ms' : self.max * 1000,
+        }
+
+
+def handler_name(func):
+    """return: a readable name of a callback : 'VimEditor.on_key', 'text_editor.py:157 <lambda>'"""
+    func = getattr(func, '__func__', func)
+    name = getattr(func, '__qualname__', None) or type(func).__name__
+    code = getattr(func, '__code__', None)
+    # lambdas and local functions all look the same : their place in the code tells them apart
+    if code is not None and ('<locals>' in name or name == '<lambda>'):
+        return f"{os.path.basename(code.co_filename)}:{code.co_firstlineno} {name.rsplit('.', 1)[-1]}"
+    return name
+
+
+class Instrumentation():
+    """Opt-in latency measures (python text_editor.py --instrument).
+    Every Python callback Tk runs (bindings, button and menu commands, after timers) is wrapped at
+    registration time, by patching tkinter's Misc._register, and its wall time goes to the
+    histogram of its handler. A watchdog thread takes the stack of the main thread while a handler
+    runs longer than the slow threshold, the slow event is logged with it once the handler returns"""
+    def __init__(self, slow = SLOW_EVENT, report_path = None, log_path = None):
+        self.slow = slow / 1000
+        self.report_path = report_path
+        self.log_path = log_path
+        self.histograms = {}
+        self.keystrokes = Histogram()
+        self.idle_lag = Histogram()
+        self.installed = False
+        self.overlay = None
+
+        # (handler, start) of the handlers running, the innermost last (a handler may run another one)
+        self.running = []
+        self.main_thread = threading.main_thread().ident
+        # stack of the main thread taken by the watchdog during the current slow handler
+        self.stack = None
+        self.watchdog = None
+        self.stopped = threading.Event()
+
+    @classmethod
+    def from_argv(cls, argv):
+        """return: the instrumentation set up by --slow-ms, --latency-report and --slow-log"""
+        parser = argparse.ArgumentParser(add_help = False)
+        parser.add_argument('--slow-ms', type = float, default = SLOW_EVENT)
+        parser.add_argument('--latency-report')
+        parser.add_argument('--slow-log')
+        args, rest = parser.parse_known_args(argv)
+        return cls(args.slow_ms, args.latency_report, args.slow_log)
+
+    # WRAPPING :
+    def install(self):
+        """Patches tkinter : must be done before the widgets are created, callbacks registered
+        before are not measured"""
+        if self.installed:
+            return
+        self.installed = True
+        instruments = self
+        register = tk.Misc._register
+        bind = tk.Misc._bind
+        after = tk.Misc.after
+        self.originals = (register, bind, after)
+
+        def _register(widget, func, subst = None, needcleanup = 1):
+            return register(widget, instruments.wrap(func), subst, needcleanup)
+
+        def _bind(widget, what, sequence, func, add, needcleanup = 1):
+            # a binding is named after its event too : the same lambda may serve several shortcuts
+            if callable(func):
+                func = instruments.wrap(func, f"{handler_name(func)} {sequence}", sequence in KEY_EVENTS)
+            return bind(widget, what, sequence, func, add, needcleanup)
+
+        def _after(widget, ms, func = None, *args):
+            # the timer is named after its function, not tkinter's 'callit' around it
+            if callable(func):
+                func = instruments.wrap(func, f"after {handler_name(func)}")
+            return after(widget, ms, func, *args)
+
+        tk.Misc._register = _register
+        tk.Misc._bind = _bind
+        tk.Misc.after = _after
+
+        if self.log_path:
+            handler = logging.FileHandler(self.log_path, encoding = 'utf-8')
+        else:
+            handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+
+        self.watchdog = threading.Thread(target = self._watch, daemon = True)
+        self.watchdog.start()
+
+    def uninstall(self):
+        if not self.installed:
+            return
+        tk.Misc._register, tk.Misc._bind, tk.Misc.after = self.originals
+        self.installed = False
+        self.stopped.set()
+
+    def wrap(self, func, name = None, keystroke = False):
+        """return: func timing itself into the histogram of 'name' (its handler name by default)"""
+        if getattr(func, 'instrumented', False) or getattr(func, '__qualname__', '').endswith('after.<locals>.callit'):
+            # already wrapped by _bind / _after, or the timer tkinter wraps around a measured function
+            return func
+        if name is None:
+            name = handler_name(func)
+        histogram = self.histograms.setdefault(name, Histogram())
+        instruments = self
+
+        @wraps(func)
+        def measured(*args):
+            start = time.perf_counter()
+            instruments.running.append((name, start))
+            try:
+                return func(*args)
+            finally:
+                duration = time.perf_counter() - start
+                instruments.running.pop()
+                histogram.add(duration)
+                if keystroke:
+                    instruments.keystrokes.add(duration)
+                if duration >= instruments.slow:
+                    instruments.log_slow(name, start, duration)
+        measured.instrumented = True
+        return measured
+
+    # SLOW EVENTS :
+    def _watch(self):
+        """watchdog thread : takes the stack of the main thread once per slow handler, while it runs"""
+        while not self.stopped.wait(self.slow / 2):
+            running = self.running[:1]
+            if not running or self.stack is not None:
+                continue
+            name, start = running[0]
+            if time.perf_counter() - start < self.slow:
+                continue
+            frame = sys._current_frames().get(self.main_thread)
+            if frame is not None:
+                self.stack = (start, ''.join(traceback.format_stack(frame)))
+
+    def log_slow(self, name, start, duration):
+        """logs a slow event, with the stack the watchdog took while it was running"""
+        # a handler run by a slow handler is part of it : only the outermost one is logged
+        if self.running:
+            return
+        stack = self.stack
+        self.stack = None
+        message = f"slow event: {name} took {duration * 1000:.1f} ms"
+        if stack is not None and stack[0] == start:
+            message += f", the main thread was at :\n{stack[1]}"
+        logger.info(message)
+
+    # HEARTBEAT AND OVERLAY :
+    def attach(self, root, status_label = None):
+        """starts the heartbeat on 'root' and the latency overlay at the left of the status bar"""
+        after = self.originals[2] if self.installed else tk.Misc.after
+        expected = [time.perf_counter() + HEARTBEAT / 1000]
+
+        def beat():
+            # the timer is late by the time the event queue was busy with something else
+            now = time.perf_counter()
+            self.idle_lag.add(max(0.0, now - expected[0]))
+            expected[0] = now + HEARTBEAT / 1000
+            after(root, HEARTBEAT, beat)
+        after(root, HEARTBEAT, beat)
+
+        if status_label is None:
+            return
+        # a label inside the status bar : the status text (right aligned) keeps its place
+        self.overlay = tk.Label(status_label, anchor = 'w', fg = status_label.cget('fg'), bg = status_label.cget('bg'))
+        self.overlay.pack(side = 'left')
+
+        def refresh():
+            if not self.overlay.winfo_exists():
+                return
+            self.overlay.config(text = self.overlay_text())
+            after(root, OVERLAY_REFRESH, refresh)
+        after(root, OVERLAY_REFRESH, refresh)
+
+    def overlay_text(self):
+        keys = self.keystrokes
+        return (f"key p50 {keys.percentile(50) * 1000:.1f} ms  p99 {keys.percentile(99) * 1000:.1f} ms"
+                f"  |  lag p99 {self.idle_lag.percentile(99) * 1000:.0f} ms")
+
+    # REPORTS :
+    def report(self):
+        """return: {handler : statistics} with the keystrokes and the idle lag, the slowest first"""
+        rows = {name : histogram.summary() for name, histogram in self.histograms.items() if histogram.count}
+        rows = dict(sorted(rows.items(), key = lambda item: item[1]['total_ms'], reverse = True))
+        return {'keystrokes' : self.keystrokes.summary(), 'idle_lag' : self.idle_lag.summary(), 'handlers' : rows}
+
+    def export(self, path):
+        """writes the report to 'path' : CSV (one row per handler) for a .csv file, JSON otherwise"""
+        report = self.report()
+        with open(path, 'w', encoding = 'utf-8', newline = '') as f:
+            if not path.lower().endswith('.csv'):
+                json.dump(report, f, indent = 2)
+                return
+            rows = [('keystrokes', report['keystrokes']), ('idle_lag', report['idle_lag'])]
+            rows += list(report['handlers'].items())
+            writer = csv.writer(f)
+            writer.writerow(['handler'] + list(report['keystrokes']))
+            for name, summary in rows:
+                writer.writerow([name] + [round(value, 3) for value in summary.values()])
+
+    def finish(self):
+        """stops the watchdog and writes the report asked for with --latency-report"""
+        self.uninstall()
+        if self.report_path:
+            self.export(self.report_path)
@@ -0,0 +1,314 @@
+import os
+import queue
+import struct
+import threading
+
+from piece_table import PieceTable
+
+
+def state_dir():
+    """return: the per-user directory of the editor's state (journals, session) :
+    $XDG_STATE_HOME/text_editor, ~/.local/state/text_editor, %LOCALAPPDATA%\\text_editor on Windows"""
+    if os.name == 'nt' and os.environ.get('LOCALAPPDATA'):
+        base = os.environ['LOCALAPPDATA']
+    else:
+        base = os.environ.get('XDG_STATE_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'state')
+    return os.path.join(base, 'text_editor')
+
+
+# the editor may be installed where it cannot write : its state lives in the user's directory
+STATE_DIR = state_dir()
+
+# directory holding the journals of the open tabs
+JOURNAL_DIR = os.path.join(STATE_DIR, 'journal')
+
+# a journal bigger than this (and than twice its document) is compacted into a snapshot
+COMPACT_SIZE = 4 * 1024 * 1024
+
+# how often the journals are fsynced by the editor (milliseconds)
+AUTOSAVE_INTERVAL = 2000
+
+MAGIC = b'TEJ1'
+
+# record : type, two integers, then (for INSERT, PATH, SNAPSHOT) 'b' bytes of utf-8
+RECORD = struct.Struct('<BQQ')
+INSERT = 1      # a : offset, b : payload length
+DELETE = 2      # a : start, b : end
+PATH = 3        # file the document comes from (empty : none), b : payload length
+SNAPSHOT = 4    # the whole document, b : payload length
+
+# lone surrogates can come out of tk.Text, they must survive the round trip
+ENCODING_ERRORS = 'surrogatepass'
+
+
+def pid_alive(pid):
+    """return: True if a process with this pid is running"""
+    if os.name == 'nt':
+        import ctypes
+        # PROCESS_QUERY_LIMITED_INFORMATION
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)
+        if handle:
+            ctypes.windll.kernel32.CloseHandle(handle)
+            return True
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def load_base(path):
+    """return: the content a tab gets when 'path' is loaded in it (see file_loader)"""
+    if not path or not os.path.exists(path):
+        return ''
+    with open(path, 'r', encoding = 'utf-8') as f:
+        content = f.read()
+    # the final newline is the one tk.Text keeps
+    return content[:-1] if content.endswith('\n') else content
+
+
+def read_journal(journal_path):
+    """Replays a journal file.
+    return: (file path or None, PieceTable with the document, number of records that changed
+    the document since it was loaded from the file)
+    a record cut by a crash ends the replay, everything before it is kept"""
+    path = None
+    table = None
+    edits = 0
+    with open(journal_path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            return None, PieceTable(), 0
+        while True:
+            header = f.read(RECORD.size)
+            if len(header) < RECORD.size:
+                break
+            kind, a, b = RECORD.unpack(header)
+            payload = b''
+            if kind in (INSERT, PATH, SNAPSHOT):
+                payload = f.read(b)
+                if len(payload) < b:
+                    break
+            text = payload.decode('utf-8', ENCODING_ERRORS)
+
+            if kind == PATH:
+                path = text or None
+                table = None
+            elif kind == SNAPSHOT:
+                table = PieceTable(text)
+                edits += 1
+            elif kind in (INSERT, DELETE):
+                # the document starts as the base file, read only if there are edits to apply
+                if table is None:
+                    table = PieceTable(load_base(path))
+                if kind == INSERT:
+                    table.insert(a, text)
+                else:
+                    table.delete(a, b)
+                edits += 1
+            else:
+                break
+
+    if table is None:
+        table = PieceTable(load_base(path))
+    return path, table, edits
+
+
+def find_orphans():
+    """return: journal files left behind by editors that are not running anymore"""
+    if not os.path.isdir(JOURNAL_DIR):
+        return []
+    orphans = []
+    for name in sorted(os.listdir(JOURNAL_DIR)):
+        if not name.endswith('.journal'):
+            continue
+        try:
+            pid = int(name.split('-')[0])
+        except ValueError:
+            continue
+        if pid != os.getpid() and not pid_alive(pid):
+            orphans.append(os.path.join(JOURNAL_DIR, name))
+    return orphans
+
+
+class JournalWriter():
+    """Background thread doing all the journal I/O, in the order it was requested"""
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.counter = 0
+        self._thread = threading.Thread(target = self._run, daemon = True)
+        self._thread.start()
+
+    def submit(self, journal, operation, *args):
+        """queues an operation for the writer thread"""
+        self.queue.put((journal, operation, args))
+
+    def stop(self):
+        """writes everything still queued then stops the thread"""
+        self.queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        """writer thread"""
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self._flush_all()
+                return
+            journal, operation, args = item
+            try:
+                getattr(self, '_' + operation)(journal, *args)
+            except OSError:
+                # a full disk must not take the editor down : this journal stops here
+                journal.broken = True
+            # nothing left to do : hand what we wrote to the OS, so it survives a crash of the editor
+            if self.queue.empty():
+                self._flush_all()
+
+    def _flush_all(self):
+        for journal in list(Journal.open_journals):
+            if journal.file is not None and not journal.broken:
+                try:
+                    journal.file.flush()
+                except OSError:
+                    journal.broken = True
+
+    def _write(self, journal, data):
+        if journal.file is None or journal.broken:
+            return
+        journal.file.write(data)
+        journal.size += len(data)
+
+    def _insert(self, journal, offset, text):
+        payload = text.encode('utf-8', ENCODING_ERRORS)
+        self._write(journal, RECORD.pack(INSERT, offset, len(payload)) + payload)
+
+    def _delete(self, journal, start, end):
+        self._write(journal, RECORD.pack(DELETE, start, end))
+
+    def _reset(self, journal, path, snapshot):
+        """rewrites the journal from scratch : the base file, then the whole document if given"""
+        temp_path = journal.path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(MAGIC)
+            payload = (path or '').encode('utf-8', ENCODING_ERRORS)
+            f.write(RECORD.pack(PATH, 0, len(payload)) + payload)
+            if snapshot is not None:
+                # the length goes in front of the text, it is filled in once the text is written
+                header_at = f.tell()
+                f.write(RECORD.pack(SNAPSHOT, 0, 0))
+                length = 0
+                for chunk in snapshot.chunks():
+                    data = chunk.encode('utf-8', ENCODING_ERRORS)
+                    f.write(data)
+                    length += len(data)
+                f.seek(header_at)
+                f.write(RECORD.pack(SNAPSHOT, 0, length))
+                f.seek(0, os.SEEK_END)
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        if journal.file is not None:
+            journal.file.close()
+        os.replace(temp_path, journal.path)
+        journal.file = open(journal.path, 'ab')
+        journal.size = size
+        journal.broken = False
+        journal.compacting = False
+
+    def _sync(self, journal):
+        if journal.file is not None and not journal.broken:
+            journal.file.flush()
+            os.fsync(journal.file.fileno())
+
+    def _close(self, journal, discard):
+        if journal.file is not None:
+            journal.file.close()
+            journal.file = None
+        if discard and os.path.exists(journal.path):
+            os.remove(journal.path)
+
+    def _remove(self, journal, path):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+_writer = None
+
+
+def get_writer():
+    """return: the journal writer of this process, started on first use"""
+    global _writer
+    if _writer is None:
+        try:
+            os.makedirs(JOURNAL_DIR, exist_ok = True)
+        except OSError:
+            # no place for the journals : each one breaks on its first write, the editor works without
+            pass
+        _writer = JournalWriter()
+    return _writer
+
+
+class Journal():
+    """Append-only edit journal of one tab.
+    Listens to a TextBuffer and queues every insert / delete for the writer thread, which appends
+    them to the journal file as binary records. When the file grows too big it is rewritten as a
+    snapshot of the document, so replaying it after a crash stays quick"""
+    # journals not closed yet, flushed by the writer
+    open_journals = set()
+
+    def __init__(self, buffer, file_path = None):
+        self.writer = get_writer()
+        self.buffer = buffer
+        self.writer.counter += 1
+        self.path = os.path.join(JOURNAL_DIR, f"{os.getpid()}-{self.writer.counter}.journal")
+
+        # used by the writer thread only
+        self.file = None
+        self.size = 0
+        # size of the journal at the last sync
+        self.synced_size = 0
+        self.broken = False
+        self.compacting = False
+
+        # while True edits are not journaled (e.g. while a file is being loaded)
+        self.paused = False
+
+        Journal.open_journals.add(self)
+        buffer.listeners.append(self.record)
+        self.reset(file_path)
+
+    def record(self, kind, offset, value):
+        """buffer listener : journals one edit"""
+        if self.paused:
+            return
+        self.writer.submit(self, kind, offset, value)
+        # compaction : the document is written once instead of its whole history
+        if not self.compacting and self.size > max(COMPACT_SIZE, 2 * len(self.buffer)):
+            self.compacting = True
+            self.writer.submit(self, 'reset', self.base, self.buffer.table.snapshot())
+
+    def reset(self, file_path, snapshot = None):
+        """starts the journal again from 'file_path' (and 'snapshot' of the document if it differs
+        from the file), e.g. after loading or saving"""
+        self.base = file_path
+        self.writer.submit(self, 'reset', file_path, snapshot)
+
+    def sync(self):
+        """makes the journal durable (periodic autosave), if it grew since the last time"""
+        if self.size != self.synced_size:
+            self.synced_size = self.size
+            self.writer.submit(self, 'sync')
+
+    def remove_after(self, path):
+        """removes another journal file once what was queued before is written"""
+        self.writer.submit(self, 'remove', path)
+
+    def close(self, discard = True):
+        """stops journaling the buffer ; discard removes the journal (the tab was closed on purpose)"""
+        if self.record in self.buffer.listeners:
+            self.buffer.listeners.remove(self.record)
+        Journal.open_journals.discard(self)
+        self.writer.submit(self, 'close', discard)
@@ -0,0 +1,332 @@
+import mmap
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_right
+
+# files at least this big are opened read-only in large file mode
+LARGE_FILE_SIZE = 256 * 1024 * 1024
+
+# bytes covered by one entry of the sparse line index
+BLOCK_SIZE = 64 * 1024
+
+# lines kept in the text widget above and below the visible ones
+MARGIN = 200
+
+# most bytes put in the widget at once, files made of a few giant lines are cut
+MAX_WINDOW_BYTES = 4 * 1024 * 1024
+
+
+class LineIndex():
+    """Sparse line index of a memory mapped file.
+    The file is cut into blocks of about BLOCK_SIZE bytes that start at the beginning of a line;
+    for every block we keep its byte offset and the number of its first line. The index is built
+    by a background thread, a line is then found with a bisect and a short scan inside one block"""
+    def __init__(self, path):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.file = open(path, 'rb')
+        # an empty file cannot be mapped
+        self.map = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ) if self.size else b''
+
+        # offsets[i] : byte offset of block i ; first_lines[i] : number of its first line
+        self.offsets = array('q', [0])
+        self.first_lines = array('q', [1])
+        # blocks readable from the main thread : set once both arrays hold the new block
+        self.blocks = 1
+        self.indexed_bytes = 0
+        self.done = False
+        self.total_lines = None
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target = self._build, daemon = True)
+        self._thread.start()
+
+    def _build(self):
+        """index builder thread"""
+        data = self.map
+        position = 0
+        line = 1
+        blocks = 0
+        while position < self.size and not self._stop.is_set():
+            # each block ends right after a newline so every block starts a line
+            end = data.find(b'\n', min(position + BLOCK_SIZE, self.size) - 1)
+            end = self.size if end == -1 else end + 1
+            line += data[position:end].count(b'\n')
+            position = end
+            self.indexed_bytes = position
+            if position < self.size:
+                self.offsets.append(position)
+                self.first_lines.append(line)
+                self.blocks = len(self.offsets)
+            blocks += 1
+            # let the mainloop breathe
+            if blocks % 64 == 0:
+                time.sleep(0)
+
+        if not self._stop.is_set():
+            # like tk.Text, a final newline does not start another line
+            ends_with_newline = self.size and data[self.size - 1:self.size] == b'\n'
+            self.total_lines = max(1, line - 1 if ends_with_newline else line)
+            self.done = True
+
+    def close(self):
+        """stops the builder and releases the file"""
+        self._stop.set()
+        self._thread.join()
+        if self.size:
+            self.map.close()
+        self.file.close()
+
+    # LINES :
+    def known_lines(self):
+        """return: number of lines indexed so far"""
+        if self.done:
+            return self.total_lines
+        return self.first_lines[self.blocks - 1]
+
+    def estimated_lines(self):
+        """return: total lines, estimated from the indexed part while the index is being built"""
+        if self.done:
+            return self.total_lines
+        if not self.indexed_bytes:
+            return 1
+        return max(1, self.first_lines[self.blocks - 1] * self.size // self.indexed_bytes)
+
+    def line_offset(self, line):
+        """return: byte offset at which 'line' starts (the file size past the last line)"""
+        line = max(1, min(line, self.known_lines()))
+        i = bisect_right(self.first_lines, line, 0, self.blocks) - 1
+        position = self.offsets[i]
+        for _ in range(line - self.first_lines[i]):
+            position = self.map.find(b'\n', position) + 1
+            if position == 0:
+                return self.size
+        return position
+
+    def line_of_offset(self, offset):
+        """return: number of the line containing byte 'offset'"""
+        i = bisect_right(self.offsets, offset, 0, self.blocks) - 1
+        return self.first_lines[i] + self.map[self.offsets[i]:offset].count(b'\n')
+
+    def line_bytes(self, line):
+        """return: the bytes of a line without its newline"""
+        start = self.line_offset(line)
+        end = self.map.find(b'\n', start)
+        return self.map[start:self.size if end == -1 else end]
+
+    def byte_offset(self, line, col):
+        """converts a (line, character column) position into a byte offset"""
+        text = self.line_bytes(line).decode('utf-8', 'replace')
+        return self.line_offset(line) + len(text[:col].encode('utf-8'))
+
+    def position(self, offset):
+        """converts a byte offset into a (line, character column) position"""
+        line = self.line_of_offset(offset)
+        prefix = self.map[self.line_offset(line):offset]
+        return line, len(prefix.decode('utf-8', 'replace'))
+
+    # SEARCHING :
+    def find(self, query, line, col, backwards = False):
+        """return: (line, col) of the next (previous) occurrence of 'query' from a position, or None"""
+        needle = query.encode('utf-8')
+        if not needle or not self.size:
+            return None
+        offset = self.byte_offset(line, col)
+        if backwards:
+            found = self.map.rfind(needle, 0, offset)
+        else:
+            found = self.map.find(needle, offset)
+        if found == -1:
+            return None
+        return self.position(found)
+
+
+class LargeFileView():
+    """Read-only viewer showing a huge file through a LineIndex.
+    Only the visible lines plus a margin are put in the text widget, the window of lines is
+    swapped as the user scrolls. Lines and columns given to / returned by the view are the
+    ones of the file, not of the widget"""
+    def __init__(self, text, scrollbar, path, status_label = None):
+        self.text = text
+        self.scrollbar = scrollbar
+        self.status_label = status_label
+        self.index = LineIndex(path)
+        self.name = os.path.basename(path)
+
+        # first file line currently in the widget
+        self.first_line = 1
+        self.last_line = 0
+        self._swapping = False
+        self._job = None
+
+        self.text.config(yscrollcommand = self.on_text_scroll, state = 'disabled')
+        self.scrollbar.config(command = self.on_scrollbar)
+        self.text.tag_config("highlight", background = "yellow")
+        self.text.bind('<Destroy>', lambda event: self.close(), add = '+')
+
+        self.show_lines(1)
+        self.text.mark_set('insert', '1.0')
+        self.show_progress()
+
+    def close(self):
+        """releases the file, the widget gets its normal scrolling back"""
+        if self.index is None:
+            return
+        if self._job is not None:
+            self.text.after_cancel(self._job)
+            self._job = None
+        self.index.close()
+        self.index = None
+        if self.text.winfo_exists():
+            self.text.config(yscrollcommand = self.scrollbar.set, state = 'normal')
+            self.scrollbar.config(command = self.text.yview)
+            self.text.delete('1.0', 'end')
+
+    def show_progress(self):
+        """shows the indexing progress until the index is complete"""
+        self._job = None
+        if self.index is None:
+            return
+        if self.status_label is not None:
+            if self.index.done:
+                lines = f"{self.index.total_lines:,} lines"
+            else:
+                percent = self.index.indexed_bytes * 100 // max(1, self.index.size)
+                lines = f"indexing {percent}%"
+            self.status_label.config(text = f"{self.name} (read-only, {lines})")
+        self.update_scrollbar()
+        if not self.index.done:
+            self._job = self.text.after(250, self.show_progress)
+
+    # WINDOW OF LINES :
+    def window_size(self):
+        """return: number of lines kept in the widget"""
+        visible = max(1, self.text.winfo_height() // max(1, self.line_height()))
+        return visible + 2 * MARGIN
+
+    def line_height(self):
+        """return: height of a line in pixels"""
+        info = self.text.dlineinfo('@0,0')
+        return info[3] if info else 16
+
+    def show_lines(self, first):
+        """puts the window of lines starting at file line 'first' in the widget"""
+        known = self.index.known_lines()
+        first = max(1, min(first, known))
+        last = min(known, first + self.window_size() - 1)
+        start = self.index.line_offset(first)
+        end = self.index.line_offset(last + 1) if last < known else self.index.size
+        if end - start > MAX_WINDOW_BYTES:
+            # a window cut short ends with the line holding its last byte
+            end = start + MAX_WINDOW_BYTES
+            last = self.index.line_of_offset(end - 1)
+        content = self.index.map[start:end].decode('utf-8', 'replace')
+        if content.endswith('\n'):
+            content = content[:-1]
+
+        self._swapping = True
+        self.text.config(state = 'normal')
+        self.text.delete('1.0', 'end')
+        self.text.insert('1.0', content)
+        self.text.config(state = 'disabled')
+        self._swapping = False
+        self.first_line, self.last_line = first, last
+
+    def contains(self, line):
+        """return: True if file 'line' is in the widget, away from the borders of the window"""
+        low = self.first_line + (MARGIN // 2 if self.first_line > 1 else 0)
+        high = self.last_line - (MARGIN // 2 if self.last_line < self.index.known_lines() else 0)
+        return low <= line <= high
+
+    def center_on(self, line):
+        """makes sure file 'line' is in the widget, swapping the window if needed"""
+        if not self.contains(line):
+            top = self.top_line()
+            self.show_lines(line - MARGIN)
+            # keep the screen where it was if the line is still visible from there
+            self.scroll_to(top)
+
+    def scroll_to(self, line):
+        """puts file 'line' at the top of the widget"""
+        self.text.yview(f"{max(1, line - self.first_line + 1)}.0")
+
+    def top_line(self):
+        """return: file line shown at the top of the widget"""
+        return self.first_line + int(self.text.index('@0,0').split('.')[0]) - 1
+
+    # SCROLLING :
+    def on_text_scroll(self, low, high):
+        """yscrollcommand of the widget : swaps the window when the view gets near its borders"""
+        if self._swapping or self.index is None:
+            return
+        top = self.top_line()
+        bottom = self.first_line + int(self.text.index(f"@0,{self.text.winfo_height()}").split('.')[0]) - 1
+        near_top = self.first_line > 1 and top - self.first_line < MARGIN // 2
+        near_bottom = self.last_line < self.index.known_lines() and self.last_line - bottom < MARGIN // 2
+        if near_top or near_bottom:
+            self.show_lines(top - MARGIN)
+            self.scroll_to(top)
+        self.update_scrollbar()
+
+    def update_scrollbar(self):
+        """places the scrollbar according to the position in the whole file"""
+        total = self.index.estimated_lines()
+        top = self.top_line()
+        visible = max(1, self.text.winfo_height() // max(1, self.line_height()))
+        self.scrollbar.set((top - 1) / total, min(1.0, (top - 1 + visible) / total))
+
+    def on_scrollbar(self, action, amount, unit = None):
+        """command of the scrollbar : moveto jumps in the file, scroll moves the widget"""
+        if action == 'moveto':
+            line = int(float(amount) * self.index.estimated_lines()) + 1
+            self.show_lines(line - MARGIN)
+            self.scroll_to(line)
+            self.update_scrollbar()
+        else:
+            self.text.yview_scroll(int(amount), unit)
+
+    # POSITIONS :
+    def line_count(self):
+        """return: number of lines of the file known so far"""
+        return self.index.known_lines()
+
+    def line_length(self, line):
+        """return: number of characters of a file line"""
+        return len(self.index.line_bytes(line).decode('utf-8', 'replace'))
+
+    def current_line_col(self):
+        """return: file line and column of the cursor"""
+        line, col = self.text.index('insert').split('.')
+        return self.first_line + int(line) - 1, int(col)
+
+    def widget_index(self, line, col):
+        """return: widget index of a file position (the line must be in the widget)"""
+        return f"{line - self.first_line + 1}.{col}"
+
+    def go_to_line_col(self, line, col):
+        """moves the cursor to a file position, loading the lines around it if needed"""
+        line = max(1, min(line, self.line_count()))
+        col = max(0, min(col, self.line_length(line)))
+        self.center_on(line)
+        self.text.mark_set('insert', self.widget_index(line, col))
+        self.text.see('insert')
+
+    def find(self, query, backwards = False):
+        """searches 'query' from the cursor in the whole file and highlights the match
+        return: True if found"""
+        line, col = self.current_line_col()
+        position = self.index.find(query, line, col, backwards)
+        if position is None:
+            return False
+        line, col = position
+        self.center_on(line)
+        start = self.widget_index(line, col)
+        end = f"{start} + {len(query)}c"
+        self.text.tag_remove("highlight", "1.0", "end")
+        self.text.tag_add("highlight", start, end)
+        # like FindWindow : after the match when going forward, at its start going backwards
+        self.text.mark_set('insert', start if backwards else end)
+        self.text.see(start)
+        return True
@@ -0,0 +1,329 @@
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+# biggest slice a single piece may cover, keeps line lookups inside one piece short
+PIECE_SIZE = 16 * 1024
+
+# while typing in one place we keep extending the same added string up to this size
+COALESCE_LIMIT = 4 * 1024
+
+
+class PieceTable():
+    """Python-side document model.
+    The document is a list of pieces, each piece being a slice of an immutable source string:
+    (source, start, end, newlines). Pieces are found with a bisect over cached prefix sums,
+    so an edit never copies the document. Lines are 1-based and columns 0-based, like tk.Text"""
+    def __init__(self, text = ''):
+        self._pieces = []
+        # piece sizes and newline counts kept side by side so prefix sums are rebuilt in C
+        self._sizes = []
+        self._counts = []
+        # cumulative characters / newlines at the end of every piece, rebuilt lazily
+        self._char_ends = []
+        self._line_ends = []
+        # number of prefix entries that are still valid
+        self._valid = 0
+        # typing into one piece does not rebuild the prefix sums : entries from
+        # _pending_index onwards are short by _pending_chars / _pending_lines instead
+        self._pending_index = None
+        self._pending_chars = 0
+        self._pending_lines = 0
+
+        self._length = 0
+        self._newlines = 0
+        # the added string we are allowed to extend in place (the last one inserted)
+        self._last_source = None
+
+        if text:
+            self._splice(0, 0, self._make_pieces(text))
+            self._length = len(text)
+            self._newlines = sum(self._counts)
+
+    # AUXILIARY FUNCTIONS :
+    def _make_pieces(self, text):
+        """splits a source string into pieces of at most PIECE_SIZE characters"""
+        pieces = []
+        for start in range(0, len(text), PIECE_SIZE):
+            end = min(start + PIECE_SIZE, len(text))
+            pieces.append((text, start, end, text.count('\n', start, end)))
+        return pieces
+
+    def _splice(self, i, j, pieces):
+        """replaces pieces i..j with 'pieces', keeping the size and newline lists in step"""
+        self._pieces[i:j] = pieces
+        self._sizes[i:j] = [end - start for source, start, end, count in pieces]
+        self._counts[i:j] = [count for source, start, end, count in pieces]
+        self._valid = min(self._valid, i)
+
+    def _grow(self, i, piece, chars, lines):
+        """replaces piece i by a longer version of itself without rebuilding the prefix sums"""
+        self._pieces[i] = piece
+        self._sizes[i] += chars
+        self._counts[i] += lines
+        if self._pending_index in (None, i):
+            self._pending_index = i
+            self._pending_chars += chars
+            self._pending_lines += lines
+        else:
+            self._valid = min(self._valid, i, self._pending_index)
+
+    def _refresh(self):
+        """rebuilds the prefix sums starting from the first piece touched by an edit"""
+        i = self._valid
+        if i == len(self._pieces) and len(self._char_ends) == i:
+            return
+        if self._pending_index is not None:
+            i = min(i, self._pending_index)
+            self._pending_index = None
+            self._pending_chars = self._pending_lines = 0
+        chars = self._char_ends[i - 1] if i else 0
+        lines = self._line_ends[i - 1] if i else 0
+        self._char_ends[i:] = accumulate(self._sizes[i:], initial = chars)
+        self._line_ends[i:] = accumulate(self._counts[i:], initial = lines)
+        # accumulate also yields the initial value, drop it
+        del self._char_ends[i]
+        del self._line_ends[i]
+        self._valid = len(self._pieces)
+
+    def _char_end(self, index):
+        """return: document offset at which piece 'index' ends"""
+        if self._pending_index is not None and index >= self._pending_index:
+            return self._char_ends[index] + self._pending_chars
+        return self._char_ends[index]
+
+    def _line_end(self, index):
+        """return: number of newlines up to the end of piece 'index'"""
+        if self._pending_index is not None and index >= self._pending_index:
+            return self._line_ends[index] + self._pending_lines
+        return self._line_ends[index]
+
+    def _piece_start(self, index):
+        """return: document offset at which piece 'index' starts"""
+        return self._char_end(index - 1) if index else 0
+
+    def _bisect(self, ends, value, delta, side):
+        """bisects a prefix list, adding 'delta' to the entries a pending edit left behind"""
+        pending = self._pending_index
+        if pending is None:
+            return side(ends, value)
+        i = side(ends, value, 0, pending)
+        if i < pending:
+            return i
+        return side(ends, value - delta, pending)
+
+    def _find_piece(self, offset, side = bisect_left):
+        """bisect_left : first piece ending at or after offset ; bisect_right : piece containing offset"""
+        return self._bisect(self._char_ends, offset, self._pending_chars, side)
+
+    # SIZE :
+    def __len__(self):
+        return self._length
+
+    def line_count(self):
+        """return: number of lines in the document (an empty document has one line)"""
+        return self._newlines + 1
+
+    # EDITING :
+    def insert(self, offset, text):
+        """inserts 'text' at character 'offset'"""
+        if not text:
+            return
+        offset = max(0, min(offset, self._length))
+        self._refresh()
+
+        if len(text) > PIECE_SIZE:
+            new_pieces = self._make_pieces(text)
+        else:
+            new_pieces = [(text, 0, len(text), text.count('\n'))]
+        newlines = sum(piece[3] for piece in new_pieces)
+
+        # i : first piece ending at or after offset
+        i = self._find_piece(offset)
+
+        if i < len(self._pieces) and self._char_end(i) == offset:
+            # inserting right after piece i : extend it if we are still typing in the same place
+            source, start, end, count = self._pieces[i]
+            if (len(new_pieces) == 1 and source is self._last_source and end == len(source)
+                    and len(source) < COALESCE_LIMIT):
+                source = source + text
+                self._grow(i, (source, start, end + len(text), count + newlines), len(text), newlines)
+                self._last_source = source
+            else:
+                self._splice(i + 1, i + 1, new_pieces)
+                self._last_source = new_pieces[-1][0]
+        elif i == len(self._pieces) or offset == self._piece_start(i):
+            # empty document or beginning of a piece
+            self._splice(i, i, new_pieces)
+            self._last_source = new_pieces[-1][0]
+        else:
+            # in the middle of piece i : split it around the new text
+            source, start, end, count = self._pieces[i]
+            cut = start + offset - self._piece_start(i)
+            left = source.count('\n', start, cut)
+            self._splice(i, i + 1, [(source, start, cut, left)] + new_pieces
+                         + [(source, cut, end, count - left)])
+            self._last_source = new_pieces[-1][0]
+
+        self._length += len(text)
+        self._newlines += newlines
+
+    def delete(self, start, end):
+        """deletes the characters between offsets 'start' and 'end'"""
+        start = max(0, start)
+        end = min(end, self._length)
+        if start >= end:
+            return
+        self._refresh()
+
+        # first : piece containing start ; last : piece containing end - 1
+        first = self._find_piece(start, bisect_right)
+        last = self._find_piece(end)
+
+        kept = []
+        source, s, e, count = self._pieces[first]
+        piece_start = self._piece_start(first)
+        if start > piece_start:
+            cut = s + start - piece_start
+            kept.append((source, s, cut, source.count('\n', s, cut)))
+
+        source, s, e, count = self._pieces[last]
+        piece_end = self._char_end(last)
+        if end < piece_end:
+            cut = e - (piece_end - end)
+            kept.append((source, cut, e, source.count('\n', cut, e)))
+
+        removed_lines = self._line_end(last) - (self._line_end(first - 1) if first else 0)
+        removed_lines -= sum(piece[3] for piece in kept)
+
+        self._splice(first, last + 1, kept)
+        self._length -= end - start
+        self._newlines -= removed_lines
+        self._last_source = None
+
+    def replace(self, start, end, text):
+        """replaces the characters between 'start' and 'end' with 'text'"""
+        self.delete(start, end)
+        self.insert(start, text)
+
+    # READING :
+    def chunks(self, start = 0, end = None):
+        """yields the document between 'start' and 'end' piece by piece, without joining it"""
+        end = self._length if end is None else min(end, self._length)
+        start = max(0, start)
+        if start >= end:
+            return
+        self._refresh()
+        i = self._find_piece(start, bisect_right)
+        position = self._piece_start(i)
+        while i < len(self._pieces) and position < end:
+            source, s, e, count = self._pieces[i]
+            lo = s + max(0, start - position)
+            hi = e - max(0, position + (e - s) - end)
+            yield source[lo:hi]
+            position += e - s
+            i += 1
+
+    def get_text(self, start = 0, end = None):
+        """return: the text between offsets 'start' and 'end'"""
+        return ''.join(self.chunks(start, end))
+
+    def snapshot(self):
+        """return: a frozen copy sharing the same source strings, safe to read from another thread"""
+        copy = PieceTable()
+        copy._splice(0, 0, self._pieces)
+        copy._length = self._length
+        copy._newlines = self._newlines
+        return copy
+
+    # LINES AND INDEXES :
+    def line_start(self, line):
+        """return: offset of the first character of 'line'"""
+        # newlines that come before the line
+        target = line - 1
+        if target <= 0:
+            return 0
+        if target > self._newlines:
+            return self._length
+        self._refresh()
+
+        # first piece in which the cumulative newline count reaches target
+        i = self._bisect(self._line_ends, target, self._pending_lines, bisect_left)
+        source, s, e, count = self._pieces[i]
+        needed = target - (self._line_end(i - 1) if i else 0)
+        position = s - 1
+        for _ in range(needed):
+            position = source.find('\n', position + 1, e)
+        return self._piece_start(i) + (position - s) + 1
+
+    def line_end(self, line):
+        """return: offset of the end of 'line' (the position of its newline)"""
+        if line >= self.line_count():
+            return self._length
+        return self.line_start(line + 1) - 1
+
+    def get_line(self, line):
+        """return: the content of 'line' without its newline"""
+        return self.get_text(self.line_start(line), self.line_end(line))
+
+    def index_to_offset(self, line, col):
+        """converts a tk-style (line, col) position into an offset, clamped like tk.Text does"""
+        line = max(1, min(line, self.line_count()))
+        start = self.line_start(line)
+        return start + max(0, min(col, self.line_end(line) - start))
+
+    def offset_to_index(self, offset):
+        """converts an offset into a tk-style (line, col) position"""
+        offset = max(0, min(offset, self._length))
+        if offset == 0:
+            return 1, 0
+        self._refresh()
+        i = self._find_piece(offset)
+        source, s, e, count = self._pieces[i]
+        cut = s + offset - self._piece_start(i)
+        line = (self._line_end(i - 1) if i else 0) + source.count('\n', s, cut) + 1
+        return line, offset - self.line_start(line)
+
+    # SEARCHING :
+    def find(self, needle, start = 0, end = None):
+        """return: offset of the first occurrence of 'needle' in [start, end), or -1"""
+        if not needle:
+            return -1
+        end = self._length if end is None else min(end, self._length)
+        # carry the tail of the previous chunk so matches crossing piece borders are found
+        carry = ''
+        position = start
+        for chunk in self.chunks(start, end):
+            window = carry + chunk
+            found = window.find(needle)
+            if found != -1:
+                return position - len(carry) + found
+            carry = window[-(len(needle) - 1):] if len(needle) > 1 else ''
+            position += len(chunk)
+        return -1
+
+    def rfind(self, needle, start = 0, end = None):
+        """return: offset of the last occurrence of 'needle' in [start, end), or -1"""
+        if not needle:
+            return -1
+        end = self._length if end is None else min(end, self._length)
+        start = max(0, start)
+        if start >= end:
+            return -1
+        self._refresh()
+        # walking the pieces backwards from the one containing end - 1
+        i = self._find_piece(end)
+        carry = ''
+        while i >= 0:
+            source, s, e, count = self._pieces[i]
+            position = self._piece_start(i)
+            lo = s + max(0, start - position)
+            hi = e - max(0, self._char_end(i) - end)
+            window = source[lo:hi] + carry
+            found = window.rfind(needle)
+            if found != -1:
+                return position + (lo - s) + found
+            if position <= start:
+                break
+            carry = window[:len(needle) - 1]
+            i -= 1
+        return -1
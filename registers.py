@@ -0,0 +1,115 @@
+import tkinter as tk
+
+# registers that are the system clipboard
+CLIPBOARD = ('+', '*')
+
+# the black hole register : what goes in is dropped
+BLACK_HOLE = '_'
+
+
+class Register():
+    """Text of a register, and whether it holds whole lines (pasted below the line) or characters"""
+    def __init__(self, text = '', linewise = False):
+        self.text = text
+        self.linewise = linewise
+
+
+class Registers():
+    """The vim registers of the process, shared by every tab.
+    '"' unnamed : the last yank or delete ; 'a'-'z' named ('A'-'Z' appends) ;
+    '0' last yank ; '1'-'9' deletes of whole lines or several lines, most recent first ;
+    '-' small deletes ; '+' / '*' the system clipboard.
+    Everything stays in Python memory : only the clipboard registers talk to the X server, and the
+    unnamed register is handed to the clipboard once, when the text loses the focus"""
+    def __init__(self):
+        self.store = {}
+        # the unnamed register changed since it was last handed to the clipboard
+        self.unsynced = False
+
+    def get(self, name = '"', widget = None):
+        """return: the Register 'name', None if it is empty
+        the clipboard registers are read from the clipboard (through 'widget')"""
+        name = name.lower()
+        if name in CLIPBOARD:
+            if widget is None:
+                return None
+            try:
+                text = widget.clipboard_get()
+            except tk.TclError:
+                return None
+            # a line copied from here comes back as a line
+            stored = self.store.get('+')
+            linewise = stored is not None and stored.text == text and stored.linewise
+            return Register(text, linewise)
+        return self.store.get(name)
+
+    def set(self, name, text, linewise, widget = None):
+        """writes a register ; an uppercase name appends to its lowercase register"""
+        if name == BLACK_HOLE:
+            return
+        if name.isupper():
+            name = name.lower()
+            previous = self.store.get(name)
+            if previous is not None:
+                if previous.linewise or linewise:
+                    text = previous.text + '\n' + text
+                else:
+                    text = previous.text + text
+                linewise = previous.linewise or linewise
+        register = Register(text, linewise)
+        self.store[name] = register
+        # the unnamed register is the last register written
+        self.store['"'] = register
+        self.unsynced = True
+        if name in CLIPBOARD:
+            self.store['+'] = register
+            if widget is not None:
+                widget.clipboard_clear()
+                widget.clipboard_append(text)
+                self.unsynced = False
+
+    def yank(self, text, linewise, name = None, widget = None):
+        """stores a yank : in 'name' if given, in '0' otherwise"""
+        if name == BLACK_HOLE:
+            return
+        self.set(name or '0', text, linewise, widget)
+
+    def delete(self, text, linewise, name = None, widget = None):
+        """stores a delete : in 'name' if given ; lines and multi-line deletes also shift the
+        numbered registers, small deletes go in '-'"""
+        if name == BLACK_HOLE:
+            return
+        if name:
+            self.set(name, text, linewise, widget)
+            return
+        if linewise or '\n' in text:
+            for number in range(9, 1, -1):
+                if str(number - 1) in self.store:
+                    self.store[str(number)] = self.store[str(number - 1)]
+            self.set('1', text, linewise)
+        else:
+            self.set('-', text, linewise)
+
+    def sync_clipboard(self, widget):
+        """hands the unnamed register to the system clipboard, if it changed since the last time"""
+        register = self.store.get('"')
+        if not self.unsynced or register is None:
+            return
+        self.unsynced = False
+        try:
+            widget.clipboard_clear()
+            widget.clipboard_append(register.text)
+        except tk.TclError:
+            return
+        self.store['+'] = register
+
+
+_registers = None
+
+
+def get_registers():
+    """return: the registers of this process"""
+    global _registers
+    if _registers is None:
+        _registers = Registers()
+    return _registers
@@ -0,0 +1,479 @@
+import queue
+import re
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+
+# how often the mainloop checks if a search has finished (milliseconds)
+POLL_DELAY = 20
+
+
+@lru_cache(maxsize = 64)
+def compile_pattern(query, regex = False, nocase = False):
+    """return: the compiled pattern of a query, cached so repeated searches do not compile again
+    raises re.error for an invalid regex"""
+    flags = re.MULTILINE
+    if nocase:
+        flags |= re.IGNORECASE
+    return re.compile(query if regex else re.escape(query), flags)
+
+
+def find_all(text, pattern):
+    """return: (starts, ends) arrays of the offsets of every non-empty match of 'pattern' in 'text'"""
+    starts = array('q')
+    ends = array('q')
+    for match in pattern.finditer(text):
+        start, end = match.span()
+        if end > start:
+            starts.append(start)
+            ends.append(end)
+    return starts, ends
+
+
+class MatchList():
+    """Sorted match offsets of one search over one version of a buffer.
+    Next / previous match are bisect lookups"""
+    def __init__(self, query, regex, nocase, version, starts, ends):
+        self.key = (query, regex, nocase)
+        self.version = version
+        self.starts = starts
+        self.ends = ends
+
+    def __len__(self):
+        return len(self.starts)
+
+    def valid_for(self, query, regex, nocase, version):
+        """return: True if the list answers this search on this version of the buffer"""
+        return self.key == (query, regex, nocase) and self.version == version
+
+    def next_after(self, offset):
+        """return: number of the first match starting at or after offset (wrapping around), or None"""
+        if not self.starts:
+            return None
+        i = bisect_left(self.starts, offset)
+        return i if i < len(self.starts) else 0
+
+    def prev_before(self, offset):
+        """return: number of the last match starting before offset (wrapping around), or None"""
+        if not self.starts:
+            return None
+        i = bisect_left(self.starts, offset) - 1
+        return i if i >= 0 else len(self.starts) - 1
+
+    def between(self, start, end):
+        """return: range of the numbers of the matches starting in [start, end)"""
+        return range(bisect_left(self.starts, start), bisect_right(self.starts, end - 1))
+
+
+class LiveMatches():
+    """The matches of one search in a buffer, kept valid while the buffer is edited (a buffer
+    listener) : an edit rescans only the lines it touched, next / previous match stay bisect lookups.
+    The matches after an edit move by its size ; like the piece table's prefix sums, that shift is
+    kept pending and only written into the arrays when an edit happens somewhere else"""
+    def __init__(self, buffer, pattern, matches):
+        self.buffer = buffer
+        self.pattern = pattern
+        self.key = matches.key
+        self.starts = matches.starts
+        self.ends = matches.ends
+        # entries from shift_index onwards are 'shift' characters short
+        self.shift_index = None
+        self.shift = 0
+        buffer.listeners.append(self.on_edit)
+
+    def close(self):
+        """stops following the buffer"""
+        if self.on_edit in self.buffer.listeners:
+            self.buffer.listeners.remove(self.on_edit)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _bisect(self, offset, side):
+        """bisects the starts, minding the pending shift"""
+        pending = self.shift_index
+        if pending is None:
+            return side(self.starts, offset)
+        i = side(self.starts, offset, 0, pending)
+        if i < pending:
+            return i
+        return side(self.starts, offset - self.shift, pending)
+
+    def _flush(self):
+        """writes the pending shift into the arrays"""
+        i, shift = self.shift_index, self.shift
+        self.shift_index = None
+        self.shift = 0
+        if i is None or not shift:
+            return
+        self.starts[i:] = array('q', [start + shift for start in self.starts[i:]])
+        self.ends[i:] = array('q', [end + shift for end in self.ends[i:]])
+
+    def span(self, number):
+        """return: (start, end) offsets of match 'number'"""
+        start, end = self.starts[number], self.ends[number]
+        if self.shift_index is not None and number >= self.shift_index:
+            return start + self.shift, end + self.shift
+        return start, end
+
+    def next_after(self, offset):
+        """return: number of the first match starting at or after offset (wrapping around), or None"""
+        if not self.starts:
+            return None
+        i = self._bisect(offset, bisect_left)
+        return i if i < len(self.starts) else 0
+
+    def prev_before(self, offset):
+        """return: number of the last match starting before offset (wrapping around), or None"""
+        if not self.starts:
+            return None
+        i = self._bisect(offset, bisect_left) - 1
+        return i if i >= 0 else len(self.starts) - 1
+
+    def on_edit(self, kind, offset, value):
+        """buffer listener : rescans the lines of the edit and shifts the matches after them
+        (a match spanning several lines next to an edit may be missed until the next search)"""
+        table = self.buffer.table
+        if kind == 'insert':
+            delta = len(value)
+        else:
+            delta = offset - value
+        # the lines touched by the edit, in the new text
+        first = table.line_start(table.offset_to_index(offset)[0])
+        last = table.line_end(table.offset_to_index(offset + max(delta, 0))[0])
+        # the matches of these lines before the edit : i..j
+        i = self._bisect(first, bisect_left)
+        j = self._bisect(last - delta, bisect_right)
+        starts, ends = find_all(table.get_text(first, last), self.pattern)
+
+        # the pending shift only grows while the edits stay in the same place
+        if self.shift_index is not None and self.shift_index != j:
+            self._flush()
+        pending = self.shift if self.shift_index is not None else 0
+        self.starts[i:j] = array('q', [first + start for start in starts])
+        self.ends[i:j] = array('q', [first + end for end in ends])
+        self.shift_index = i + len(starts)
+        self.shift = pending + delta
+
+
+def replace_all(text, pattern, replacement, regex = False, first_in_line = False, skip_empty = True):
+    """Computes every replacement of 'pattern' in 'text' at once.
+    'replacement' is a template (\\1, \\g<name>) in regex mode, a plain string otherwise.
+    first_in_line : only the first match of each line is replaced (vim's :s without 'g') ;
+    skip_empty : empty matches are left alone (Find), vim's :s/^/x/ needs them.
+    return: (count, start, end, new) : writing 'new' over text[start:end] does all the replacements"""
+    count = 0
+    first = None
+    last = 0
+    skipped = False
+    # with first_in_line : where the next line starts once a line had its replacement
+    next_line = 0
+    for match in pattern.finditer(text):
+        start, end = match.span()
+        if (skip_empty and end == start) or start < next_line:
+            skipped = True
+            continue
+        if first_in_line:
+            next_line = (text.find('\n', start) + 1) or len(text) + 1
+        if first is None:
+            first = start
+        last = end
+        count += 1
+    if first is None:
+        return 0, 0, 0, ''
+
+    if not regex:
+        # re.sub would read the backslashes of a plain string as escapes
+        replacement = replacement.replace('\\', '\\\\')
+    if skipped:
+        # re.sub would also replace the skipped matches : the slow way, one match at a time
+        next_line = 0
+        def expand(match):
+            nonlocal next_line
+            start, end = match.span()
+            if (skip_empty and end == start) or start < next_line:
+                return match.group(0)
+            if first_in_line:
+                next_line = (text.find('\n', start) + 1) or len(text) + 1
+            return match.expand(replacement)
+        new = pattern.sub(expand, text)
+    else:
+        new = pattern.sub(replacement, text)
+    # everything outside [first, last) is unchanged
+    return count, first, last, new[first:len(new) - (len(text) - last)]
+
+
+def matching_lines(text, pattern, invert = False):
+    """Scans 'text' once for the lines holding a match of 'pattern' (the other lines if invert).
+    return: list of (start, end) offsets of these lines, 'end' being the offset of their newline"""
+    size = len(text)
+    lines = []
+    position = 0
+    while position <= size:
+        match = pattern.search(text, position)
+        if match is None:
+            break
+        # a match only tells its line : the search goes on from the next line
+        start = text.rfind('\n', 0, match.start()) + 1
+        end = text.find('\n', match.start())
+        if end == -1:
+            end = size
+        lines.append((start, end))
+        position = end + 1
+    if not invert:
+        return lines
+
+    others = []
+    position = 0
+    for start, end in lines + [(size + 1, size)]:
+        # the lines between two matching lines
+        while position < start:
+            line_end = text.find('\n', position)
+            if line_end == -1:
+                line_end = size
+            others.append((position, line_end))
+            position = line_end + 1
+        position = end + 1
+    return others
+
+
+class BackgroundJob():
+    """Work done on a snapshot of a buffer by a worker thread.
+    The mainloop polls the job with root.after and calls on_done(job) when the worker is done ;
+    subclasses implement _work, which sets their results or job.error"""
+    def __init__(self, root, buffer, on_done = None):
+        self.root = root
+        self.snapshot = buffer.snapshot()
+        self.on_done = on_done
+        self.error = None
+        self.cancelled = False
+
+        self._thread = threading.Thread(target = self._run, daemon = True)
+        self._thread.start()
+        self._job = self.root.after(POLL_DELAY, self._poll)
+
+    def _run(self):
+        """worker thread"""
+        try:
+            self._work()
+        except re.error as error:
+            self.error = error
+
+    def _work(self):
+        raise NotImplementedError
+
+    def _poll(self):
+        """checks on the worker from the mainloop"""
+        self._job = None
+        if self.cancelled:
+            return
+        if self._thread.is_alive():
+            self._job = self.root.after(POLL_DELAY, self._poll)
+        elif self.on_done:
+            self.on_done(self)
+
+    def wait(self):
+        """blocks until the worker is done and calls on_done right away (macros, batch mode)"""
+        self._thread.join()
+        if self.cancelled:
+            return
+        self.cancel()
+        if self.on_done:
+            self.on_done(self)
+
+    def cancel(self):
+        """the result is not wanted anymore"""
+        self.cancelled = True
+        if self._job is not None:
+            self.root.after_cancel(self._job)
+            self._job = None
+
+
+class FindAllJob(BackgroundJob):
+    """Scans a snapshot of a buffer for every match : job.matches is the MatchList
+    (job.error is set if the pattern was invalid)"""
+    def __init__(self, root, buffer, query, regex = False, nocase = False, on_done = None):
+        self.query = query
+        self.regex = regex
+        self.nocase = nocase
+        self.matches = None
+        BackgroundJob.__init__(self, root, buffer, on_done)
+
+    def _work(self):
+        pattern = compile_pattern(self.query, self.regex, self.nocase)
+        starts, ends = find_all(self.snapshot.get_text(), pattern)
+        self.matches = MatchList(self.query, self.regex, self.nocase, self.snapshot.version, starts, ends)
+
+
+class ReplaceAllJob(BackgroundJob):
+    """Computes every replacement of a snapshot of a buffer (see replace_all) : job.count,
+    job.start, job.end and job.new (job.error is set if the pattern or the template was invalid)"""
+    def __init__(self, root, buffer, query, replacement, regex = False, nocase = False, on_done = None):
+        self.query = query
+        self.replacement = replacement
+        self.regex = regex
+        self.nocase = nocase
+        self.count = 0
+        self.start = self.end = 0
+        self.new = ''
+        BackgroundJob.__init__(self, root, buffer, on_done)
+
+    def _work(self):
+        pattern = compile_pattern(self.query, self.regex, self.nocase)
+        self.count, self.start, self.end, self.new = replace_all(
+            self.snapshot.get_text(), pattern, self.replacement, self.regex)
+
+
+# MATCHES OF SEVERAL DOCUMENTS :
+# most matches listed per document, the count still covers all of them
+MAX_RESULTS = 1000
+
+# characters of a matching line shown in the results
+LINE_PREVIEW = 200
+
+_pool = None
+
+
+def get_pool():
+    """return: the worker pool of this process, started on first use.
+    Processes, so that regex scans of many tabs really run on several cores; spawned rather than
+    forked, a fork of a process running Tk is not safe"""
+    global _pool
+    if _pool is None:
+        try:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            _pool = ProcessPoolExecutor(mp_context = multiprocessing.get_context('spawn'))
+        except (ImportError, OSError, NotImplementedError):
+            # no process support (e.g. some sandboxes) : threads still keep the mainloop free
+            from concurrent.futures import ThreadPoolExecutor
+            _pool = ThreadPoolExecutor()
+    return _pool
+
+
+def reset_pool():
+    """forgets a broken pool, a new one is started by the next search"""
+    global _pool
+    _pool = None
+
+
+def search_document(text, query, regex = False, nocase = False, limit = MAX_RESULTS):
+    """Runs in a worker of the pool.
+    return: (number of matches, [(line, col, text of the line)] of the first 'limit' matches)"""
+    pattern = compile_pattern(query, regex, nocase)
+    results = []
+    count = 0
+    line = 1
+    position = 0
+    for match in pattern.finditer(text):
+        start, end = match.span()
+        if end == start:
+            continue
+        count += 1
+        if len(results) >= limit:
+            continue
+        line += text.count('\n', position, start)
+        position = start
+        line_start = text.rfind('\n', 0, start) + 1
+        line_end = text.find('\n', start)
+        if line_end == -1:
+            line_end = len(text)
+        preview = text[line_start:min(line_end, line_start + LINE_PREVIEW)]
+        results.append((line, start - line_start, preview))
+    return count, results
+
+
+class SearchAllJob():
+    """Searches several buffers at once, one task of the worker pool per buffer.
+    documents : [(key, buffer)] ; the buffers are snapshotted right away, their text is taken and
+    handed to the pool by a thread, so the mainloop does no work in the size of the documents.
+    The mainloop polls the job with root.after and calls on_result(key, count, results) for each
+    document as soon as its task finishes, then on_done(job) ; job.error is set for an invalid regex"""
+    def __init__(self, root, documents, query, regex = False, nocase = False, on_result = None, on_done = None):
+        self.root = root
+        self.on_result = on_result
+        self.on_done = on_done
+        self.error = None
+        self.cancelled = False
+        self.total = 0
+        self._futures = []
+        # (key, future) handed over by the submitting thread, taken by _poll
+        self._submitted = queue.Queue()
+        self._thread = None
+
+        # an invalid pattern is reported before any worker is bothered
+        try:
+            compile_pattern(query, regex, nocase)
+        except re.error as error:
+            self.error = error
+            self._job = self.root.after(0, self._poll)
+            return
+
+        snapshots = [(key, buffer.snapshot()) for key, buffer in documents]
+        self._thread = threading.Thread(target = self._submit, args = (snapshots, query, regex, nocase),
+                                        daemon = True)
+        self._thread.start()
+        self._job = self.root.after(POLL_DELAY, self._poll)
+
+    def _submit(self, snapshots, query, regex, nocase):
+        """submitting thread : one task per document, in order"""
+        pool = get_pool()
+        for key, snapshot in snapshots:
+            if self.cancelled:
+                return
+            try:
+                future = pool.submit(search_document, snapshot.get_text(), query, regex, nocase)
+            except RuntimeError as error:
+                # a broken or shut down pool : the documents left are reported as failed
+                self.error = error
+                reset_pool()
+                return
+            self._submitted.put((key, future))
+            if self.cancelled:
+                future.cancel()
+
+    def _poll(self):
+        """hands the finished documents to on_result, from the mainloop"""
+        self._job = None
+        if self.cancelled:
+            return
+        # the thread is checked first : once it is done, everything it submitted is in the queue
+        submitting = self._thread is not None and self._thread.is_alive()
+        while not self._submitted.empty():
+            self._futures.append(self._submitted.get())
+        waiting = []
+        for key, future in self._futures:
+            if not future.done():
+                waiting.append((key, future))
+                continue
+            try:
+                count, results = future.result()
+            except Exception as error:
+                # e.g. a worker that died : that document is reported as failed, the others go on
+                self.error = error
+                from concurrent.futures import BrokenExecutor
+                if isinstance(error, BrokenExecutor):
+                    # the next search starts a new pool
+                    reset_pool()
+                continue
+            self.total += count
+            if self.on_result:
+                self.on_result(key, count, results)
+        self._futures = waiting
+
+        if waiting or submitting:
+            self._job = self.root.after(POLL_DELAY, self._poll)
+        elif self.on_done:
+            self.on_done(self)
+
+    def cancel(self):
+        """the results are not wanted anymore"""
+        self.cancelled = True
+        while not self._submitted.empty():
+            self._futures.append(self._submitted.get())
+        for key, future in self._futures:
+            future.cancel()
+        if self._job is not None:
+            self.root.after_cancel(self._job)
+            self._job = None
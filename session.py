@@ -0,0 +1,68 @@
+import json
+import os
+
+from file_saver import write_atomic
+from journal import STATE_DIR
+
+# the workspace of the last run : the windows, their tabs and the unsaved documents
+SESSION_FILE = os.path.join(STATE_DIR, 'session.json')
+# the unsaved documents of the session, one file per tab
+SESSION_DIR = os.path.join(STATE_DIR, 'session')
+
+SESSION_VERSION = 1
+
+# what is remembered of a tab, see tab_entry
+TAB_KEYS = ('path', 'cursor', 'scroll', 'vim', 'dirty', 'content')
+
+_counter = 0
+
+
+def tab_entry(path = None, cursor = '1.0', scroll = 0.0, vim = False, dirty = False, content = None):
+    """return: what the session remembers of one tab.
+    content : the file holding the unsaved document of a dirty tab (in SESSION_DIR)"""
+    return {'path' : path, 'cursor' : cursor, 'scroll' : scroll, 'vim' : vim, 'dirty' : dirty, 'content' : content}
+
+
+def save_content(chunks):
+    """writes the unsaved document of a tab in SESSION_DIR ; return: the path of the file"""
+    global _counter
+    os.makedirs(SESSION_DIR, exist_ok = True)
+    _counter += 1
+    path = os.path.join(SESSION_DIR, f"{os.getpid()}-{_counter}.txt")
+    write_atomic(path, chunks)
+    return path
+
+
+def write_session(windows):
+    """Writes the session : windows is a list of {'geometry', 'selected', 'tabs' : [tab_entry]}.
+    The files of SESSION_DIR no tab points to anymore are removed"""
+    os.makedirs(os.path.dirname(SESSION_FILE), exist_ok = True)
+    write_atomic(SESSION_FILE, [json.dumps({'version' : SESSION_VERSION, 'windows' : windows}, indent = 1)])
+    kept = {os.path.abspath(tab['content']) for window in windows for tab in window['tabs'] if tab.get('content')}
+    if not os.path.isdir(SESSION_DIR):
+        return
+    for name in os.listdir(SESSION_DIR):
+        path = os.path.join(SESSION_DIR, name)
+        if path not in kept:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def read_session():
+    """return: the windows of the last session, [] if there is none (or it cannot be read)"""
+    try:
+        with open(SESSION_FILE, 'r', encoding = 'utf-8') as f:
+            session = json.load(f)
+    except (OSError, ValueError):
+        return []
+    if not isinstance(session, dict) or session.get('version') != SESSION_VERSION:
+        return []
+    windows = []
+    for window in session.get('windows', []):
+        tabs = [tab_entry(**{key : tab[key] for key in TAB_KEYS if key in tab})
+                for tab in window.get('tabs', []) if isinstance(tab, dict)]
+        if tabs:
+            windows.append({'geometry' : window.get('geometry'), 'selected' : window.get('selected', 0), 'tabs' : tabs})
+    return windows
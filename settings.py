@@ -0,0 +1,141 @@
+import json
+import os
+import sys
+import tkinter as tk
+import tkinter.font as tkfont
+
+# json file in which we will store the current family, size, slant, weight changes
+FONT_FILE = "font.json"
+
+# what a tab looks like when nothing was customised yet
+DEFAULTS = {
+    'family' : "Arial",
+    'size' : 12,
+    'weight' : 'normal',
+    'slant' : 'roman',
+    'fg_color' : 'black',
+    'bg_color' : 'white',
+    # a tab left alone for this long (seconds) is hibernated, 0 : never
+    'hibernate_after' : 600,
+    # the document of a hibernated tab is kept compressed
+    'hibernate_compress' : True,
+}
+
+# settings of the whole process : FONT_FILE is read again only when its mtime changes
+_settings = {}
+_mtime = None
+
+# named fonts shared by every text widget of every window
+_fonts = {}
+
+_families = None
+
+# the font families of the system, kept between runs : asking Tk for them takes long with many fonts
+FAMILIES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.font_families.json')
+
+# where fonts get installed : the cache is out of date once one of them (or a folder in it) changes
+if sys.platform == 'win32':
+    FONT_DIRS = [os.path.join(os.environ.get('WINDIR', 'C:\\Windows'), 'Fonts'),
+                 os.path.join(os.environ.get('LOCALAPPDATA', ''), 'Microsoft', 'Windows', 'Fonts')]
+elif sys.platform == 'darwin':
+    FONT_DIRS = ['/System/Library/Fonts', '/Library/Fonts', os.path.expanduser('~/Library/Fonts')]
+else:
+    FONT_DIRS = ['/usr/share/fonts', '/usr/local/share/fonts', os.path.expanduser('~/.fonts'),
+                 os.path.expanduser('~/.local/share/fonts')]
+
+
+def load_settings():
+    """return: a copy of the settings, from the cache unless FONT_FILE changed since it was read"""
+    global _settings, _mtime
+    try:
+        mtime = os.stat(FONT_FILE).st_mtime_ns
+    except OSError:
+        _settings, _mtime = {}, None
+        return {}
+
+    if mtime != _mtime:
+        try:
+            with open(FONT_FILE, "r") as f:
+                _settings = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            _settings = {}
+        _mtime = mtime
+    return dict(_settings)
+
+
+def get_setting(key):
+    """return: one setting, or its default"""
+    return load_settings().get(key, DEFAULTS.get(key))
+
+
+def save_settings(changes):
+    """writes 'changes' over the saved settings, the other keys are kept"""
+    global _settings, _mtime
+    settings = load_settings()
+    settings.update(changes)
+    try:
+        with open(FONT_FILE, "w") as f:
+            json.dump(settings, f, indent = 4)
+        _settings, _mtime = settings, os.stat(FONT_FILE).st_mtime_ns
+    except OSError:
+        return
+
+
+def get_font(name = 'text'):
+    """return: the shared Font 'name', created from the settings on first use.
+    Every tab uses the same object : one font.configure repaints all of them"""
+    font = _fonts.get(name)
+    if font is None:
+        settings = load_settings()
+        font = tkfont.Font(
+            name = f"editor_{name}",
+            family = settings.get('family', DEFAULTS['family']),
+            size = settings.get('size', DEFAULTS['size']),
+            weight = settings.get('weight', DEFAULTS['weight']),
+            slant = settings.get('slant', DEFAULTS['slant']),
+        )
+        _fonts[name] = font
+    return font
+
+
+def families_key():
+    """return: what the cached font families depend on : the Tk version, the platform and the
+    mtimes of the font folders and of the folders right inside them (a font installed or removed
+    changes the mtime of the folder holding it)"""
+    mtimes = []
+    for directory in FONT_DIRS:
+        try:
+            entries = [directory] + sorted(entry.path for entry in os.scandir(directory) if entry.is_dir())
+        except OSError:
+            continue
+        for path in entries:
+            try:
+                mtimes.append([path, os.stat(path).st_mtime_ns])
+            except OSError:
+                pass
+    return {'tk' : tk.TkVersion, 'platform' : sys.platform, 'mtimes' : mtimes}
+
+
+def font_families():
+    """return: the sorted font families of the system, from FAMILIES_FILE while its key matches
+    (asking Tk for them is slow)"""
+    global _families
+    if _families is not None:
+        return _families
+    key = families_key()
+    try:
+        with open(FAMILIES_FILE, "r", encoding = "utf-8") as f:
+            cached = json.load(f)
+        if cached['key'] == key:
+            _families = cached['families']
+            return _families
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    _families = sorted(tkfont.families())
+    try:
+        with open(FAMILIES_FILE, "w", encoding = "utf-8") as f:
+            json.dump({'key' : key, 'families' : _families}, f)
+    except OSError:
+        pass
+    return _families
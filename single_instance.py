@@ -0,0 +1,159 @@
+import json
+import os
+import queue
+import socket
+import threading
+
+# how often the mainloop looks for the files sent by other starts (milliseconds)
+POLL_DELAY = 50
+
+# a running editor answers at once : a socket that does not is a dead one (seconds)
+TIMEOUT = 1.0
+
+# a request bigger than this is not from us
+MAX_REQUEST = 1024 * 1024
+
+
+def socket_path():
+    """return: the path of the Unix socket the running editor of this user listens on"""
+    directory = os.environ.get('XDG_RUNTIME_DIR')
+    if not directory:
+        import tempfile
+        directory = tempfile.gettempdir()
+    return os.path.join(directory, f"text_editor-{os.getuid()}.sock")
+
+
+def parse_files(arguments, cwd = None):
+    """'+12 a.txt b.txt +3 c.txt' -> [(a, 12), (b, None), (c, 3)] with absolute paths :
+    a +line goes with the file after it, as with vim"""
+    files = []
+    line = None
+    for argument in arguments:
+        if argument.startswith('+') and argument[1:].isdigit():
+            line = int(argument[1:])
+            continue
+        files.append((os.path.abspath(os.path.join(cwd or os.getcwd(), argument)), line))
+        line = None
+    return files
+
+
+def forward(arguments):
+    """Sends the files of the command line to the editor already running, which opens them.
+    Options (--instrument ...) are meant for a new process : they are never forwarded
+    return: True if a running editor took them"""
+    if not hasattr(socket, 'AF_UNIX') or any(argument.startswith('-') for argument in arguments):
+        return False
+    request = json.dumps({'files' : parse_files(arguments)}).encode('utf-8')
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(TIMEOUT)
+            client.connect(socket_path())
+            client.sendall(request)
+            client.shutdown(socket.SHUT_WR)
+            return client.recv(16).startswith(b'ok')
+    except OSError:
+        return False
+
+
+class InstanceServer():
+    """Listens, from the running editor, for the files other starts send.
+    A thread accepts the connections and queues the files, the mainloop polls the queue and gives
+    them to on_open([(path, line)])"""
+    def __init__(self, root, on_open):
+        self.root = root
+        self.on_open = on_open
+        self.path = socket_path()
+        self.requests = queue.Queue()
+        self.server = None
+        # (device, inode) of our socket file : another editor's is never removed
+        self.identity = None
+        self._job = None
+
+    def start(self):
+        """return: False if another editor already listens (this one then runs on its own)"""
+        if not hasattr(socket, 'AF_UNIX'):
+            return False
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            server.bind(self.path)
+        except OSError:
+            # a socket left by an editor that died is replaced, a live one is kept
+            if self.alive():
+                server.close()
+                return False
+            try:
+                os.unlink(self.path)
+                server.bind(self.path)
+            except OSError:
+                server.close()
+                return False
+        os.chmod(self.path, 0o600)
+        server.listen(8)
+        stat = os.stat(self.path)
+        self.identity = (stat.st_dev, stat.st_ino)
+        self.server = server
+        threading.Thread(target = self._serve, daemon = True).start()
+        self._job = self.root.after(POLL_DELAY, self._poll)
+        return True
+
+    def alive(self):
+        """return: True if an editor answers on the socket"""
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.settimeout(TIMEOUT)
+                client.connect(self.path)
+            return True
+        except OSError:
+            return False
+
+    def _serve(self):
+        """accepting thread : one request per connection, answered 'ok' once queued"""
+        while True:
+            try:
+                connection, address = self.server.accept()
+            except OSError:
+                # the server was closed
+                return
+            with connection:
+                try:
+                    connection.settimeout(TIMEOUT)
+                    data = b''
+                    while len(data) <= MAX_REQUEST:
+                        chunk = connection.recv(64 * 1024)
+                        if not chunk:
+                            break
+                        data += chunk
+                    if not data:
+                        # alive() only knocks
+                        continue
+                    files = json.loads(data.decode('utf-8'))['files']
+                    self.requests.put([(str(path), int(line) if line is not None else None) for path, line in files])
+                    connection.sendall(b'ok\n')
+                except (OSError, ValueError, KeyError, TypeError):
+                    continue
+
+    def _poll(self):
+        """opens the files received since the last poll"""
+        self._job = None
+        while not self.requests.empty():
+            self.on_open(self.requests.get())
+        self._job = self.root.after(POLL_DELAY, self._poll)
+
+    def close(self):
+        """stops listening ; the socket file goes away if it is still ours"""
+        if self._job is not None:
+            try:
+                self.root.after_cancel(self._job)
+            except Exception:
+                pass
+            self._job = None
+        if self.server is None:
+            return
+        self.server.close()
+        self.server = None
+        try:
+            stat = os.stat(self.path)
+            if (stat.st_dev, stat.st_ino) == self.identity:
+                os.unlink(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,102 @@
+import builtins
+import sys
+import threading
+import time
+
+# how many imports the report lists, the slowest first
+TOP_IMPORTS = 20
+
+
+class StartupProfile():
+    """Where the start of the editor goes (python text_editor.py --profile-startup).
+    The first import of every module is timed by wrapping builtins.__import__ : its inclusive time
+    (with the modules it imports) and its own time. The phases of the start (Tk(), TextEditor(),
+    first paint ...) are marked with phase(), report() prints both on stderr"""
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.last = self.start
+        # module : [inclusive seconds, self seconds]
+        self.imports = {}
+        # (phase, seconds) in order
+        self.phases = []
+        # time spent in the imports made by the import running, one entry per nested import
+        self.nested = []
+        self.thread = threading.get_ident()
+        self.original = None
+        self.reported = False
+
+    def install(self):
+        """must be done before the imports to measure"""
+        if self.original is not None:
+            return
+        original = builtins.__import__
+        self.original = original
+        profile = self
+
+        def __import__(name, globals = None, locals = None, fromlist = (), level = 0):
+            # relative imports and the other threads are not measured
+            if level or threading.get_ident() != profile.thread:
+                return original(name, globals, locals, fromlist, level)
+            module = sys.modules.get(name)
+            if module is None:
+                label = name
+            else:
+                # 'from tkinter import messagebox' loads a submodule : it is what gets timed
+                missing = [f"{name}.{item}" for item in fromlist or () if item != '*' and not hasattr(module, item)]
+                if not missing:
+                    return original(name, globals, locals, fromlist, level)
+                label = ', '.join(missing)
+            start = time.perf_counter()
+            profile.nested.append(0.0)
+            try:
+                return original(name, globals, locals, fromlist, level)
+            finally:
+                inclusive = time.perf_counter() - start
+                children = profile.nested.pop()
+                if profile.nested:
+                    profile.nested[-1] += inclusive
+                # a module imported again after failing (optional dependencies) adds up
+                times = profile.imports.setdefault(label, [0.0, 0.0])
+                times[0] += inclusive
+                times[1] += inclusive - children
+
+        builtins.__import__ = __import__
+
+    def uninstall(self):
+        if self.original is not None:
+            builtins.__import__ = self.original
+            self.original = None
+
+    def phase(self, name):
+        """marks the end of a phase, which started where the previous one ended"""
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last))
+        self.last = now
+
+    def watch(self, root):
+        """marks the first time 'root' is mapped, and the report once the idle work queued by then
+        (menus, vim controllers) is done"""
+        def mapped(event):
+            if event.widget is not root or self.reported:
+                return
+            self.reported = True
+            self.phase('first map')
+            root.after_idle(idle)
+
+        def idle():
+            self.phase('idle work')
+            self.report()
+        root.bind('<Map>', mapped, add = '+')
+
+    def report(self, file = None):
+        """prints the phases and the slowest imports, in milliseconds"""
+        self.uninstall()
+        file = file or sys.stderr
+        print(f"startup : {(self.last - self.start) * 1000:.1f} ms", file = file)
+        for name, duration in self.phases:
+            print(f"  {name:<24} {duration * 1000:8.1f} ms", file = file)
+
+        imports = sorted(self.imports.items(), key = lambda item: item[1][0], reverse = True)
+        print(f"{f'imports (the {TOP_IMPORTS} slowest)':<34} {'inclusive':>11} {'self':>10}", file = file)
+        for name, (inclusive, own) in imports[:TOP_IMPORTS]:
+            print(f"  {name:<32} {inclusive * 1000:8.1f} ms {own * 1000:7.1f} ms", file = file)
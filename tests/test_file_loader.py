@@ -0,0 +1,55 @@
+import pytest
+
+from file_loader import ChunkedLoader, read_chunks, CHUNK_SIZE
+from text_buffer import TextBuffer
+from tk_stub import StubText
+
+
+class StubRoot():
+    """root.after without a mainloop : the loader's batches are run by load()"""
+    def after(self, delay, function):
+        return 'after#'
+
+    def after_cancel(self, job):
+        pass
+
+
+def load(path, content = ''):
+    """loads 'path' into a stub widget mirrored by a TextBuffer ; return: (widget, buffer, completed)"""
+    text = StubText(content)
+    buffer = TextBuffer()
+    buffer.attach(text)
+    done = []
+    loader = ChunkedLoader(StubRoot(), text, str(path), on_done = done.append)
+    loader.start()
+    loader._thread.join()
+    while loader.running:
+        loader._insert_batch()
+    return text, buffer, done
+
+
+def document(lines):
+    return ''.join(f"line {i} {'x' * (i % 50)}\n" for i in range(lines))
+
+
+@pytest.mark.parametrize('content', ['', 'hello\nworld\nbye'])
+def test_multi_chunk_load_matches_the_file(tmp_path, content):
+    expected = document(20000)
+    assert len(expected) > 3 * CHUNK_SIZE
+    path = tmp_path / 'big.txt'
+    path.write_text(expected, encoding = 'utf-8')
+
+    text, buffer, done = load(path, content)
+    assert done == [True]
+    # the final newline is the one tk.Text keeps
+    assert text.get('1.0', 'end-1c') == expected[:-1]
+    assert buffer.get_text() == expected[:-1]
+    assert ''.join(buffer.chunks()) == expected
+
+
+def test_crlf_and_split_characters(tmp_path):
+    path = tmp_path / 'crlf.txt'
+    path.write_bytes(('é\r\n' * 5).encode('utf-8'))
+    assert ''.join(text for text, done in read_chunks(str(path), chunk_size = 3)) == 'é\n' * 5
+    text, buffer, done = load(path)
+    assert buffer.get_text() == 'é\n' * 4 + 'é'
@@ -0,0 +1,94 @@
+import os
+import stat
+
+import pytest
+
+from file_saver import SaveJob, write_atomic, _lock_for
+from text_buffer import TextBuffer
+
+
+def test_writes_the_chunks(tmp_path):
+    path = tmp_path / 'a.txt'
+    assert write_atomic(str(path), ['hello', '\n', 'é']) == len('hello\né'.encode('utf-8'))
+    assert path.read_text(encoding = 'utf-8') == 'hello\né'
+    # no temporary file is left behind
+    assert os.listdir(tmp_path) == ['a.txt']
+
+
+def test_keeps_the_permissions(tmp_path):
+    path = tmp_path / 'script.sh'
+    path.write_text('old')
+    os.chmod(path, 0o751)
+    write_atomic(str(path), ['new'])
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o751
+    assert path.read_text() == 'new'
+
+
+def test_failure_leaves_the_original(tmp_path):
+    path = tmp_path / 'a.txt'
+    path.write_text('original')
+
+    def chunks():
+        yield 'half of the new'
+        raise OSError('disk full')
+    with pytest.raises(OSError):
+        write_atomic(str(path), chunks())
+    assert path.read_text() == 'original'
+    assert os.listdir(tmp_path) == ['a.txt']
+
+
+def test_unencodable_text_leaves_the_original(tmp_path):
+    path = tmp_path / 'a.txt'
+    path.write_text('original')
+    with pytest.raises(UnicodeEncodeError):
+        write_atomic(str(path), ['é'], encoding = 'ascii')
+    assert path.read_text() == 'original'
+
+
+@pytest.mark.skipif(not hasattr(os, 'symlink'), reason = 'no symlinks')
+def test_saving_through_a_symlink_keeps_the_link(tmp_path):
+    target = tmp_path / 'target.txt'
+    target.write_text('old')
+    link = tmp_path / 'link.txt'
+    os.symlink(target, link)
+    write_atomic(str(link), ['new'])
+    assert os.path.islink(link)
+    assert target.read_text() == 'new'
+    assert _lock_for(str(link)) is _lock_for(str(target))
+
+
+def test_hard_links_stay_linked(tmp_path):
+    path = tmp_path / 'a.txt'
+    path.write_text('old')
+    other = tmp_path / 'b.txt'
+    os.link(path, other)
+    write_atomic(str(path), ['new'])
+    assert other.read_text() == 'new'
+    assert os.stat(path).st_ino == os.stat(other).st_ino
+    assert sorted(os.listdir(tmp_path)) == ['a.txt', 'b.txt']
+
+
+class StubRoot():
+    def after(self, delay, function):
+        return 'after#'
+
+    def after_cancel(self, job):
+        pass
+
+
+def test_saves_of_a_tab_reach_the_disk_in_order(tmp_path):
+    path = str(tmp_path / 'a.txt')
+    buffer = TextBuffer('first')
+    done = []
+    # the first save is held back until the second one is queued behind it
+    lock = _lock_for(path)
+    lock.acquire()
+    first = SaveJob(StubRoot(), path, buffer, on_done = done.append)
+    buffer.insert(len(buffer), ' second')
+    second = SaveJob(StubRoot(), path, buffer, on_done = done.append, previous = first)
+    lock.release()
+    second.wait()
+
+    assert done == [first, second]
+    assert open(path, encoding = 'utf-8').read() == 'first second\n'
+    assert not first.error and not second.error
@@ -0,0 +1,71 @@
+import pytest
+
+from headless import HeadlessText, HeadlessEditor, run_file
+
+
+@pytest.mark.parametrize('index, expected', [
+    ('end', '5.0'),
+    ('end-1c', '4.1'),
+    ('end-2c', '4.0'),
+    ('end-1l', '4.0'),
+    ('end-1c linestart', '4.0'),
+    ('end linestart', '5.0'),
+    ('1.0+100c', '5.0'),
+    ('2.0 lineend', '2.1'),
+    ('3.7', '3.1'),
+])
+def test_index_follows_tk(index, expected):
+    text = HeadlessText('a\nb\nc\nd')
+    assert text.index(index) == expected
+
+
+def test_get_to_end():
+    text = HeadlessText('a\nb')
+    assert text.get('1.0', 'end-1c') == 'a\nb'
+    assert text.get('1.0', 'end') == 'a\nb\n'
+
+
+@pytest.mark.parametrize('keys, expected', [
+    ('Gdd', 'a\nb\nc'),
+    ('ggdd', 'b\nc\nd'),
+    ('GkdG', 'a\nb'),
+    ('ggjdj', 'a\nd'),
+    ('Gkdj', 'a\nb'),
+    ('ggdG', ''),
+])
+def test_line_deletes(keys, expected):
+    editor = HeadlessEditor(content = 'a\nb\nc\nd')
+    editor.keys(keys)
+    assert editor.buffer.get_text() == expected
+
+
+def test_undo_restores_last_line():
+    editor = HeadlessEditor(content = 'a\nb\nc\nd')
+    editor.keys('Gdd')
+    editor.keys('u')
+    assert editor.buffer.get_text() == 'a\nb\nc\nd'
+    assert not editor.buffer.dirty
+
+
+def test_substitute_and_global():
+    editor = HeadlessEditor(content = 'foo bar\nbaz foo foo\nqux')
+    editor.command(':%s/foo/x/g')
+    assert editor.buffer.get_text() == 'x bar\nbaz x x\nqux'
+    editor.command(':g/baz/d')
+    assert editor.buffer.get_text() == 'x bar\nqux'
+    editor.command(':v/bar/d')
+    assert editor.buffer.get_text() == 'x bar'
+
+
+def test_substitute_e_flag():
+    editor = HeadlessEditor(content = 'abc')
+    editor.command(':s/zzz/y/e')
+    assert editor.buffer.get_text() == 'abc'
+
+
+def test_run_file_writes_back(tmp_path):
+    path = tmp_path / 'a.txt'
+    path.write_text('one\ntwo\nthree\n', encoding = 'utf-8')
+    _, messages, errors = run_file(str(path), [':%s/o/0/g', ':normal Gdd', ':w'])
+    assert errors == []
+    assert path.read_text(encoding = 'utf-8') == '0ne\ntw0\n'
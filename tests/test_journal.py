@@ -0,0 +1,84 @@
+import pytest
+
+import journal
+from journal import Journal, read_journal, get_writer
+from text_buffer import TextBuffer
+
+
+@pytest.fixture
+def journal_dir(tmp_path, monkeypatch):
+    """a writer of its own, writing in tmp_path"""
+    monkeypatch.setattr(journal, 'JOURNAL_DIR', str(tmp_path / '.journal'))
+    monkeypatch.setattr(journal, '_writer', None)
+    yield tmp_path
+    if journal._writer is not None:
+        journal._writer.stop()
+
+
+def test_replay_from_the_base_file(journal_dir):
+    path = journal_dir / 'a.txt'
+    path.write_text('hello\nworld\n', encoding = 'utf-8')
+    buffer = TextBuffer('hello\nworld')
+    tab = Journal(buffer, str(path))
+    buffer.insert(5, ',')
+    buffer.delete(0, 1)
+    buffer.insert(len(buffer), '\nbye é')
+    tab.close(discard = False)
+    get_writer().stop()
+
+    base, table, edits = read_journal(tab.path)
+    assert base == str(path)
+    assert edits == 3
+    assert table.get_text() == buffer.get_text() == 'ello,\nworld\nbye é'
+
+
+def test_replay_of_a_snapshot(journal_dir):
+    buffer = TextBuffer('draft')
+    tab = Journal(buffer)
+    tab.reset(None, buffer.table.snapshot())
+    buffer.delete(0, 1)
+    tab.close(discard = False)
+    get_writer().stop()
+
+    base, table, edits = read_journal(tab.path)
+    assert base is None
+    assert table.get_text() == 'raft'
+
+
+def test_a_cut_record_ends_the_replay(journal_dir):
+    buffer = TextBuffer('')
+    tab = Journal(buffer)
+    buffer.insert(0, 'kept')
+    buffer.insert(4, ' lost')
+    tab.close(discard = False)
+    get_writer().stop()
+
+    with open(tab.path, 'r+b') as f:
+        f.truncate(len(open(tab.path, 'rb').read()) - 2)
+    base, table, edits = read_journal(tab.path)
+    assert table.get_text() == 'kept'
+
+
+def test_state_dir_follows_xdg(monkeypatch, tmp_path):
+    monkeypatch.setattr(journal.os, 'name', 'posix')
+    monkeypatch.setenv('XDG_STATE_HOME', str(tmp_path))
+    assert journal.state_dir() == str(tmp_path / 'text_editor')
+    monkeypatch.delenv('XDG_STATE_HOME')
+    monkeypatch.setenv('HOME', str(tmp_path))
+    assert journal.state_dir() == str(tmp_path / '.local' / 'state' / 'text_editor')
+
+
+def test_no_journal_directory_turns_journaling_off(tmp_path, monkeypatch):
+    # a file where the directory should be : it cannot be created
+    blocker = tmp_path / 'state'
+    blocker.write_text('')
+    monkeypatch.setattr(journal, 'JOURNAL_DIR', str(blocker / 'journal'))
+    monkeypatch.setattr(journal, '_writer', None)
+    buffer = TextBuffer('text')
+    tab = Journal(buffer)
+    buffer.insert(0, 'more ')
+    tab.sync()
+    tab.close()
+    get_writer().stop()
+    assert tab.broken
+    assert buffer.get_text() == 'more text'
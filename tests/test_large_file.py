@@ -0,0 +1,43 @@
+import large_file
+from large_file import LineIndex, LargeFileView, MARGIN
+from tk_stub import StubText, StubScrollbar
+
+
+def write_lines(path, count, width = 20):
+    lines = [f"{i:06d}".ljust(width, '.') for i in range(1, count + 1)]
+    path.write_text('\n'.join(lines) + '\n', encoding = 'utf-8')
+    return lines
+
+
+def test_line_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(large_file, 'BLOCK_SIZE', 256)
+    path = tmp_path / 'lines.txt'
+    lines = write_lines(path, 1000)
+    index = LineIndex(str(path))
+    index._thread.join()
+    try:
+        assert index.done and index.total_lines == 1000
+        assert index.blocks == len(index.offsets) == len(index.first_lines) > 1
+        for line in (1, 2, 499, 1000):
+            assert index.line_bytes(line).decode() == lines[line - 1]
+            assert index.line_of_offset(index.line_offset(line)) == line
+        assert index.find('000777', 1, 0) == (777, 0)
+        assert index.find('000003', 500, 0, backwards = True) == (3, 0)
+    finally:
+        index.close()
+
+
+def test_window_cut_short_knows_its_last_line(tmp_path, monkeypatch):
+    monkeypatch.setattr(large_file, 'MAX_WINDOW_BYTES', 1000)
+    path = tmp_path / 'lines.txt'
+    lines = write_lines(path, 5000, width = 99)
+    view = LargeFileView(StubText(), StubScrollbar(), str(path))
+    view.index._thread.join()
+    try:
+        view.show_lines(1)
+        # 10 lines of 100 bytes fit, not the whole window
+        assert view.last_line == 10 < 1 + 2 * MARGIN
+        assert view.text.get('1.0', 'end-1c').split('\n') == lines[:10]
+        assert not view.contains(MARGIN)
+    finally:
+        view.close()
@@ -0,0 +1,70 @@
+import pytest
+
+import registers
+from headless import HeadlessEditor
+from registers import Registers
+
+
+@pytest.fixture(autouse = True)
+def fresh_registers(monkeypatch):
+    # the registers are shared by the whole process : every test starts with empty ones
+    monkeypatch.setattr(registers, '_registers', None)
+
+
+def test_uppercase_appends():
+    store = Registers()
+    store.set('a', 'foo', False)
+    store.set('A', 'bar', False)
+    assert store.get('a').text == 'foobar'
+    # a line appended makes the register linewise
+    store.set('A', 'line', True)
+    assert store.get('a').text == 'foobar\nline'
+    assert store.get('a').linewise
+    # appending to an empty register just sets it
+    store.set('B', 'x', False)
+    assert store.get('b').text == 'x'
+
+
+def test_deletes_of_lines_shift_the_numbered_registers():
+    store = Registers()
+    for number in range(1, 11):
+        store.delete(f"line {number}", True)
+    assert store.get('1').text == 'line 10'
+    assert store.get('2').text == 'line 9'
+    assert store.get('9').text == 'line 2'
+    assert store.get('"').text == 'line 10'
+    # small deletes go in '-' and leave the numbered registers alone
+    store.delete('word', False)
+    assert store.get('-').text == 'word'
+    assert store.get('1').text == 'line 10'
+    assert store.get('"').text == 'word'
+
+
+def test_yank_goes_in_zero():
+    store = Registers()
+    store.yank('foo', False)
+    store.delete('bar\n', False)
+    assert store.get('0').text == 'foo'
+    assert store.get('1').text == 'bar\n'
+
+
+def test_black_hole():
+    store = Registers()
+    store.yank('foo', False)
+    store.delete('bar', True, name = '_')
+    store.set('_', 'baz', False)
+    assert store.get('"').text == 'foo'
+    assert store.get('1') is None
+    assert store.get('_') is None
+
+
+def test_named_registers_from_keys():
+    editor = HeadlessEditor(content = 'one\ntwo\nthree')
+    editor.keys('"ayyj"Ayyj"_ddgg"ap')
+    assert editor.buffer.get_text() == 'one\none\ntwo\ntwo'
+
+
+def test_deleted_lines_come_back_from_the_numbered_registers():
+    editor = HeadlessEditor(content = 'a\nb\nc')
+    editor.keys('dddd"2p')
+    assert editor.buffer.get_text() == 'c\na'
@@ -0,0 +1,191 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import search
+from search import LiveMatches, MatchList, SearchAllJob, compile_pattern, find_all, matching_lines, replace_all
+from text_buffer import TextBuffer
+from tk_stub import StubText
+
+
+def match_list(text, query, regex = False, nocase = False):
+    starts, ends = find_all(text, compile_pattern(query, regex, nocase))
+    return MatchList(query, regex, nocase, 0, starts, ends)
+
+
+def test_find_all_offsets():
+    starts, ends = find_all('ab Ab ab', compile_pattern('ab'))
+    assert list(starts) == [0, 6]
+    assert list(ends) == [2, 8]
+
+
+def test_find_all_options():
+    text = 'ab Ab a.b'
+    assert list(find_all(text, compile_pattern('ab', nocase = True))[0]) == [0, 3]
+    # a plain query is escaped, a regex is not
+    assert list(find_all(text, compile_pattern('a.b'))[0]) == [6]
+    assert list(find_all(text, compile_pattern('a.b', regex = True))[0]) == [6]
+    assert list(find_all(text, compile_pattern('^a', regex = True))[0]) == [0]
+
+
+def test_find_all_skips_empty_matches():
+    starts, ends = find_all('aba', compile_pattern('b*', regex = True))
+    assert list(starts) == [1]
+    assert list(ends) == [2]
+
+
+def test_match_list_next_and_prev_wrap_around():
+    matches = match_list('x.x.x', 'x')
+    assert len(matches) == 3
+    assert matches.next_after(0) == 0
+    assert matches.next_after(1) == 1
+    assert matches.next_after(5) == 0
+    assert matches.prev_before(4) == 1
+    assert matches.prev_before(0) == 2
+    assert list(matches.between(1, 5)) == [1, 2]
+
+
+def test_match_list_without_matches():
+    matches = match_list('abc', 'x')
+    assert matches.next_after(0) is None
+    assert matches.prev_before(0) is None
+
+
+def test_match_list_valid_for():
+    matches = match_list('abc', 'b')
+    assert matches.valid_for('b', False, False, 0)
+    assert not matches.valid_for('b', False, False, 1)
+    assert not matches.valid_for('b', False, True, 0)
+
+
+def replaced(text, query, replacement, regex = False, **options):
+    count, start, end, new = replace_all(text, compile_pattern(query, regex), replacement, regex, **options)
+    return count, text[:start] + new + text[end:]
+
+
+def test_replace_all_plain():
+    assert replaced('a.b a.b', 'a.b', 'x') == (2, 'x x')
+    # the backslashes of a plain replacement are kept
+    assert replaced('ab', 'b', '\\1') == (1, 'a\\1')
+    assert replace_all('abc', compile_pattern('x'), 'y') == (0, 0, 0, '')
+
+
+def test_replace_all_only_returns_the_changed_part():
+    assert replace_all('--a--a--', compile_pattern('a'), 'bb') == (2, 2, 6, 'bb--bb')
+
+
+def test_replace_all_regex_template():
+    assert replaced('k=v x=y', r'(\w)=(\w)', r'\2=\1', regex = True) == (2, 'v=k y=x')
+
+
+def test_replace_all_first_in_line():
+    assert replaced('aa\naa', 'a', 'b', first_in_line = True) == (2, 'ba\nba')
+
+
+def test_replace_all_empty_matches():
+    assert replaced('a\nb', '^', '> ', regex = True) == (0, 'a\nb')
+    assert replaced('a\nb', '^', '> ', regex = True, skip_empty = False) == (2, '> a\n> b')
+
+
+def test_matching_lines():
+    text = 'foo\nbar\nfoo foo\nbaz'
+    pattern = compile_pattern('foo')
+    assert matching_lines(text, pattern) == [(0, 3), (8, 15)]
+    assert matching_lines(text, pattern, invert = True) == [(4, 7), (16, 19)]
+
+
+def test_matching_lines_at_the_ends():
+    assert matching_lines('a\n', compile_pattern('^', regex = True)) == [(0, 1), (2, 2)]
+    assert matching_lines('a\nb', compile_pattern('x')) == []
+    assert matching_lines('a\nb', compile_pattern('x'), invert = True) == [(0, 1), (2, 3)]
+
+
+def live(content, query):
+    text = StubText(content)
+    buffer = TextBuffer()
+    buffer.attach(text)
+    return text, LiveMatches(buffer, compile_pattern(query), match_list(content, query))
+
+
+def spans(matches):
+    return [matches.span(number) for number in range(len(matches))]
+
+
+def expected(text, query):
+    starts, ends = find_all(text.get('1.0', 'end-1c'), compile_pattern(query))
+    return list(zip(starts, ends))
+
+
+def test_live_matches_follow_the_edits():
+    text, matches = live('foo bar\nbar foo\nfoo', 'foo')
+    edits = [lambda: text.insert('1.0', 'xx'),
+             lambda: text.insert('2.3', ' foo'),
+             lambda: text.delete('1.2', '1.5'),
+             lambda: text.insert('3.0', 'f'),
+             lambda: text.delete('3.0', 'end-1c'),
+             lambda: text.insert('end', '\nfoofoo')]
+    for edit in edits:
+        edit()
+        assert spans(matches) == expected(text, 'foo')
+
+
+def test_live_matches_lookups_with_a_pending_shift():
+    text, matches = live('foo\nfoo\nfoo', 'foo')
+    # typing on the first line shifts the matches after it
+    text.insert('1.0', 'a')
+    text.insert('1.1', 'b')
+    assert spans(matches) == [(2, 5), (6, 9), (10, 13)]
+    assert matches.next_after(3) == 1
+    assert matches.prev_before(6) == 0
+    assert matches.next_after(11) == 0
+
+
+def test_live_matches_close():
+    text, matches = live('foo', 'foo')
+    matches.close()
+    text.insert('1.0', 'x')
+    assert spans(matches) == [(0, 3)]
+
+
+class PollingRoot():
+    """runs the root.after callbacks when the test asks for them"""
+    def __init__(self):
+        self.jobs = []
+
+    def after(self, delay, function):
+        self.jobs.append(function)
+        return function
+
+    def after_cancel(self, job):
+        self.jobs.remove(job)
+
+    def run(self, timeout = 5):
+        limit = time.monotonic() + timeout
+        while self.jobs and time.monotonic() < limit:
+            self.jobs.pop(0)()
+            time.sleep(0.001)
+
+
+def test_search_all_job(monkeypatch):
+    monkeypatch.setattr(search, '_pool', ThreadPoolExecutor())
+    hibernated = TextBuffer('no\nfoo here')
+    hibernated.compress()
+    documents = [('a', TextBuffer('foo\nbar foo')), ('b', hibernated), ('c', TextBuffer('bar'))]
+    root = PollingRoot()
+    results = {}
+    done = []
+    job = SearchAllJob(root, documents, 'foo', on_result = lambda key, count, found: results.update({key: (count, found)}),
+                       on_done = done.append)
+    # the mainloop only takes snapshots : the compressed document stays compressed
+    assert hibernated.compressed
+    root.run()
+
+    assert done == [job] and job.error is None and job.total == 3
+    assert results == {'a': (2, [(1, 0, 'foo'), (2, 4, 'bar foo')]), 'b': (1, [(2, 0, 'foo here')]), 'c': (0, [])}
+
+
+def test_search_all_job_invalid_regex():
+    root = PollingRoot()
+    done = []
+    job = SearchAllJob(root, [('a', TextBuffer('x'))], '(', regex = True, on_done = done.append)
+    root.run()
+    assert done == [job] and job.error is not None
@@ -0,0 +1,96 @@
+import os
+from types import SimpleNamespace
+
+import session
+from session import tab_entry, write_session, read_session
+from text_buffer import TextBuffer
+from text_editor import TextEditor
+from tk_stub import StubText
+
+
+class StubNotebook():
+    def __init__(self, frames, selected):
+        self.frames = frames
+        self.selected = selected
+
+    def tabs(self):
+        return [str(frame) for frame in self.frames]
+
+    def select(self):
+        return str(self.frames[self.selected])
+
+    def nametowidget(self, name):
+        return next(frame for frame in self.frames if str(frame) == name)
+
+
+class Frame():
+    def __init__(self, name):
+        self.name = name
+
+    def __str__(self):
+        return self.name
+
+
+def window(tabs, selected):
+    """a TextEditor without widgets : tabs is a list of paths, None for an empty untitled tab"""
+    frames = [Frame(f".tab{i}") for i in range(len(tabs))]
+    editor = SimpleNamespace(notebook = StubNotebook(frames, selected), placeholders = {}, file_paths = {},
+                             buffers = {}, vim_controllers = {}, hibernated = {}, viewers = {}, tabs = {},
+                             loaders = {})
+    for frame, path in zip(frames, tabs):
+        editor.file_paths[frame] = path
+        editor.buffers[frame] = TextBuffer()
+        editor.tabs[frame] = StubText()
+    return editor
+
+
+def test_selected_counts_only_the_tabs_kept():
+    editor = window([None, 'a.txt', None, 'b.txt'], selected = 3)
+    entries, selected = TextEditor.session_tabs(editor)
+    assert [entry['path'] for entry in entries] == ['a.txt', 'b.txt']
+    assert selected == 1
+
+
+def test_selected_tab_left_out():
+    editor = window(['a.txt', 'b.txt', None], selected = 2)
+    entries, selected = TextEditor.session_tabs(editor)
+    assert selected == 1
+    editor = window([None], selected = 0)
+    assert TextEditor.session_tabs(editor) == ([], 0)
+
+
+def test_dirty_placeholders_are_unsaved():
+    editor = window(['a.txt', 'b.txt', None], selected = 0)
+    frames = editor.notebook.frames
+    editor.placeholders[frames[1]] = tab_entry('b.txt', '3.0', 0.5, dirty = True, content = 'copy.txt')
+    editor.placeholders[frames[2]] = tab_entry(None, dirty = True, content = 'untitled.txt')
+    assert [TextEditor.unsaved(editor, frame) for frame in frames] == [False, True, True]
+
+    # kept : the session's copies are reopened
+    entries, selected = TextEditor.session_tabs(editor)
+    assert [entry['content'] for entry in entries] == [None, 'copy.txt', 'untitled.txt']
+    # dropped : the file as it is on disk, the untitled tab goes
+    entries, selected = TextEditor.session_tabs(editor, keep_unsaved = False)
+    assert entries[1] == tab_entry('b.txt', '3.0', 0.5)
+    assert len(entries) == 2
+
+
+def test_session_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(session, 'SESSION_FILE', str(tmp_path / 'session.json'))
+    monkeypatch.setattr(session, 'SESSION_DIR', str(tmp_path / '.session'))
+    content = session.save_content(['unsaved\n'])
+    stale = session.save_content(['old\n'])
+    tabs = [tab_entry('a.txt', '3.2', 0.5, True), tab_entry(None, dirty = True, content = content)]
+    write_session([{'geometry' : '800x600+0+0', 'selected' : 1, 'tabs' : tabs}])
+    assert read_session() == [{'geometry' : '800x600+0+0', 'selected' : 1, 'tabs' : tabs}]
+    # the content no tab points to anymore is removed
+    assert not os.path.exists(stale)
+
+
+def test_session_directory_is_created(tmp_path, monkeypatch):
+    state = tmp_path / 'state' / 'text_editor'
+    monkeypatch.setattr(session, 'SESSION_FILE', str(state / 'session.json'))
+    monkeypatch.setattr(session, 'SESSION_DIR', str(state / 'session'))
+    write_session([])
+    assert read_session() == []
+    assert (state / 'session.json').exists()
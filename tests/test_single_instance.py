@@ -0,0 +1,49 @@
+import os
+import socket
+
+import pytest
+
+import single_instance
+from single_instance import InstanceServer, forward, parse_files
+
+
+def test_parse_files_lines_go_with_the_next_file(tmp_path):
+    cwd = str(tmp_path)
+    assert parse_files(['+12', 'a.txt', 'b.txt', '+3', 'c.txt'], cwd) == [
+        (os.path.join(cwd, 'a.txt'), 12), (os.path.join(cwd, 'b.txt'), None), (os.path.join(cwd, 'c.txt'), 3)]
+
+
+def test_parse_files_paths(tmp_path):
+    cwd = str(tmp_path)
+    # absolute paths are kept, relative ones are normalized
+    assert parse_files(['/x/y.txt', 'dir/../z.txt'], cwd) == [('/x/y.txt', None), (os.path.join(cwd, 'z.txt'), None)]
+    # a '+' that is not a line number is a file name ; a last +line without a file is dropped
+    assert parse_files(['+x', '+4'], cwd) == [(os.path.join(cwd, '+x'), None)]
+
+
+class Root():
+    def after(self, delay, function):
+        return 'after#'
+
+    def after_cancel(self, job):
+        pass
+
+
+@pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason = 'no Unix sockets')
+def test_files_are_forwarded_to_the_running_editor(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmp_path))
+    opened = []
+    server = InstanceServer(Root(), opened.extend)
+    assert server.start()
+    try:
+        # a second editor does not take the socket of a live one
+        assert not InstanceServer(Root(), opened.extend).start()
+        assert forward(['+2', 'a.txt'])
+        # options are for a new process
+        assert not forward(['--instrument', 'a.txt'])
+        server._poll()
+        assert opened == [(os.path.abspath('a.txt'), 2)]
+    finally:
+        server.close()
+    assert not os.path.exists(single_instance.socket_path())
+    assert not forward(['a.txt'])
@@ -0,0 +1,132 @@
+import pytest
+
+from piece_table import PieceTable
+from text_buffer import TextBuffer
+from tk_stub import StubText
+
+
+def attached(content = ''):
+    text = StubText(content)
+    buffer = TextBuffer()
+    buffer.attach(text)
+    return text, buffer
+
+
+def test_piece_table_edits():
+    table = PieceTable('hello\nworld')
+    table.insert(5, ',')
+    table.delete(0, 1)
+    table.insert(len(table), '\n!')
+    assert table.get_text() == 'ello,\nworld\n!'
+    assert table.line_count() == 3
+    assert table.get_line(2) == 'world'
+    assert table.index_to_offset(2, 99) == table.line_end(2)
+    assert table.offset_to_index(len(table)) == (3, 1)
+
+
+def test_attach_takes_the_widget_content():
+    text, buffer = attached('a\nb')
+    assert buffer.get_text() == 'a\nb'
+
+
+def test_attach_keeping_the_table():
+    buffer = TextBuffer('a\nb')
+    table = buffer.table
+    text = StubText(buffer.get_text())
+    buffer.attach(text, keep = True)
+    assert buffer.table is table
+    text.insert('end', '\nc')
+    assert buffer.get_text() == text.get('1.0', 'end-1c') == 'a\nb\nc'
+
+
+@pytest.mark.parametrize('index', ['end', 'end-1c', '3.0', '2.99'])
+def test_insert_at_the_end(index):
+    text, buffer = attached('hello\nworld')
+    text.insert(index, '\nbye')
+    assert buffer.get_text() == text.get('1.0', 'end-1c') == 'hello\nworld\nbye'
+
+
+def test_inserts_at_end_keep_their_order():
+    text, buffer = attached()
+    for chunk in ('hello\nwor', 'ld\nbye', '\nworld2'):
+        text.insert('end', chunk)
+    assert buffer.get_text() == text.get('1.0', 'end-1c') == 'hello\nworld\nbye\nworld2'
+
+
+def test_delete_everything():
+    text, buffer = attached('hello\nworld\nbye')
+    text.delete('1.0', 'end')
+    assert buffer.get_text() == text.get('1.0', 'end-1c') == ''
+    text.insert('end', 'new')
+    assert buffer.get_text() == 'new'
+
+
+def test_delete_and_replace_mirror_the_widget():
+    text, buffer = attached('one two\nthree')
+    text.delete('1.0', '1.4')
+    text.replace('2.0', '2.5', 'four')
+    text.delete('1.2', '1.1 lineend', '2.3')
+    assert buffer.get_text() == text.get('1.0', 'end-1c')
+
+
+def test_disabled_widget_is_not_mirrored():
+    text, buffer = attached('abc')
+    text.config(state = 'disabled')
+    text.insert('end', 'x')
+    assert buffer.get_text() == text.get('1.0', 'end-1c') == 'abc'
+
+
+def test_undo_back_to_saved_is_clean():
+    text, buffer = attached('abc')
+    buffer.mark_saved()
+    text.insert('end', 'd')
+    text.edit_separator()
+    text.insert('1.0', 'x')
+    assert buffer.dirty
+    text.edit_undo()
+    text.edit_undo()
+    assert buffer.get_text() == 'abc'
+    assert not buffer.dirty
+    text.edit_redo()
+    assert buffer.dirty and buffer.get_text() == 'abcd'
+
+
+def test_new_edit_after_undo_loses_the_saved_state():
+    buffer = TextBuffer('abc')
+    buffer.insert(3, 'd')
+    buffer.mark_saved()
+    buffer.replaying('undo', lambda: buffer.delete(3, 4))
+    buffer.insert(0, 'x')
+    assert buffer.dirty
+    buffer.replaying('undo', lambda: buffer.delete(0, 1))
+    assert buffer.dirty
+
+
+def test_reset_of_a_dirty_buffer_stays_dirty():
+    text, buffer = attached('abc')
+    buffer.mark_saved()
+    text.insert('end', 'd')
+    text.edit_reset()
+    text.delete('end-2c', 'end')
+    assert buffer.get_text() == 'abc'
+    assert buffer.dirty
+
+
+def test_delete_ranges():
+    buffer = TextBuffer('0123456789')
+    buffer.delete_ranges([(1, 2), (4, 6), (8, 9)])
+    assert buffer.get_text() == '023679'
+    text, buffer = attached('0123456789')
+    buffer.delete_ranges([(1, 2), (4, 6), (8, 9)])
+    assert buffer.get_text() == text.get('1.0', 'end-1c') == '023679'
+
+
+def test_compress_and_snapshot():
+    buffer = TextBuffer('some text\n' * 100)
+    snapshot = buffer.snapshot()
+    buffer.compress()
+    assert buffer.compressed
+    buffer.insert(0, '>')
+    assert not buffer.compressed
+    assert buffer.get_text() == '>' + snapshot.get_text()
+    assert ''.join(buffer.chunks()).endswith('text\n\n')
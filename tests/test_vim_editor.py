@@ -0,0 +1,94 @@
+from types import SimpleNamespace
+
+import pytest
+
+import registers
+from headless import HeadlessEditor
+from vim_keys import SPECIAL_KEYS, split_keys
+
+
+def run(content, keys):
+    editor = HeadlessEditor(content = content)
+    editor.keys(keys)
+    return editor.buffer.get_text()
+
+
+@pytest.mark.parametrize('content, keys, expected', [
+    # the last word of the text : the operator goes to its end
+    ('foo bar', 'wdw', 'foo '),
+    ('foo bar', 'wdW', 'foo '),
+    ('foo bar', 'wde', 'foo '),
+    ('foo b', 'wcwX<Esc>', 'foo X'),
+    ('foo bar baz', 'wd2w', 'foo '),
+    ('foo bar', 'd3w', ''),
+    ('a b  ', 'wdw', 'a '),
+    # the last word of a line stops at its end
+    ('foo bar\nx', 'wdw', 'foo \nx'),
+    ('foo bar\nx', 'wcwY<Esc>', 'foo Y\nx'),
+    # a count goes on to the next lines, the end of the last word crossed still counts
+    ('a b\nc d', '3dw', 'd'),
+    ('a b\nc d', '2dw', '\nc d'),
+    ('a b\n  \nc d', '2dw', '\n  \nc d'),
+    ('a b\nc d', '2cwX<Esc>', 'X d'),
+    # words left : the motion decides
+    ('foo bar baz', 'dw', 'bar baz'),
+    ('foo bar baz', 'cwX<Esc>', 'X bar baz'),
+    ('foo\nbar', 'ld2e', 'f'),
+])
+def test_word_operators(content, keys, expected):
+    assert run(content, keys) == expected
+
+
+def test_plain_motion_past_the_last_word_does_not_move():
+    editor = HeadlessEditor(content = 'foo bar')
+    editor.keys('w')
+    editor.keys('w')
+    assert editor.text.index('insert') == '1.4'
+
+
+def test_repeat_of_dw_on_the_last_word():
+    assert run('a b c', 'wdw.') == 'a '
+
+
+def type_keys(editor, keys):
+    """types keys through the tk bindings of the editor : <Esc> has its own binding, and in insert
+    mode the keys the binding lets through are inserted by the widget"""
+    names = {token : keysym for keysym, token in SPECIAL_KEYS.items()}
+    vim = editor.vim
+    for key in split_keys(keys):
+        if key == '<Esc>':
+            vim.on_escape(SimpleNamespace(keysym = 'Escape', char = '\x1b', state = 0))
+            continue
+        event = SimpleNamespace(keysym = names.get(key, key), char = '' if key in names else key, state = 0)
+        if vim.on_key(event) is None and vim.mode == 'insert':
+            editor.text.insert('insert', '\n' if key == '<CR>' else event.char)
+
+
+def test_macro_record_and_replay(monkeypatch):
+    monkeypatch.setattr(registers, '_registers', None)
+    editor = HeadlessEditor(content = 'a\nb\nc\nd')
+    type_keys(editor, 'qq0i- <Esc>jq')
+    assert editor.vim.registers.get('q').text == '0i- <Esc>j'
+    assert editor.buffer.get_text() == '- a\nb\nc\nd'
+    type_keys(editor, '2@q')
+    assert editor.buffer.get_text() == '- a\n- b\n- c\nd'
+    # @@ runs the last macro again
+    type_keys(editor, '@@')
+    assert editor.buffer.get_text() == '- a\n- b\n- c\n- d'
+    # the keys of the replay are not recorded
+    assert editor.vim.recording is None
+
+
+
+@pytest.mark.parametrize('keys, expected', [
+    ('l<C-v>jjI-<Esc>', 'a-b\nc-d\ne-f'),
+    ('<C-v>jj$A;<Esc>', 'ab;\ncd;\nef;'),
+])
+def test_block_insert_is_one_undo_step(keys, expected):
+    editor = HeadlessEditor(content = 'ab\ncd\nef')
+    editor.keys(keys)
+    assert editor.buffer.get_text() == expected
+    editor.keys('u')
+    assert editor.buffer.get_text() == 'ab\ncd\nef'
+    editor.keys('<C-r>')
+    assert editor.buffer.get_text() == expected
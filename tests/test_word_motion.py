@@ -0,0 +1,76 @@
+import pytest
+
+from word_motion import next_word_start, prev_word_start, text_object, word_end, word_spans
+
+TEXT = ['foo.bar baz', '', '  (x) y']
+
+
+def get_line(line):
+    return TEXT[line - 1]
+
+
+def test_word_spans():
+    assert word_spans('foo.bar baz') == ([0, 3, 4, 8], [3, 4, 7, 11])
+    assert word_spans('foo.bar baz', big = True) == ([0, 8], [7, 11])
+    assert word_spans('   ') == ([], [])
+
+
+@pytest.mark.parametrize('position, big, expected', [
+    ((1, 0), False, (1, 3)),
+    ((1, 0), True, (1, 8)),
+    # an empty line is a word
+    ((1, 8), False, (2, 0)),
+    ((2, 0), False, (3, 2)),
+    ((3, 3), False, (3, 4)),
+    ((3, 6), False, None),
+])
+def test_next_word_start(position, big, expected):
+    assert next_word_start(get_line, len(TEXT), *position, big) == expected
+
+
+@pytest.mark.parametrize('position, big, expected', [
+    ((1, 9), False, (1, 8)),
+    ((1, 8), False, (1, 4)),
+    ((1, 8), True, (1, 0)),
+    ((3, 2), False, (2, 0)),
+    ((2, 0), False, (1, 8)),
+    ((1, 0), False, None),
+])
+def test_prev_word_start(position, big, expected):
+    assert prev_word_start(get_line, *position, big) == expected
+
+
+@pytest.mark.parametrize('position, options, expected', [
+    ((1, 0), {}, (1, 2)),
+    ((1, 2), {}, (1, 3)),
+    ((1, 0), {'big' : True}, (1, 6)),
+    # the empty line is skipped
+    ((1, 10), {}, (3, 2)),
+    ((3, 6), {}, None),
+    # Ctrl + Right : just after the current word
+    ((1, 0), {'exclusive' : True}, (1, 3)),
+    ((1, 3), {'exclusive' : True}, (1, 4)),
+])
+def test_word_end(position, options, expected):
+    assert word_end(get_line, len(TEXT), *position, **options) == expected
+
+
+@pytest.mark.parametrize('col, options, expected', [
+    # iw : the word, or the blanks, under the cursor
+    (1, {}, (0, 3)),
+    (3, {}, (3, 4)),
+    (7, {}, (7, 8)),
+    (0, {'count' : 3}, (0, 7)),
+    (0, {'big' : True}, (0, 7)),
+    # aw : with the blanks after it, or before it at the end of the line
+    (5, {'around' : True}, (4, 8)),
+    (9, {'around' : True}, (7, 11)),
+    (7, {'around' : True}, (7, 11)),
+    (0, {'around' : True, 'big' : True}, (0, 8)),
+])
+def test_text_object(col, options, expected):
+    assert text_object('foo.bar baz', col, **options) == expected
+
+
+def test_text_object_of_an_empty_line():
+    assert text_object('', 0) == (0, 0)
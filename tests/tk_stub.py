@@ -0,0 +1,150 @@
+import tkinter as tk
+
+from headless import HeadlessText
+
+
+class StubTk():
+    """The Tcl interpreter of StubText : the commands TextBuffer.attach renames and replaces"""
+    def __init__(self):
+        self.commands = {}
+
+    def call(self, *args):
+        if len(args) == 1 and isinstance(args[0], tuple):
+            args = args[0]
+        if args[0] == 'rename':
+            self.commands[args[2]] = self.commands.pop(args[1])
+            return ''
+        return self.commands[args[0]](*args[1:])
+
+    def createcommand(self, name, function):
+        self.commands[name] = function
+
+    def deletecommand(self, name):
+        self.commands.pop(name, None)
+
+
+class StubText():
+    """A tk.Text without a display : every method goes through the widget's Tcl command, as in
+    tkinter, so an attached TextBuffer sees the calls ; the text itself is kept by a HeadlessText,
+    which resolves the indexes the way Tk does ('end' is the line after the last one)"""
+    def __init__(self, content = '', name = '.text'):
+        self.tk = StubTk()
+        self._w = name
+        self.widget = HeadlessText(content)
+        self.widget.options['undo'] = True
+        self.tk.createcommand(name, self._command)
+
+    def __str__(self):
+        return self._w
+
+    def _command(self, operation, *args):
+        """the real widget command"""
+        widget = self.widget
+        if operation == 'edit' and args[0] in ('undo', 'redo'):
+            return self._undo(args[0])
+        if operation == 'edit':
+            return getattr(widget, 'edit_' + args[0])()
+        if operation == 'mark':
+            return widget.mark_set(*args[1:])
+        if operation == 'cget':
+            return widget.cget(args[0].lstrip('-'))
+        if operation == 'configure':
+            return widget.config(**{args[i].lstrip('-') : args[i + 1] for i in range(0, len(args), 2)})
+        return getattr(widget, operation)(*args)
+
+    def _undo(self, action):
+        """like Tk, undo and redo replay the edits through the widget command"""
+        widget = self.widget
+        stack, other = (widget.undo_stack, widget.redo_stack) if action == 'undo' else (widget.redo_stack, widget.undo_stack)
+        if not stack:
+            raise tk.TclError(f'nothing to {action}')
+        edits = stack.pop()
+        widget.replaying = True
+        try:
+            for kind, offset, text in (reversed(edits) if action == 'undo' else edits):
+                index = widget.buffer.index(offset)
+                if (kind == 'insert') == (action == 'undo'):
+                    self._call('delete', index, widget.buffer.index(offset + len(text)))
+                else:
+                    self._call('insert', index, text)
+        finally:
+            widget.replaying = False
+        other.append(edits)
+        widget.separated = True
+
+    def _call(self, *args):
+        return self.tk.call((self._w,) + args)
+
+    def index(self, index):
+        return self._call('index', index)
+
+    def get(self, start, end = None):
+        return self._call('get', start, end)
+
+    def insert(self, index, chars, *args):
+        return self._call('insert', index, chars, *args)
+
+    def delete(self, *indexes):
+        return self._call('delete', *indexes)
+
+    def replace(self, start, end, chars, *args):
+        return self._call('replace', start, end, chars, *args)
+
+    def edit_undo(self):
+        return self._call('edit', 'undo')
+
+    def edit_redo(self):
+        return self._call('edit', 'redo')
+
+    def edit_reset(self):
+        return self._call('edit', 'reset')
+
+    def edit_separator(self):
+        return self._call('edit', 'separator')
+
+    def mark_set(self, name, index):
+        return self._call('mark', 'set', name, index)
+
+    def cget(self, option):
+        return self._call('cget', '-' + option)
+
+    def config(self, **options):
+        args = []
+        for key, value in options.items():
+            args += ['-' + key, value]
+        return self._call('configure', *args)
+
+    configure = config
+
+    def bind(self, *args, **options):
+        pass
+
+    def winfo_exists(self):
+        return True
+
+    # WITHOUT A SCREEN : nothing is drawn, scrolled or scheduled
+    def winfo_height(self):
+        return 0
+
+    def dlineinfo(self, index):
+        return None
+
+    def yview(self, *args):
+        return (0.0, 1.0)
+
+    def tag_config(self, *args, **options):
+        pass
+
+    def after(self, delay, function):
+        return None
+
+    def after_cancel(self, job):
+        pass
+
+
+class StubScrollbar():
+    def config(self, **options):
+        pass
+
+    def set(self, low, high):
+        pass
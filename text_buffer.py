@@ -0,0 +1,307 @@
+import zlib
+
+from piece_table import PieceTable
+
+# deleting more ranges than this at once rewrites the text around them in one replace instead :
+# thousands of ranges would mean thousands of table edits, undo steps and journal records
+MAX_DELETE_RANGES = 256
+
+
+class TextBuffer():
+    """The document of one tab.
+    Holds a PieceTable and, when attached to a tk.Text, keeps it in step with the widget by
+    standing in for the widget's Tcl command: every insert / delete / replace that reaches the
+    widget (typing, pasting, undo, our own code) is mirrored into the table.
+    Works without a widget too, so it can be used and tested without a display"""
+    def __init__(self, content = ''):
+        self._table = PieceTable(content)
+        # the document of a hibernated tab : utf-8 bytes compressed by zlib, None when it is in the table
+        self._compressed = None
+        self.widget = None
+        self._original = None
+        # callbacks(kind, offset, value) : ('insert', offset, text) | ('delete', offset, end)
+        self.listeners = []
+        # number of edits made so far, tells if a snapshot is still the current content
+        self.version = 0
+
+        # edit generation : +1 per edit, -1 per edit undone, so undoing back to the saved content
+        # gives the saved generation again ; None : the saved content cannot be reached anymore
+        self.generation = 0
+        self.saved_generation = 0
+        # callbacks(dirty) : called when the buffer becomes dirty / clean
+        self.dirty_listeners = []
+        self._undoing = False
+        self._redoing = False
+
+    @property
+    def table(self):
+        """the PieceTable of the document ; a compressed document is decompressed on first use"""
+        if self._compressed is not None:
+            self._table = PieceTable(zlib.decompress(self._compressed).decode('utf-8'))
+            self._compressed = None
+        return self._table
+
+    @table.setter
+    def table(self, table):
+        self._table = table
+        self._compressed = None
+
+    def compress(self):
+        """keeps the document as compressed bytes until it is read again (hibernated tabs) ;
+        only a buffer without a widget can be compressed"""
+        if self.widget is not None or self._compressed is not None:
+            return
+        self._compressed = zlib.compress(self._table.get_text().encode('utf-8'), 1)
+        self._table = None
+
+    @property
+    def compressed(self):
+        return self._compressed is not None
+
+    # WIDGET :
+    def attach(self, widget, keep = False):
+        """start mirroring the edits made on a tk.Text widget, the table takes its content
+        keep : the widget already holds the document of the table (a hibernated tab woken up),
+        the table is kept as it is instead of being read back from the widget"""
+        self.widget = widget
+        name = str(widget)
+        self._original = name + '_buffer'
+        if not keep:
+            content = widget.get('1.0', 'end-1c')
+            if content or len(self.table):
+                self.table = PieceTable(content)
+        widget.tk.call('rename', name, self._original)
+        widget.tk.createcommand(name, self._dispatch)
+        widget.bind('<Destroy>', lambda event: self.detach(), add = '+')
+
+    def detach(self):
+        """stop mirroring, the table keeps the last content of the widget"""
+        if self.widget is None:
+            return
+        name = str(self.widget)
+        try:
+            self.widget.tk.deletecommand(name)
+            # the widget gets its own command back (unless it is being destroyed)
+            self.widget.tk.call('rename', self._original, name)
+        except Exception:
+            pass
+        self.widget = None
+        self._original = None
+
+    def _call(self, *args):
+        """calls the real widget command"""
+        return self.widget.tk.call((self._original,) + args)
+
+    def _offset(self, index):
+        """converts any tk index expression into an offset in the table"""
+        line, col = str(self._call('index', index)).split('.')
+        # 'end' is the line after the last one : the end of the table, not the start of its last line
+        if int(line) > self.table.line_count():
+            return len(self.table)
+        return self.table.index_to_offset(int(line), int(col))
+
+    def _dispatch(self, operation, *args):
+        """the widget command : mirrors the edits then lets the real widget do the work"""
+        if operation == 'edit' and args and args[0] in ('undo', 'redo', 'reset'):
+            return self._edit(*args)
+        if operation in ('insert', 'delete', 'replace') and args and \
+                str(self._call('cget', '-state')) != 'disabled':
+            edit = self._resolve(operation, args)
+            result = self._call(operation, *args)
+            edit()
+            return result
+        return self._call(operation, *args)
+
+    def _edit(self, action, *args):
+        """edit undo | redo | reset : the edits made by undo count backwards"""
+        if action == 'reset':
+            # the undo stack goes away, so does the way back to the saved content
+            if self.dirty:
+                self._set_saved(None)
+            return self._call('edit', action, *args)
+        return self.replaying(action, lambda: self._call('edit', action, *args))
+
+    def replaying(self, action, function):
+        """runs function(), which undoes or redoes edits ('undo' | 'redo') : the edits of an undo move
+        the generation backwards"""
+        flag = '_undoing' if action == 'undo' else '_redoing'
+        setattr(self, flag, True)
+        try:
+            return function()
+        finally:
+            setattr(self, flag, False)
+
+    def _resolve(self, operation, args):
+        """resolves the indexes before the widget changes and returns the matching table edit"""
+        if operation == 'insert':
+            # insert index chars ?tagList chars tagList ...?
+            offset = self._offset(args[0])
+            text = ''.join(args[1::2])
+            return lambda: self.insert(offset, text)
+
+        if operation == 'replace':
+            # replace index1 index2 chars ?tagList chars tagList ...?
+            start, end = self._offset(args[0]), self._offset(args[1])
+            text = ''.join(args[2::2])
+            def replace():
+                if end > start:
+                    self.delete(start, end)
+                self.insert(start, text)
+            return replace
+
+        # delete index1 ?index2 index3 index4 ...? : a lone index deletes one character
+        offsets = [self._offset(index) for index in args]
+        if len(offsets) % 2:
+            offsets.append(offsets[-1] + 1)
+        ranges = []
+        for start, end in sorted(zip(offsets[::2], offsets[1::2])):
+            # overlapping ranges are merged, as tk.Text does
+            if ranges and start <= ranges[-1][1]:
+                ranges[-1] = (ranges[-1][0], max(end, ranges[-1][1]))
+            else:
+                ranges.append((start, end))
+        def delete():
+            # deleting from the bottom keeps the lower offsets valid
+            for start, end in reversed(ranges):
+                if end > start:
+                    self.delete(start, min(end, len(self.table)))
+        return delete
+
+    # EDITING :
+    def insert(self, offset, text):
+        """inserts in the table and notifies the listeners"""
+        self.table.insert(offset, text)
+        self.version += 1
+        if text:
+            self._step()
+        for listener in self.listeners:
+            listener('insert', offset, text)
+
+    def delete(self, start, end):
+        """deletes from the table and notifies the listeners"""
+        if end <= start:
+            return
+        self.table.delete(start, end)
+        self.version += 1
+        self._step()
+        for listener in self.listeners:
+            listener('delete', start, end)
+
+    def replace(self, start, end, text):
+        """replaces [start, end) with 'text' ; through the widget when attached, as one undo step
+        that does not merge with the typing around it"""
+        if self.widget is None:
+            self.delete(start, end)
+            self.insert(start, text)
+            return
+        first, last = self.index(start), self.index(end)
+        autoseparators = self.widget.cget('autoseparators')
+        self.widget.config(autoseparators = False)
+        self.widget.edit_separator()
+        self.widget.replace(first, last, text)
+        self.widget.edit_separator()
+        self.widget.config(autoseparators = autoseparators)
+
+    def delete_ranges(self, ranges):
+        """deletes several sorted, non-overlapping [start, end) ranges in one pass, from the bottom up ;
+        through the widget when attached, as a single delete command and one undo step"""
+        if len(ranges) > MAX_DELETE_RANGES:
+            first, last = ranges[0][0], ranges[-1][1]
+            text = self.table.get_text(first, last)
+            kept = []
+            position = first
+            for start, end in ranges:
+                kept.append(text[position - first:start - first])
+                position = end
+            self.replace(first, last, ''.join(kept))
+            return
+        if self.widget is None:
+            # deleting from the bottom keeps the lower offsets valid
+            for start, end in reversed(ranges):
+                self.delete(start, end)
+            return
+        if not ranges:
+            return
+        indexes = []
+        for start, end in ranges:
+            indexes += (self.index(start), self.index(end))
+        autoseparators = self.widget.cget('autoseparators')
+        self.widget.config(autoseparators = False)
+        self.widget.edit_separator()
+        # one delete command : the widget deletes from the bottom, the table follows (see _resolve)
+        self.widget.delete(*indexes)
+        self.widget.edit_separator()
+        self.widget.config(autoseparators = autoseparators)
+
+    # SAVED STATE :
+    @property
+    def dirty(self):
+        """True if the document differs from the last loaded / saved content"""
+        return self.generation != self.saved_generation
+
+    def _step(self):
+        """moves the generation for one edit"""
+        was_dirty = self.dirty
+        if self._undoing:
+            self.generation -= 1
+        else:
+            # a new edit drops the redo stack : a saved content that was only reachable by redo is lost
+            if not self._redoing and self.saved_generation is not None and self.generation < self.saved_generation:
+                self.saved_generation = None
+            self.generation += 1
+        if self.dirty != was_dirty:
+            self._notify_dirty()
+
+    def _set_saved(self, generation):
+        was_dirty = self.dirty
+        self.saved_generation = generation
+        if self.dirty != was_dirty:
+            self._notify_dirty()
+
+    def _notify_dirty(self):
+        for listener in self.dirty_listeners:
+            listener(self.dirty)
+
+    def mark_saved(self, generation = None):
+        """the document (or the snapshot taken at 'generation') is what the file now holds"""
+        self._set_saved(self.generation if generation is None else generation)
+
+    def mark_unsaved(self):
+        """the document does not match any file (e.g. recovered, partially loaded)"""
+        self._set_saved(None)
+
+    # READING :
+    def __len__(self):
+        return len(self.table)
+
+    def get_text(self, start = 0, end = None):
+        """return: the document (or a part of it) as one string"""
+        return self.table.get_text(start, end)
+
+    def chunks(self):
+        """yields the document as it is written to disk : the pieces followed by the
+        final newline tk.Text always keeps"""
+        yield from self.table.chunks()
+        yield '\n'
+
+    def snapshot(self):
+        """return: a detached copy of the buffer that later edits do not change"""
+        copy = TextBuffer()
+        if self._compressed is not None:
+            # the bytes are not changed by edits : the copy decompresses them where it is read
+            copy._table = None
+            copy._compressed = self._compressed
+        else:
+            copy.table = self._table.snapshot()
+        copy.version = self.version
+        copy.generation = self.generation
+        return copy
+
+    def offset(self, line, col):
+        """return: offset of a tk-style (line, col) position"""
+        return self.table.index_to_offset(line, col)
+
+    def index(self, offset):
+        """return: tk-style 'line.col' index of an offset"""
+        line, col = self.table.offset_to_index(offset)
+        return f"{line}.{col}"
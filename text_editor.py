@@ -1,18 +1,41 @@
+import sys
+
+# --profile-startup : the imports and the phases of the start are timed (see startup_profile.py)
+profile = None
+if __name__ == "__main__" and '--profile-startup' in sys.argv[1:]:
+    from startup_profile import StartupProfile
+    profile = StartupProfile()
+    profile.install()
+
+# a second start hands its files to the editor already running, before loading Tk (see single_instance.py)
+if __name__ == "__main__":
+    from single_instance import forward, InstanceServer, parse_files
+    if forward(sys.argv[1:]):
+        sys.exit(0)
+
 import tkinter as tk
-from tkinter import filedialog, colorchooser, ttk, messagebox
+from tkinter import ttk
 from tkinter import *
-import tkinter.font as tkfont
-import json
+import argparse
 import os
-from vim_editor import VimEditor
+import re
+import time
+from text_buffer import TextBuffer
+from journal import Journal, AUTOSAVE_INTERVAL
+from settings import load_settings, save_settings, get_setting, get_font, font_families, DEFAULTS
+from word_motion import prev_word_start, word_end
 
-# json file in which we will store the current family, size, slant, weight changes
-FONT_FILE = "font.json"
+# how often the idle tabs are looked for, to be hibernated (milliseconds)
+HIBERNATE_CHECK = 30 * 1000
 
 class TextEditor():
     """The main class. Representing the window of the text editor with its functionalities"""
+    # every window of the editor, for the commands working on all of them
+    instances = []
+
     def __init__(self, root):
         self.root = root
+        TextEditor.instances.append(self)
         self.root.title('Labeled Text Editor')
         
         # window size
@@ -37,8 +60,32 @@ class TextEditor():
         # storing paths for saving
         self.file_paths = {}
 
-        # storing changes for not exiting and losing progress
-        self.changed = {}
+        # storing the documents (piece tables) behind the text widgets
+        self.buffers = {}
+
+        # storing the files that are still being loaded
+        self.loaders = {}
+
+        # storing the read-only views of huge files (large file mode) and the tab scrollbars they drive
+        self.viewers = {}
+        self.scrollbars = {}
+
+        # storing the saves still being written by a worker thread
+        self.saving = {}
+
+        # storing the crash-recovery journals of the tabs
+        self.journals = {}
+
+        # storing the hibernated tabs : (cursor, scroll position, vim mode) ; their widgets are destroyed
+        self.hibernated = {}
+        # storing when each tab was last shown (time.monotonic()), for hibernating the idle ones
+        self.last_used = {}
+        # storing the Find windows, a tab being searched stays awake
+        self.finders = {}
+        # storing the tabs of a restored session not loaded yet (placeholders) : their session entry
+        self.placeholders = {}
+        # storing the (session entry, title) applied once the tab's file is loaded (cursor, scroll, unsaved state)
+        self.restoring = {}
 
         
 
@@ -46,6 +93,59 @@ class TextEditor():
         self.menu = tk.Menu(root)
         self.root.config(menu = self.menu)
 
+        # the menus are filled once the window is painted (see build_menus)
+        self.root.after_idle(self.build_menus)
+
+        # root function bindings
+        self.root.bind("<Control-o>", lambda event: self.load_file())
+        self.root.bind("<Control-s>", lambda event: self.save_file())
+        self.root.bind("<Control-Shift-S>", lambda event: self.save_as_file())
+        self.root.bind("<Control-Alt-s>", lambda event: self.save_all())
+        self.root.bind("<Control-n>", lambda event: self.new_tab())
+        self.root.bind("<Control-w>", lambda event: self.close_tab())
+        self.root.bind("<Control-Shift-N>", lambda event: self.new_window())
+        self.root.bind("<Control-Shift-W>", lambda event: self.close_window())
+        self.root.bind("<Control-z>", self.undo)
+        self.root.bind("<Control-y>", self.redo)
+        self.root.bind("<Control-f>", lambda event : self.find_word())
+        self.root.bind("<Control-Shift-F>", lambda event : self.find_in_all_tabs())
+        self.root.bind("<Control-m>", lambda event : self.set_mode_current('Vim'))
+        self.root.bind("<Control-Shift-M>", lambda event : self.set_mode_current('Standard'))
+        self.root.bind("<Escape>", lambda event : self.cancel_loading())
+
+        # exit protocol
+        self.root.protocol("WM_DELETE_WINDOW", self.close_window)
+
+        # status_bar : shows which mode we are on: standard | vim (normal, insert, command)
+        self.status_bar = tk.Label(
+            self.root,
+            text='Standard',
+            anchor='e',           # right - align
+            relief='sunken',
+            bd=1,
+            fg='white',           # contrast
+            bg='#333333'          
+        )
+        self.status_bar.pack(side='bottom', fill='x')
+
+        # we pack notebook last to not take the space of the status_bar
+        self.notebook.pack(expand=True, fill='both')
+
+        # storing vim controllers
+        self.vim_controllers = {}
+
+        # create tab
+        self.create_tab('Untitled')
+
+        # the journals are made durable periodically
+        self.root.after(AUTOSAVE_INTERVAL, self.autosave)
+
+        # the tab shown is rebuilt if it was hibernated, the idle ones are looked for periodically
+        self.notebook.bind('<<NotebookTabChanged>>', self.tab_changed)
+        self.root.after(HIBERNATE_CHECK, self.hibernate_idle)
+
+    def build_menus(self):
+        """the cascades of the menu bar : built on idle, after the first paint"""
         # the FILE menu of the file
         file_menu = tk.Menu(self.menu, tearoff=0)
         self.menu.add_cascade(label='File', menu=file_menu)
@@ -55,9 +155,15 @@ class TextEditor():
         # save new file
         file_menu.add_command(label='Save As', accelerator= "Ctrl + Shift + S", command=self.save_as_file)
         file_menu.add_separator()
+        # save every tab with unsaved changes, in every window
+        file_menu.add_command(label='Save All', accelerator= "Ctrl + Alt + S", command=self.save_all)
+        file_menu.add_separator()
         # load option
         file_menu.add_command(label = 'Open File', accelerator= "Ctrl + O", command=self.load_file)
         file_menu.add_separator()
+        # stop loading a big file
+        file_menu.add_command(label = 'Cancel Loading', accelerator= "Esc", command=self.cancel_loading)
+        file_menu.add_separator()
         # open new tab
         file_menu.add_command(label='New tab', accelerator= "Ctrl + N", command=self.new_tab)
         file_menu.add_separator()
@@ -96,6 +202,9 @@ class TextEditor():
         # find option
         edit_menu.add_command(label='Find', accelerator= "Ctrl + F", command=self.find_word)
         edit_menu.add_separator()
+        # find in every tab of every window
+        edit_menu.add_command(label='Find in All Tabs', accelerator= "Ctrl + Shift + F", command=self.find_in_all_tabs)
+        edit_menu.add_separator()
         # select all option
         edit_menu.add_command(label='Select All', accelerator= "Ctrl + A", command=self.select_all)
         edit_menu.add_separator()
@@ -115,46 +224,6 @@ class TextEditor():
         mode_menu.add_command(label= 'Standard', command = lambda : self.set_mode_current('Standard'))
         mode_menu.add_command(label= 'Vim', command = lambda : self.set_mode_current('Vim'))
 
-
-        # root function bindings
-        self.root.bind("<Control-o>", lambda event: self.load_file())
-        self.root.bind("<Control-s>", lambda event: self.save_file())
-        self.root.bind("<Control-Shift-S>", lambda event: self.save_as_file())
-        self.root.bind("<Control-n>", lambda event: self.new_tab())
-        self.root.bind("<Control-w>", lambda event: self.close_tab())
-        self.root.bind("<Control-Shift-N>", lambda event: self.new_window())
-        self.root.bind("<Control-Shift-W>", lambda event: self.close_window())
-        self.root.bind("<Control-z>", self.undo)
-        self.root.bind("<Control-y>", self.redo)
-        self.root.bind("<Control-f>", lambda event : self.find_word())
-        self.root.bind("<Control-m>", lambda event : self.set_mode_current('Vim'))
-        self.root.bind("<Control-Shift-M>", lambda event : self.set_mode_current('Standard'))
-
-        # exit protocol
-        self.root.protocol("WM_DELETE_WINDOW", self.close_window)
-
-        # status_bar : shows which mode we are on: standard | vim (normal, insert, command)
-        self.status_bar = tk.Label(
-            self.root,
-            text='Standard',
-            anchor='e',           # right - align
-            relief='sunken',
-            bd=1,
-            fg='white',           # contrast
-            bg='#333333'          
-        )
-        self.status_bar.pack(side='bottom', fill='x')
-
-        # we pack notebook last to not take the space of the status_bar
-        self.notebook.pack(expand=True, fill='both')
-
-        # storing vim controllers
-        self.vim_controllers = {}
-
-        # create tab
-        self.create_tab('Untitled')
-
-
     def create_tab(self, title):
         """Initiating a tab"""
         # frame of scrollbar and text area
@@ -164,24 +233,43 @@ class TextEditor():
         #add the frame
         self.notebook.add(frame, text = title)
 
+        # import settings or defaults (cached, the file is only read again when it changes)
+        settings = load_settings()
+
+        # the document of the tab, kept when its widgets are destroyed (hibernated tab)
+        buffer = TextBuffer()
+        self.buffers[frame] = buffer
+        # every edit is also written to the tab's journal, for recovering after a crash
+        self.journals[frame] = Journal(buffer)
+        self.file_paths[frame] = None
+        self.last_used[frame] = time.monotonic()
+
+        # the buffer tells when the tab gets unsaved changes (or loses them, e.g. by undo)
+        buffer.dirty_listeners.append(lambda dirty: self.show_dirty(frame, dirty))
+
+        # if status == 'vim' then we go into the vim mode
+        text = self.build_tab(frame, settings.get('editor_mode', 'Standard') == 'Vim')
+        # every edit made on the text widget is mirrored in the tab's buffer
+        buffer.attach(text)
+
+        self.notebook.select(frame)
+        return text
+
+    def build_tab(self, frame, vim_mode = False):
+        """Creating the widgets of a tab : scrollbar, text area and its vim controller
+        return: the text widget"""
         # scrollbar
         scrollbar = ttk.Scrollbar(frame)
         scrollbar.pack(side='right', fill='y')
 
-        # import settings or defaults
-        settings = self.load_settings()
+        settings = load_settings()
 
-        # import the text styles
-        text_font = tkfont.Font(
-            family=settings.get("family", "Arial"),
-            size = settings.get("size", 12),
-            weight= settings.get("weight", 'normal'),
-            slant= settings.get("slant", 'roman'),
-        )
+        # the text style : one Font shared by all the tabs of all the windows
+        text_font = get_font()
 
         # import text and bg colors
-        fg_color = settings.get('fg_color', 'black')
-        bg_color = settings.get('bg_color', 'white')
+        fg_color = settings.get('fg_color', DEFAULTS['fg_color'])
+        bg_color = settings.get('bg_color', DEFAULTS['bg_color'])
 
         # TEXT AREA
         # initiating text area with font and color
@@ -191,91 +279,256 @@ class TextEditor():
         text.focus_set()
         scrollbar.config(command=text.yview)
 
-        # initiating the changes, tabs and paths
         self.tabs[frame] = text
-        self.file_paths[frame] = None
-        self.changed[frame] = False
+        self.scrollbars[frame] = scrollbar
 
-        # detect text changes
-        text.bind("<<Modified>>", self.on_text_modified)
         # other function bindings on text
+        text.bind("<Control-Left>", lambda event: self.move_start_word(event))
         text.bind("<Control-Right>", lambda event: self.move_end_word(event))
         text.bind("<Control-BackSpace>", lambda event: self.delete_whole_word(event))
-        
-        self.notebook.select(frame)
 
-        # initiating a vimEditor
-        controller = VimEditor(text, status_label = self.status_bar)
+        # the vim controller : a tab in standard mode gets it once the window is idle, so the first
+        # paint does not wait for the vim modules to be imported
+        if vim_mode or 'vim_editor' in sys.modules:
+            self.add_controller(frame, vim_mode)
+        else:
+            self.root.after_idle(lambda: self.add_controller(frame))
+
+        return text
+
+    def add_controller(self, frame, vim_mode = False):
+        """Initiating the vimEditor of a tab, if it has none yet
+        return: the controller, None if the tab has no widgets (closed or hibernated)"""
+        if frame in self.vim_controllers or frame not in self.tabs:
+            return self.vim_controllers.get(frame)
+        from vim_editor import VimEditor
+        controller = VimEditor(self.tabs[frame], status_label = self.status_bar, buffer = self.buffers[frame])
         controller.save_callback = self.save_file
         controller.exit_callback = self.close_tab
+        controller.view = self.viewers.get(frame)
 
         self.vim_controllers[frame] = controller
 
-        # if status == 'vim' then we go into the vim mode
-        if settings.get('editor_mode', 'Standard') == 'Vim':
+        if vim_mode:
             controller.enable()
         else:
             controller.disable()
+        return controller
+
+    def can_hibernate(self, frame):
+        """Returns : True if a tab can lose its widgets : it is not shown, it has no unsaved
+        changes (their undo history would go) and nothing is working on its widget"""
+        if frame not in self.tabs or frame in self.loaders or frame in self.saving or frame in self.viewers:
+            return False
+        if self.buffers[frame].dirty or str(frame) == str(self.notebook.select()):
+            return False
+        finder = self.finders.get(frame)
+        return finder is None or not finder.top.winfo_exists()
+
+    def hibernate(self, frame):
+        """Putting an idle tab to sleep : its widgets are destroyed, the buffer keeps the document
+        (compressed if the 'hibernate_compress' setting is on), the cursor and the scroll
+        position are kept for rebuilding the tab when it is shown again"""
+        text = self.tabs.pop(frame)
+        controller = self.vim_controllers.pop(frame, None)
+        vim_mode = controller is not None and controller.enabled
+        if controller is not None:
+            controller.close()
+        self.hibernated[frame] = (text.index('insert'), text.yview()[0], vim_mode)
+        self.finders.pop(frame, None)
+
+        buffer = self.buffers[frame]
+        buffer.detach()
+        text.destroy()
+        self.scrollbars.pop(frame).destroy()
+        if get_setting('hibernate_compress'):
+            buffer.compress()
+
+    def wake(self, frame):
+        """Rebuilding the widgets of a hibernated tab, with its document, cursor and scroll position
+        (nothing to do for a tab that is awake)"""
+        entry = self.placeholders.pop(frame, None)
+        if entry is not None:
+            self.load_placeholder(frame, entry)
+            return
+        state = self.hibernated.pop(frame, None)
+        if state is None:
+            return
+        cursor, scroll, vim_mode = state
+        buffer = self.buffers[frame]
+        text = self.build_tab(frame, vim_mode)
+        # the document goes in before the buffer follows the widget : it is not an edit
+        for chunk in buffer.table.chunks():
+            text.insert('end-1c', chunk)
+        text.edit_reset()
+        # the table already is the document : it is not read back from the widget
+        buffer.attach(text, keep = True)
+
+        text.mark_set('insert', cursor)
+        text.yview_moveto(scroll)
+        self.last_used[frame] = time.monotonic()
+
+    def tab_changed(self, event = None):
+        """<<NotebookTabChanged>> : the tab shown gets its widgets back if it was hibernated"""
+        current = str(self.notebook.select())
+        if current:
+            frame = self.notebook.nametowidget(current)
+            self.wake(frame)
+            self.last_used[frame] = time.monotonic()
+
+    def hibernate_idle(self):
+        """Periodically hibernating the tabs left alone for longer than the 'hibernate_after' setting"""
+        if not self.root.winfo_exists():
+            return
+        delay = get_setting('hibernate_after')
+        now = time.monotonic()
+        current = str(self.notebook.select())
+        for frame in list(self.tabs):
+            if str(frame) == current:
+                # the tab shown is in use : it starts idling once another one is shown
+                self.last_used[frame] = now
+            elif delay and now - self.last_used[frame] >= delay and self.can_hibernate(frame):
+                self.hibernate(frame)
+        # documents read since they were hibernated (Find in All Tabs) are compressed again
+        if get_setting('hibernate_compress'):
+            for frame in self.hibernated:
+                self.buffers[frame].compress()
+        self.root.after(HIBERNATE_CHECK, self.hibernate_idle)
 
-        return text
-        
     def get_current_text(self):
         """Returns : the current text in our text area"""
         current_tab = self.notebook.nametowidget(self.notebook.select())
+        # the tab may have just been selected, before <<NotebookTabChanged>> woke it up
+        self.wake(current_tab)
 
         # notebook - dictionary in which keys -> frames/tabs ; values -> text widgets
         return self.tabs[current_tab]
+
+    def get_current_buffer(self):
+        """Returns : the buffer (document) of the current tab"""
+        current_tab = self.notebook.nametowidget(self.notebook.select())
+        return self.buffers[current_tab]
+
+    def start_save(self, frame, path):
+        """Writing a tab's buffer to 'path' from a worker thread : the pieces are streamed to a
+        temporary file which is fsynced then renamed over 'path'
+        return: the SaveJob"""
+        from file_saver import SaveJob
+        self.status_bar.config(text = f"Saving {os.path.basename(path)}...")
+        # a save of the tab still running is written first : the snapshots reach the disk in order
+        job = SaveJob(self.root, path, self.buffers[frame], on_done = lambda job: self.save_done(frame, job),
+                      previous = self.saving.get(frame))
+        self.saving[frame] = job
+        return job
+
+    def save_done(self, frame, job):
+        """Called from the mainloop once a save is on disk (or failed)"""
+        if self.saving.get(frame) is job:
+            del self.saving[frame]
+        if not self.root.winfo_exists() or not frame.winfo_exists():
+            return
+        self.status_bar.config(text = job.summary())
+        if job.error:
+            from tkinter import messagebox
+            messagebox.showerror("Saving failed", f"Could not save {job.path}:\n{job.error}")
+            return
+
+        # the file holds the snapshot : the '*' goes away unless something was typed since
+        buffer = self.buffers[frame]
+        buffer.mark_saved(job.snapshot.generation)
+        if buffer.version == job.snapshot.version:
+            # the journal now starts from the saved file
+            self.journals[frame].reset(job.path)
+        else:
+            # the file on disk is not the journal's base anymore : it starts from the document itself
+            self.journals[frame].reset(job.path, buffer.table.snapshot())
+
+    def save_all(self, event = None):
+        """Saving every tab with unsaved changes, in every window : the files are written
+        concurrently, one worker per file. Untitled tabs are left to Save As"""
+        jobs = []
+        untitled = 0
+        for editor in TextEditor.instances:
+            if not editor.root.winfo_exists():
+                continue
+            for frame, buffer in list(editor.buffers.items()):
+                if not buffer.dirty or frame in editor.loaders or frame in editor.viewers:
+                    continue
+                path = editor.file_paths.get(frame)
+                if path:
+                    jobs.append(editor.start_save(frame, path))
+                else:
+                    untitled += 1
+        self.status_bar.config(text = f"Saving {len(jobs)} file(s)...")
+        self.save_all_done(jobs, untitled)
+        return jobs
+
+    def save_all_done(self, jobs, untitled):
+        """Reporting a Save All once every file is written"""
+        if not self.root.winfo_exists():
+            return
+        if not all(job.done for job in jobs):
+            from file_saver import POLL_DELAY
+            self.root.after(POLL_DELAY, lambda: self.save_all_done(jobs, untitled))
+            return
+        failed = sum(1 for job in jobs if job.error)
+        text = f"Saved {len(jobs) - failed} file(s)"
+        if failed:
+            text += f", {failed} failed"
+        if untitled:
+            text += f", {untitled} untitled tab(s) need Save As"
+        self.status_bar.config(text = text)
+
+    def wait_for_saves(self):
+        """Blocks until the saves in progress are on disk (before closing tabs or windows)"""
+        for job in list(self.saving.values()):
+            job.wait()
     
     def save_file(self, event = None):
         """Saving an existing file => overwritting it"""
         # current tab : frame
         current_tab = self.notebook.nametowidget(self.notebook.select())
-        current_text = self.get_current_text()
-        # content : all the text from beginning : '1.0' to end : 'tk.END'
-        content = current_text.get(1.0, tk.END)
         # search if the current file has a saved path
         path = self.file_paths.get(current_tab)
 
+        # a file opened in large file mode is read-only
+        if current_tab in self.viewers:
+            self.show_read_only()
+            return
+
         # if it does, we just overwrite the content, else : we must save the new file
         if path:
-            with open(path, 'w', encoding='utf-8') as f:
-                f.write(content)
-            frm = self.notebook.nametowidget(self.notebook.select())
-            self.changed[frm] = False
-            label = self.notebook.tab(frm, "text").rstrip("*")
-            self.notebook.tab(frm, text = label)
+            return self.start_save(current_tab, path)
         else:
-            self.save_as_file()
+            return self.save_as_file()
   
     def save_as_file(self, event = None):
         """Saving a new file non existing file | saving an existing file as another file"""
-        text = self.get_current_text()
         current_tab = self.notebook.nametowidget(self.notebook.select())
+        if current_tab in self.viewers:
+            self.show_read_only()
+            return
         # open filedialog to save the file with a name and extention
+        from tkinter import filedialog
         path = filedialog.asksaveasfilename(
             defaultextension=".txt",
             filetypes= [('Text File', '*.txt'), ('All files', '*.*')]
         )
         if path:
-            # content : the text from beginning to end
-            content = text.get(1.0, tk.END)
-            with open(file=path,mode="w", encoding="utf-8") as f:
-                f.write(content)
-
-            # updating the changed directory to no changes to this file after save, removing '*'
-            self.changed[current_tab] = False
-            label = self.notebook.tab(current_tab, "text").rstrip("*")
-            self.notebook.tab(current_tab, text = label)
-
             # adding path
             self.file_paths[current_tab] = path
 
-            # update the title
-            self.notebook.tab(current_tab, text=path.split("/")[-1])
+            # update the title, the '*' is removed once the file is written
+            marker = '*' if self.buffers[current_tab].dirty else ''
+            self.notebook.tab(current_tab, text=path.split("/")[-1] + marker)
+
+            # content : the buffer from beginning to end, streamed piece by piece by a worker
+            return self.start_save(current_tab, path)
 
     def load_file(self, event = None):
         """Loading a text file in our text editor"""
-        text = self.get_current_text()
+        self.get_current_text()
+        from tkinter import filedialog
         path = filedialog.askopenfilename(
             defaultextension='.txt',
             filetypes=[('text files' , '*.txt'), ('All files', '*.*')]
@@ -283,14 +536,114 @@ class TextEditor():
         # if the path exists our current tab will delete its content and get the content of the opened file
         if path:
             current_tab = self.notebook.nametowidget(self.notebook.select())
-            self.file_paths[current_tab] = path
-            with open(path, 'r', encoding='utf-8') as f:
-                content =  f.read()
-            text.delete(1.0,tk.END)
-            text.insert(1.0, content)
+            self.open_path(current_tab, path)
+
+    def open_path(self, frame, path):
+        """Loading the file 'path' in a tab"""
+        text = self.tabs[frame]
+        # a load still running in this tab is replaced by the new one
+        if frame in self.loaders:
+            self.loaders[frame].cancel()
+        # so is a huge file shown in this tab
+        if frame in self.viewers:
+            self.close_viewer(frame)
+        self.file_paths[frame] = path
+        # the loaded file is the journal's new base, the chunks themselves are not journaled
+        self.journals[frame].paused = True
+
+        from large_file import LARGE_FILE_SIZE
+        # huge files are not loaded at all : they are shown read-only, a screen at a time
+        if os.path.getsize(path) >= LARGE_FILE_SIZE:
+            self.open_large_file(frame, path)
+            return
 
-            # adding the title
-            self.notebook.tab(current_tab, text = path.split('/')[-1])
+        from file_loader import ChunkedLoader
+        # the file is streamed in chunks, the window stays usable while it arrives
+        previous_status = self.status_bar.cget('text')
+        loader = ChunkedLoader(
+            self.root, text, path,
+            status_label = self.status_bar,
+            on_done = lambda completed: self.loading_done(frame, loader, completed, previous_status)
+        )
+        self.loaders[frame] = loader
+        loader.start()
+
+        # adding the title
+        self.notebook.tab(frame, text = path.split('/')[-1])
+
+    def loading_done(self, frame, loader, completed, previous_status):
+        """Called when a file finished loading (or the load was cancelled)"""
+        if self.loaders.get(frame) is loader:
+            del self.loaders[frame]
+        if not self.root.winfo_exists() or not frame.winfo_exists():
+            return
+        self.status_bar.config(text = previous_status)
+        text = self.tabs[frame]
+        journal = self.journals[frame]
+        journal.paused = False
+
+        if completed:
+            # the freshly loaded file has no changes
+            self.notebook.tab(frame, text = loader.name)
+            self.buffers[frame].mark_saved()
+            journal.reset(loader.path)
+        else:
+            # a partial file must never overwrite the real one : the tab loses its path
+            journal.reset(None, self.buffers[frame].table.snapshot())
+            self.file_paths[frame] = None
+            self.notebook.tab(frame, text = f"{loader.name} (partial)*")
+            self.buffers[frame].mark_unsaved()
+            if loader.error:
+                from tkinter import messagebox
+                messagebox.showerror("Loading failed", f"Could not load {loader.name}:\n{loader.error}")
+            self.restoring.pop(frame, None)
+            return
+
+        # a tab of the last session : back where it was, with its unsaved changes
+        restoring = self.restoring.pop(frame, None)
+        if restoring is not None:
+            self.restore_tab(frame, *restoring)
+
+    def open_large_file(self, frame, path):
+        """Showing a huge file in large file mode (read-only, memory mapped)"""
+        from large_file import LargeFileView
+        text = self.tabs[frame]
+        # the buffer stops following the widget, whose content is now a window of the file
+        self.buffers[frame].detach()
+        viewer = LargeFileView(text, self.scrollbars[frame], path, status_label = self.status_bar)
+        self.viewers[frame] = viewer
+        if frame in self.vim_controllers:
+            self.vim_controllers[frame].view = viewer
+
+        # nothing can be edited : the tab never has unsaved changes
+        self.notebook.tab(frame, text = viewer.name)
+        self.buffers[frame].mark_saved()
+        # nothing can be edited : the journal only remembers the file
+        journal = self.journals[frame]
+        journal.paused = False
+        journal.reset(path)
+
+    def close_viewer(self, frame):
+        """Leaving large file mode : the tab becomes a normal (empty) editable tab"""
+        viewer = self.viewers.pop(frame)
+        viewer.close()
+        if frame in self.vim_controllers:
+            self.vim_controllers[frame].view = None
+        self.buffers[frame].attach(self.tabs[frame])
+        self.tabs[frame].edit_reset()
+        self.buffers[frame].mark_saved()
+        self.journals[frame].reset(None)
+
+    def show_read_only(self):
+        """Warning shown when saving a file opened in large file mode"""
+        from tkinter import messagebox
+        messagebox.showinfo("Read-only", "This file is opened in large file mode and cannot be edited or saved.")
+
+    def cancel_loading(self, event = None):
+        """Stops loading the file of the current tab"""
+        current_tab = self.notebook.nametowidget(self.notebook.select())
+        if current_tab in self.loaders:
+            self.loaders[current_tab].cancel()
 
     def new_tab(self, event=None):
         """Creating new tab in the window by using the funciton 'create_tab'"""
@@ -300,28 +653,69 @@ class TextEditor():
     def close_tab(self, event = None):
         """Closes one tab of the window, verifying if there are changes made"""
         current_frame = self.notebook.nametowidget(self.notebook.select())
+        # a save still being written (e.g. ':wq') decides if the tab is unsaved
+        self.wait_for_saves()
 
-        # we store in unsaved if there are any frames with modified texts
-        unsaved = [change for frame, change in self.changed.items() if change]
-
-        # if there are we ask the user to save it, else: destory the tab
-        if unsaved:
+        # if the tab has unsaved changes we ask the user to save it, else: destory the tab
+        if self.unsaved(current_frame):
+            from tkinter import messagebox
             answer = messagebox.askyesnocancel(
                 "Unsaved Changes On This Tab",
                 "Do you wish to save the changes?"
             )
 
             if answer:
-                self.save_file()
-                self.notebook.forget(current_frame)
-                current_frame.destroy()
+                if current_frame in self.placeholders:
+                    self.save_placeholder(current_frame)
+                else:
+                    self.save_file()
+                self.wait_for_saves()
+                self.destroy_tab(current_frame)
             elif answer == False:
-                self.notebook.forget(current_frame)
-                current_frame.destroy()
+                self.destroy_tab(current_frame)
             else:
                 return
         else:
-            current_frame.destroy()
+            self.destroy_tab(current_frame)
+
+    def unsaved(self, frame):
+        """Returns : True if the tab has changes that are not in its file, a tab of the last session
+        not loaded yet included (its unsaved document is only in the session's copy)"""
+        entry = self.placeholders.get(frame)
+        return self.buffers[frame].dirty or (entry is not None and entry['dirty'])
+
+    def save_placeholder(self, frame):
+        """Writing the session's copy of a dirty tab not loaded yet over its file ; an untitled one
+        has no file to go to, it is left as it is"""
+        entry = self.placeholders[frame]
+        if not entry['dirty'] or not entry['path']:
+            return
+        from file_saver import write_atomic
+        from session import tab_entry
+        try:
+            with open(entry['content'], 'r', encoding = 'utf-8') as f:
+                write_atomic(entry['path'], iter(lambda: f.read(1 << 20), ''))
+        except (OSError, UnicodeError) as error:
+            from tkinter import messagebox
+            messagebox.showerror("Saving failed", f"Could not save {entry['path']}:\n{error}")
+            return
+        self.placeholders[frame] = tab_entry(entry['path'], entry['cursor'], entry['scroll'], entry['vim'])
+        self.show_dirty(frame, False)
+
+    def destroy_tab(self, frame):
+        """Removing a tab for good : its journal is not needed anymore"""
+        if frame in self.loaders:
+            self.loaders[frame].cancel()
+        if frame in self.viewers:
+            self.viewers.pop(frame).close()
+        journal = self.journals.pop(frame, None)
+        if journal:
+            journal.close()
+        for tab_dict in (self.tabs, self.buffers, self.file_paths, self.scrollbars, self.vim_controllers,
+                         self.hibernated, self.last_used, self.finders, self.placeholders, self.restoring):
+            tab_dict.pop(frame, None)
+        self.notebook.forget(frame)
+        frame.destroy()
 
     def new_window(self, event = None):
         """Create new text editor window"""
@@ -330,36 +724,86 @@ class TextEditor():
 
     def exit_all(self, event = None):
         """Closing all widows"""
+        # the workspace is reopened next time, unsaved changes included
+        TextEditor.save_session()
+        # leaving on purpose : the journals of every window are removed
+        for journal in list(Journal.open_journals):
+            journal.close()
         tk._default_root.destroy()
 
-    def on_text_modified(self, event):
-        """Function for monitoring text changes
-        if text has changed '(.edit_modified())' : title is appended an '*'"""
-        if not self.root.winfo_exists(): 
+    def close_journals(self, every_window = False):
+        """Removing the journals of this window's tabs, or of every window's (the window is closed
+        on purpose)"""
+        for editor in (TextEditor.instances if every_window else [self]):
+            for journal in editor.journals.values():
+                journal.close()
+            editor.journals.clear()
+
+    def autosave(self):
+        """Periodically making the journals durable"""
+        if not self.root.winfo_exists():
             return
-    
-        text = self.get_current_text()
-        frm = text.master
-        # return True if was modified
-        if text.edit_modified():
-            self.changed[frm] = True
-
-            # gets the title and checks for adding the asterix
-            current_label = self.notebook.tab(frm, "text")
-            if not current_label.endswith("*"):
-                self.notebook.tab(frm, text = current_label + '*')
-
-            # not anymore modified after changing title
-            text.edit_modified(False)
-
+        for journal in self.journals.values():
+            journal.sync()
+        self.root.after(AUTOSAVE_INTERVAL, self.autosave)
+
+    def recover_journals(self):
+        """Reopening, in new tabs, the documents of editors that died without closing their tabs"""
+        from journal import find_orphans, read_journal
+        recovered = 0
+        for orphan in find_orphans():
+            try:
+                path, table, changes = read_journal(orphan)
+            except (OSError, UnicodeDecodeError):
+                continue
+            # the document was the same as its file : nothing to recover
+            if not changes:
+                try:
+                    os.remove(orphan)
+                except OSError:
+                    pass
+                continue
+
+            name = os.path.basename(path) if path else 'Untitled'
+            text = self.create_tab(name)
+            frame = text.master
+            journal = self.journals[frame]
+            journal.paused = True
+            text.insert('1.0', table.get_text())
+            text.edit_reset()
+            journal.paused = False
+
+            # the new journal holds the document before the old one goes away
+            journal.reset(path, self.buffers[frame].table.snapshot())
+            journal.remove_after(orphan)
+
+            self.file_paths[frame] = path
+            self.notebook.tab(frame, text = f"{name} (recovered)*")
+            self.buffers[frame].mark_unsaved()
+            recovered += 1
+
+        if recovered:
+            self.status_bar.config(text = f"Recovered {recovered} unsaved tab(s)")
+
+    def show_dirty(self, frame, dirty):
+        """Adding the '*' to the title of a tab with unsaved changes, removing it otherwise"""
+        if not self.root.winfo_exists() or not frame.winfo_exists():
+            return
+        label = self.notebook.tab(frame, "text")
+        if dirty and not label.endswith("*"):
+            self.notebook.tab(frame, text = label + '*')
+        elif not dirty and label.endswith("*"):
+            self.notebook.tab(frame, text = label.rstrip("*"))
 
     def close_window(self, event = None):
         """Closing window function"""
-        # check if any frame has changes
-        unsaved = [change for frame, change in self.changed.items() if change]
-
-        # if they do, make a pop up asking if they want to save the changes or not
-        if unsaved:
+        self.wait_for_saves()
+        # closing the main window closes every window : the workspace is saved for next time, and the
+        # journals of every window go (the session holds their tabs, recovery would reopen them twice)
+        last = isinstance(self.root, tk.Tk)
+        # if any tab has changes, make a pop up asking if they want to save the changes or not
+        if any(self.unsaved(frame) for frame in self.buffers):
+            from tkinter import messagebox
             answer = messagebox.askyesnocancel (
                 "Unsaved Changes",
                 "Do you wish to save the changes?"
@@ -367,53 +811,253 @@ class TextEditor():
 
             if answer:
                 self.save_file()
+                # the tabs of the last session not loaded yet are saved from the session's copy
+                for frame in list(self.placeholders):
+                    self.save_placeholder(frame)
+                # the worker must finish before the window (and maybe the process) goes away
+                self.wait_for_saves()
+                if last:
+                    TextEditor.save_session()
+                self.close_journals(every_window = last)
                 self.root.destroy()
             elif answer == False:
+                # the changes are dropped : the session reopens the files as they are on disk
+                if last:
+                    TextEditor.save_session(keep_unsaved = False)
+                self.close_journals(every_window = last)
                 self.root.destroy()
             else:
                 return
         else:
+            if last:
+                TextEditor.save_session()
+            self.close_journals(every_window = last)
             self.root.destroy()
 
+    # SESSION :
+    def session_tabs(self, keep_unsaved = True):
+        """Returns : (the session entries of the tabs of this window in order, the position of the
+        selected tab among them)"""
+        from session import tab_entry, save_content
+        entries = []
+        selected = 0
+        current = str(self.notebook.select())
+        for tab in self.notebook.tabs():
+            frame = self.notebook.nametowidget(tab)
+            # the empty untitled tabs are left out : the selected one is counted among the others
+            if str(tab) == current:
+                selected = len(entries)
+            if frame in self.placeholders:
+                entry = self.placeholders[frame]
+                if entry['dirty'] and not keep_unsaved:
+                    # its changes are dropped : the file is reopened as it is on disk
+                    if not entry['path']:
+                        continue
+                    entry = tab_entry(entry['path'], entry['cursor'], entry['scroll'], entry['vim'])
+                entries.append(entry)
+                continue
+            path = self.file_paths.get(frame)
+            buffer = self.buffers[frame]
+            # a tab whose controller is not made yet is in standard mode
+            controller = self.vim_controllers.get(frame)
+            vim_mode = controller is not None and controller.enabled
+            if frame in self.hibernated:
+                cursor, scroll, vim_mode = self.hibernated[frame]
+            elif frame in self.viewers:
+                cursor, scroll = '1.0', 0.0
+            else:
+                text = self.tabs[frame]
+                cursor, scroll = text.index('insert'), text.yview()[0]
+            # a file still loading is reopened from the disk, so is one whose changes are dropped
+            dirty = buffer.dirty and keep_unsaved and frame not in self.loaders
+            if not path and not dirty:
+                # nothing to reopen : an empty untitled tab
+                continue
+            content = save_content(buffer.chunks()) if dirty else None
+            entries.append(tab_entry(path, cursor, scroll, vim_mode, dirty, content))
+        # a selected tab left out : the tab before it
+        return entries, min(selected, max(0, len(entries) - 1))
+
+    @staticmethod
+    def save_session(keep_unsaved = True):
+        """Writing the tabs of every window to the session file, reopened on the next start"""
+        from session import write_session
+        windows = []
+        # no state directory (a read-only home) : there is no session, closing still works
+        try:
+            for editor in TextEditor.instances:
+                if not editor.root.winfo_exists():
+                    continue
+                tabs, selected = editor.session_tabs(keep_unsaved)
+                if not tabs:
+                    continue
+                windows.append({'geometry' : editor.root.geometry(), 'selected' : selected, 'tabs' : tabs})
+            write_session(windows)
+        except OSError:
+            pass
+
+    def restore_session(self):
+        """Reopening the windows and tabs of the last session : only the selected tab of each window
+        is loaded, the others are placeholders loaded when they are first shown"""
+        from session import read_session
+        windows = read_session()
+        for i, window in enumerate(windows):
+            editor = self if i == 0 else TextEditor(tk.Toplevel(self.root))
+            editor.restore_window(window)
+        return len(windows)
+
+    def restore_window(self, window):
+        """Adding the tabs of a session window, instead of the empty tab a new window starts with"""
+        empty = self.notebook.nametowidget(self.notebook.select())
+        frames = [self.add_placeholder(entry) for entry in window['tabs']]
+        if self.blank_tab(empty):
+            self.destroy_tab(empty)
+        if window.get('geometry'):
+            self.root.geometry(window['geometry'])
+        selected = frames[max(0, min(window.get('selected', 0), len(frames) - 1))]
+        self.notebook.select(selected)
+        self.wake(selected)
+
+    def blank_tab(self, frame):
+        """Returns : True for an untouched empty untitled tab (the one a new window starts with)"""
+        if frame in self.placeholders or frame in self.loaders or frame in self.viewers:
+            return False
+        buffer = self.buffers[frame]
+        return not buffer.dirty and not self.file_paths.get(frame) and not len(buffer)
+
+    def open_files(self, files):
+        """Opening [(path, line)] from the command line, or sent by another start : each file in
+        its own tab, the cursor on its line ; a file already open is only shown"""
+        self.root.deiconify()
+        self.root.lift()
+        self.root.focus_force()
+        for path, line in files:
+            frame = next((frame for frame, open_path in self.file_paths.items() if open_path == path), None)
+            if frame is not None:
+                if frame in self.placeholders:
+                    # not loaded yet : the line replaces the cursor of the session
+                    if line:
+                        self.placeholders[frame].update(cursor = f"{line}.0", scroll = None)
+                    self.notebook.select(frame)
+                    self.wake(frame)
+                elif line:
+                    self.go_to(frame, line, 0)
+                else:
+                    self.notebook.select(frame)
+                continue
+
+            current = self.notebook.nametowidget(self.notebook.select())
+            if not self.blank_tab(current):
+                self.new_tab()
+                current = self.notebook.nametowidget(self.notebook.select())
+            if not os.path.exists(path):
+                # a new file : it is created by the first save
+                self.file_paths[current] = path
+                self.notebook.tab(current, text = os.path.basename(path))
+                continue
+            from session import tab_entry
+            self.restoring[current] = (tab_entry(path, f"{line or 1}.0", None), os.path.basename(path))
+            self.open_path(current, path)
+            if current in self.viewers:
+                self.restoring.pop(current, None)
+
+    def add_placeholder(self, entry):
+        """Adding a tab of the last session without loading it : a frame and a title only, the
+        widgets and the file come when the tab is first shown (see wake)
+        return: the frame"""
+        path = entry['path']
+        frame = ttk.Frame(self.notebook, padding=10)
+        if path:
+            title = os.path.basename(path)
+        else:
+            self.tab_counter += 1
+            title = f"Untitled {self.tab_counter}"
+        self.notebook.add(frame, text = title + ('*' if entry['dirty'] else ''))
+
+        buffer = TextBuffer()
+        self.buffers[frame] = buffer
+        self.file_paths[frame] = path
+        self.last_used[frame] = time.monotonic()
+        buffer.dirty_listeners.append(lambda dirty: self.show_dirty(frame, dirty))
+        self.placeholders[frame] = entry
+        return frame
+
+    def load_placeholder(self, frame, entry):
+        """Loading a tab of the last session, when it is first shown"""
+        buffer = self.buffers[frame]
+        self.journals[frame] = Journal(buffer)
+        text = self.build_tab(frame, entry['vim'])
+        buffer.attach(text)
+
+        # the unsaved document kept by the session, or the file itself
+        source = entry['content'] if entry['dirty'] else entry['path']
+        if not source or not os.path.exists(source):
+            self.status_bar.config(text = f"Could not reopen {entry['path'] or 'an untitled tab'}")
+            return
+        # the title is the file's, not the one of the session's copy
+        self.restoring[frame] = (entry, self.tab_name(frame))
+        self.open_path(frame, source)
+        if frame in self.viewers:
+            self.restoring.pop(frame, None)
+
+    def restore_tab(self, frame, entry, title):
+        """Putting a reloaded session tab back as it was : its path, title, unsaved state, cursor and scroll"""
+        text = self.tabs[frame]
+        path = entry['path']
+        if entry['dirty']:
+            # the document was loaded from the session's copy : it differs from its file
+            self.file_paths[frame] = path
+            self.notebook.tab(frame, text = title)
+            self.journals[frame].reset(path, self.buffers[frame].table.snapshot())
+            self.buffers[frame].mark_unsaved()
+        text.mark_set('insert', entry['cursor'])
+        # no scroll position (a file opened at a +line) : the cursor is shown
+        if entry['scroll'] is None:
+            text.see('insert')
+        else:
+            text.yview_moveto(entry['scroll'])
+
+    def word_lines(self, text):
+        """return: (get_line, line count, line, col) for the word motions : a line is read from the
+        widget once, as a string"""
+        line, col = (int(part) for part in text.index("insert").split('.'))
+        line_count = int(text.index("end-1c").split('.')[0])
+        get_line = lambda number: text.get(f"{number}.0", f"{number}.0 lineend")
+        return get_line, line_count, line, col
+
+    def move_start_word(self, event):
+        """Control + Left : move cursor at the beginning of the current/previous word"""
+        text = event.widget
+        get_line, line_count, line, col = self.word_lines(text)
+        target = prev_word_start(get_line, line, col)
+        text.mark_set("insert", f"{target[0]}.{target[1]}" if target else "1.0")
+        text.see("insert")
+        return "break"
+
     def move_end_word(self, event):
         """Control + Right : move cursor at the end of the current/next word"""
         text = event.widget
-        current = text.index("insert")
-        end_current = text.index("insert wordend")
-
-        # if our cursor is on a space we jump at the end of the next word, otherwise the cursor jumps 
-        # at the end of the current word
-        char = text.get(current)
-        if char.isspace():
-            text.mark_set("insert", "insert +1c wordend")
-        else:
-            text.mark_set("insert", end_current)
-
+        get_line, line_count, line, col = self.word_lines(text)
+        # on a space we jump at the end of the next word, otherwise at the end of the current word
+        target = word_end(get_line, line_count, line, col, exclusive = True)
+        text.mark_set("insert", f"{target[0]}.{target[1]}" if target else "end-1c")
+        text.see("insert")
         return "break"
-    
-    
+
     def delete_whole_word(self, event):
         """Control + Backspace : Deleting an entire word"""
         text = event.widget
-        current_insert = text.index("insert")
-        
-        # check if the index is at the beginning of the line
-        if current_insert == "1.0":
-            return "break"
-        
-        # we move the index to the left till it finds a character
-        start_index = current_insert
-        while start_index != "1.0" and text.get(f"{start_index} -1c").isspace():
-            start_index = text.index(f"{start_index} -1c")
+        get_line, line_count, line, col = self.word_lines(text)
 
-        # we set the start_index at the beginning of the word
-        start_index = text.index(f"{start_index} -1c wordstart")
+        # the start of the word before the cursor (the spaces between are deleted too)
+        target = prev_word_start(get_line, line, col)
+        start_index = f"{target[0]}.{target[1]}" if target else "1.0"
 
         # we delete the word
-        text.delete(start_index, current_insert)
+        text.delete(start_index, "insert")
 
         return "break"
-    
+
     def undo(self, event = None):
         """Undo function"""
         text = self.get_current_text()
@@ -468,27 +1112,68 @@ class TextEditor():
     
     def find_word(self, event = None):
         """Opening a window for finding a word"""
-        FindWindow(self.root, self.get_current_text())
+        current_tab = self.notebook.nametowidget(self.notebook.select())
+        # one Find window per tab : a second one would take over the scrolling of the text
+        finder = self.finders.get(current_tab)
+        if finder is not None and finder.top.winfo_exists():
+            finder.top.deiconify()
+            finder.top.lift()
+            finder.entry.focus_set()
+            return
+        self.finders[current_tab] = FindWindow(self.root, self.get_current_text(), self.get_current_buffer(),
+                                               self.viewers.get(current_tab), status_label = self.status_bar)
+
+    def find_in_all_tabs(self, event = None):
+        """Opening a window for finding a word in every open tab"""
+        SearchAllWindow(self.root, TextEditor.all_documents, status_label = self.status_bar)
+
+    @staticmethod
+    def all_documents():
+        """Returns : [((editor, frame), buffer)] for the tabs of every window, in order.
+        Tabs in large file mode, and the tabs of a restored session not loaded yet, are left out :
+        their file is not in a buffer"""
+        TextEditor.instances = [editor for editor in TextEditor.instances if editor.root.winfo_exists()]
+        documents = []
+        for editor in TextEditor.instances:
+            for tab in editor.notebook.tabs():
+                frame = editor.notebook.nametowidget(tab)
+                if frame in editor.buffers and frame not in editor.viewers and frame not in editor.placeholders:
+                    documents.append(((editor, frame), editor.buffers[frame]))
+        return documents
+
+    @staticmethod
+    def all_texts():
+        """Returns : the text widgets of every tab of every window"""
+        return [text for editor in TextEditor.instances if editor.root.winfo_exists()
+                for text in editor.tabs.values() if text.winfo_exists()]
+
+    def tab_name(self, frame):
+        """Returns : the title of a tab, without its '*'"""
+        return self.notebook.tab(frame, "text").rstrip("*")
+
+    def go_to(self, frame, line, col):
+        """Showing a tab of this window with the cursor at line.col"""
+        if not self.root.winfo_exists() or not frame.winfo_exists():
+            return False
+        self.root.deiconify()
+        self.root.lift()
+        self.notebook.select(frame)
+        self.wake(frame)
+        text = self.tabs[frame]
+        text.mark_set("insert", f"{line}.{col}")
+        text.see("insert")
+        text.focus_set()
+        return True
 
     def custom(self, event = None):
         """Opening a window for customising"""
         CustomWindow(self.root, self.get_current_text())
 
-    def load_settings(self):
-        """Loading and returning json file content"""
-        if os.path.exists(FONT_FILE):
-            try:
-                with open(FONT_FILE, "r") as f:
-                    return json.load(f)
-            except json.JSONDecodeError:
-                return {}
-
-        return {}
-    
     def get_current_controller(self):
         """return: current controller"""
         frm = self.notebook.nametowidget(self.notebook.select())
-        return self.vim_controllers.get(frm)
+        self.wake(frm)
+        return self.add_controller(frm)
     
     def set_mode_current(self, mode_value : str):
         # getting the frame
@@ -507,12 +1192,29 @@ class TextEditor():
 
 class FindWindow():
     """Window for the find function"""
-    def __init__(self, master, text_widget):
+    def __init__(self, master, text_widget, buffer, view = None, status_label = None):
         """Return an entry of which the text is then searched in the imported text 
         widget using buttons for finding next and previous match"""
         self.top = tk.Toplevel(master)
         self.top.title("Find")
         self.text = text_widget
+        # the search runs on the buffer, the widget is only used for showing the match
+        self.buffer = buffer
+        # in large file mode the search runs on the file itself, through the view
+        self.view = view
+        # "match i of N" is shown in the editor's status bar
+        self.status_label = status_label
+
+        # Find All : every match of the buffer, found once by a worker (MatchList)
+        self.matches = None
+        self.job = None
+        # number of the match the cursor is on
+        self.current = None
+        # (start, end) offsets of the part of the buffer whose matches are tagged
+        self.shown = None
+        self._highlight_job = None
+        # (start, end, buffer version) of the match the cursor is on, the one Replace replaces
+        self.found = None
 
         # setting window sizes and position
         screen_width = master.winfo_screenwidth()
@@ -525,48 +1227,427 @@ class FindWindow():
         self.entry = tk.Entry(self.top)
         self.entry.pack()
 
+        # search options
+        self.regex_var = tk.BooleanVar(value = False)
+        self.nocase_var = tk.BooleanVar(value = False)
+        tk.Checkbutton(self.top, text = "Regex", variable = self.regex_var).pack()
+        tk.Checkbutton(self.top, text = "Ignore case", variable = self.nocase_var).pack()
+
         tk.Button(self.top, text = "Find Prev", command=self.find_prev).pack()
         tk.Button(self.top, text = "Find Next", command=self.find_next).pack()
+        # Find All scans a whole buffer, large file mode only searches from the cursor
+        tk.Button(self.top, text = "Find All", command=self.find_all,
+                  state = 'disabled' if view is not None else 'normal').pack()
+
+        # replacing : a plain text, or a template (\1, \g<name>) in regex mode
+        # large file mode is read-only
+        replace_state = 'disabled' if view is not None else 'normal'
+        tk.Label(self.top, text = "Replace with").pack()
+        self.replace_entry = tk.Entry(self.top, state = replace_state)
+        self.replace_entry.pack()
+        tk.Button(self.top, text = "Replace", command=self.replace, state = replace_state).pack()
+        tk.Button(self.top, text = "Replace All", command=self.replace_all, state = replace_state).pack()
+
+        # all the visible matches are yellow, the current one orange
+        self.text.tag_config("highlight", background="yellow")
+        self.text.tag_config("current_match", background="orange")
+        self.text.tag_raise("current_match")
+
+        # matches are tagged only where the user looks : the tags follow the scrolling
+        self.scroll_command = self.text.cget('yscrollcommand')
+        if self.view is None:
+            self.text.config(yscrollcommand = self.on_scroll)
+        # the Tcl name of on_scroll, for knowing at close if the text still scrolls through it
+        self.scroll_name = str(self.text.cget('yscrollcommand'))
+
+        self.top.protocol("WM_DELETE_WINDOW", self.close)
+
+    def show_status(self, text):
+        """Showing search results in the status bar"""
+        if self.status_label is not None:
+            self.status_label.config(text = text)
+
+    def options(self):
+        """Returns : the query and the search options"""
+        return self.entry.get(), self.regex_var.get(), self.nocase_var.get()
+
+    def cursor_offset(self):
+        """Returns : the offset of the cursor in the buffer"""
+        return self.buffer.offset(*map(int, self.text.index("insert").split('.')))
 
     def find_next(self):
         """Highlighting the next match and moving cursor at the end of it"""
+        self.find(backwards = False)
 
-        # query : the word we are searching for
-        query = self.entry.get()
+    def find_prev(self):
+        """Highlighting the previous match and moving cursor at the beginning of it"""
+        self.find(backwards = True)
 
-        # position : the position at which 'query' is found
-        position = self.text.search(query, "insert", stopindex = "end")
+    def find(self, backwards, scanned = False):
+        """Moving to the next | previous match : a bisect in the Find All matches when they are
+        up to date, a plain search of the buffer otherwise"""
+        query, regex, nocase = self.options()
+        if not query:
+            return
+
+        if self.view is not None:
+            if not self.view.find(query, backwards = backwards):
+                from tkinter import messagebox
+                messagebox.showwarning("Word not found", "Word does not exist!")
+            return
+
+        if self.matches is not None and self.matches.valid_for(query, regex, nocase, self.buffer.version):
+            self.step(backwards)
+            return
+
+        # regex / ignore case searches, and searches after a Find All, (re)scan the buffer first
+        if not scanned and (regex or nocase or self.matches is not None):
+            self.find_all(then = lambda: self.find(backwards, scanned = True))
+            return
+
+        if backwards:
+            # position : the position at which 'query' is found, searched backwards from the cursor
+            found = self.buffer.table.rfind(query, 0, self.cursor_offset())
+        else:
+            # position : the position at which 'query' is found, searched in the buffer from the cursor
+            found = self.buffer.table.find(query, self.cursor_offset())
+        position = self.buffer.index(found) if found != -1 else ''
 
         # if position is found we highlight and move cursor, else: warning
         if position:
+            self.found = (found, found + len(query), self.buffer.version)
             end = f"{position} + {len(query)}c"
             self.text.tag_remove("highlight", "1.0", "end")
             self.text.tag_add("highlight", position, end)
-            self.text.tag_config("highlight", background="yellow")
-            self.text.mark_set("insert", end)
+            self.text.mark_set("insert", position if backwards else end)
             self.text.see(position)
         else:
+            from tkinter import messagebox
             messagebox.showwarning("Word not found", "Word does not exist!")
 
-    def find_prev(self):
-        """Highlighting the previous match and moving cursor at the beginning of it"""
+    def step(self, backwards):
+        """Moving to the next | previous match of the Find All list"""
+        matches = self.matches
+        cursor = self.cursor_offset()
+        current = self.current
+        # stepping from the current match, or from the cursor if it was moved elsewhere
+        if current is not None and current < len(matches) and \
+                cursor in (matches.starts[current], matches.ends[current]):
+            i = (current + (-1 if backwards else 1)) % len(matches)
+        elif backwards:
+            i = matches.prev_before(cursor)
+        else:
+            i = matches.next_after(cursor)
 
-        # query : the word we are searching for
-        query = self.entry.get()
+        if i is None:
+            from tkinter import messagebox
+            messagebox.showwarning("Word not found", "Word does not exist!")
+            return
+        self.jump(i, backwards)
+
+    def jump(self, i, backwards = False):
+        """Selecting match number 'i' of the Find All list"""
+        start = self.buffer.index(self.matches.starts[i])
+        end = self.buffer.index(self.matches.ends[i])
+        self.text.tag_remove("current_match", "1.0", "end")
+        self.text.tag_add("current_match", start, end)
+        self.text.mark_set("insert", start if backwards else end)
+        self.text.see(start)
+        self.current = i
+        self.found = (self.matches.starts[i], self.matches.ends[i], self.buffer.version)
+        self.show_status(f"match {i + 1} of {len(self.matches)}")
+        self.highlight_visible()
+
+    def find_all(self, then = None):
+        """Scanning the whole buffer once, in a worker, for every match of the query"""
+        query, regex, nocase = self.options()
+        if not query or self.view is not None:
+            return
+        if self.job is not None:
+            self.job.cancel()
+        from search import FindAllJob
+        self.show_status("Searching...")
+        self.job = FindAllJob(self.top, self.buffer, query, regex, nocase,
+                              on_done = lambda job: self.find_all_done(job, then))
+
+    def find_all_done(self, job, then):
+        """Receiving the matches of a Find All"""
+        self.job = None
+        if not self.text.winfo_exists():
+            return
+        if job.error:
+            self.show_status("Invalid pattern")
+            from tkinter import messagebox
+            messagebox.showerror("Invalid pattern", str(job.error))
+            return
 
-        # position : the position at which 'query' is found
-        position = self.text.search(query, "insert", stopindex = "1.0", backwards = True)
+        self.clear_highlight()
+        self.matches = job.matches
+        self.current = None
+        if not len(self.matches):
+            self.show_status("No matches")
+            from tkinter import messagebox
+            messagebox.showwarning("Word not found", "Word does not exist!")
+            return
 
-        # if position is found we highlight and move cursor, else: warning
-        if position:
-            end = f"{position} + {len(query)}c"
-            self.text.tag_remove("highlight", "1.0", "end")
-            self.text.tag_add("highlight", position, end)
-            self.text.tag_config("highlight", background="yellow")
-            self.text.mark_set("insert", position)
-            self.text.see(position)
-        else:
+        self.show_status(f"{len(self.matches)} matches")
+        self.highlight_visible()
+        if then:
+            then()
+
+    def editable(self):
+        """Returns : False (with a message) while the text cannot be edited, e.g. during a load"""
+        if str(self.text.cget('state')) == 'disabled':
+            self.show_status("The file is still loading")
+            return False
+        return True
+
+    def replacement_of(self, start, end):
+        """Returns : the text replacing the match [start, end), None if it is not a match anymore"""
+        from search import compile_pattern
+        query, regex, nocase = self.options()
+        pattern = compile_pattern(query, regex, nocase)
+        # the lines of the match are enough for the anchors of the pattern
+        table = self.buffer.table
+        window_start = table.line_start(table.offset_to_index(start)[0])
+        window_end = table.line_end(table.offset_to_index(end)[0])
+        match = pattern.match(table.get_text(window_start, window_end), start - window_start)
+        if match is None or match.end() != end - window_start:
+            return None
+        return match.expand(self.replace_entry.get()) if regex else self.replace_entry.get()
+
+    def replace(self):
+        """Replacing the match the cursor is on, then moving to the next one"""
+        query, regex, nocase = self.options()
+        if not query or self.view is not None or not self.editable():
+            return
+        # nothing selected yet (or the text changed since) : Replace first finds the next match
+        if self.found is None or self.found[2] != self.buffer.version:
+            self.find_next()
+            return
+
+        start, end, version = self.found
+        try:
+            new = self.replacement_of(start, end)
+        except re.error as error:
+            from tkinter import messagebox
+            messagebox.showerror("Invalid pattern", str(error))
+            return
+        self.found = None
+        if new is not None:
+            self.buffer.replace(start, end, new)
+            self.text.mark_set("insert", self.buffer.index(start + len(new)))
+        self.find_next()
+
+    def replace_all(self):
+        """Computing every replacement in a worker, then applying them as one edit"""
+        query, regex, nocase = self.options()
+        if not query or self.view is not None or not self.editable():
+            return
+        if self.job is not None:
+            self.job.cancel()
+        from search import ReplaceAllJob
+        self.show_status("Replacing...")
+        self.job = ReplaceAllJob(self.top, self.buffer, query, self.replace_entry.get(), regex, nocase,
+                                 on_done = self.replace_all_done)
+
+    def replace_all_done(self, job):
+        """Applying the replacements of a Replace All : one replace of the span going from the
+        first match to the last, a single undo step and a single <<Modified>>"""
+        self.job = None
+        if not self.text.winfo_exists():
+            return
+        if job.error:
+            self.show_status("Invalid pattern")
+            from tkinter import messagebox
+            messagebox.showerror("Invalid pattern", str(job.error))
+            return
+        # the text changed while the replacements were computed : computing them again
+        if job.snapshot.version != self.buffer.version:
+            self.replace_all()
+            return
+        if not job.count:
+            self.show_status("No matches")
+            from tkinter import messagebox
             messagebox.showwarning("Word not found", "Word does not exist!")
+            return
+        if not self.editable():
+            return
+
+        self.clear_highlight()
+        self.matches = None
+        self.current = None
+        self.found = None
+        self.buffer.replace(job.start, job.end, job.new)
+        self.text.mark_set("insert", self.buffer.index(job.start))
+        self.text.see("insert")
+        self.show_status(f"Replaced {job.count} matches")
+
+    def on_scroll(self, first, last):
+        """yscrollcommand of the text : updates the scrollbar, then the tags of the visible matches"""
+        if self.scroll_command:
+            self.text.tk.call(*self.text.tk.splitlist(self.scroll_command), first, last)
+        if self.matches is not None and self._highlight_job is None:
+            self._highlight_job = self.top.after_idle(self.highlight_visible)
+
+    def highlight_visible(self):
+        """Tagging the matches of the visible lines only, whatever the number of matches"""
+        self._highlight_job = None
+        if self.matches is None or not self.text.winfo_exists():
+            return
+        # matches of an older version of the buffer would be tagged at the wrong place
+        if self.matches.version != self.buffer.version:
+            self.clear_highlight()
+            self.matches = None
+            return
+
+        top = int(self.text.index("@0,0").split('.')[0])
+        bottom = int(self.text.index(f"@0,{self.text.winfo_height()}").split('.')[0])
+        start = self.buffer.offset(top, 0)
+        end = self.buffer.table.line_end(bottom)
+        if self.shown == (start, end):
+            return
+
+        if self.shown is not None:
+            self.text.tag_remove("highlight", self.buffer.index(self.shown[0]), self.buffer.index(self.shown[1]))
+        ranges = []
+        for i in self.matches.between(start, end):
+            ranges.append(self.buffer.index(self.matches.starts[i]))
+            ranges.append(self.buffer.index(self.matches.ends[i]))
+        if ranges:
+            self.text.tag_add("highlight", *ranges)
+        self.shown = (start, end)
+
+    def clear_highlight(self):
+        """Removing the tags of the matches"""
+        self.text.tag_remove("highlight", "1.0", "end")
+        self.text.tag_remove("current_match", "1.0", "end")
+        self.shown = None
+
+    def close(self):
+        """Closing the window : the text gets its scrolling and colors back"""
+        if self.job is not None:
+            self.job.cancel()
+        if self._highlight_job is not None:
+            self.top.after_cancel(self._highlight_job)
+        if self.text.winfo_exists():
+            self.clear_highlight()
+            # the scrolling is given back only if it is still ours
+            if self.view is None and str(self.text.cget('yscrollcommand')) == self.scroll_name:
+                self.text.config(yscrollcommand = self.scroll_command)
+        self.top.destroy()
+
+
+class SearchAllWindow():
+    """Window for finding a word in every open tab of every window.
+    The tabs are searched in parallel by the worker pool, the results are listed as each tab
+    finishes ; clicking a result shows it in its tab"""
+    def __init__(self, master, documents, status_label = None):
+        self.top = tk.Toplevel(master)
+        self.top.title("Find in All Tabs")
+        self.top.geometry("600x350")
+        # documents() : [((editor, frame), buffer)] to search
+        self.documents = documents
+        self.status_label = status_label
+        self.job = None
+        # one entry per line of the list : (editor, frame, line, col), None for the tab headers
+        self.locations = []
+
+        # query and options
+        options = tk.Frame(self.top)
+        options.pack(fill = 'x')
+        self.entry = tk.Entry(options)
+        self.entry.pack(side = 'left', expand = True, fill = 'x')
+        self.entry.bind("<Return>", lambda event: self.search())
+        self.regex_var = tk.BooleanVar(value = False)
+        self.nocase_var = tk.BooleanVar(value = False)
+        tk.Checkbutton(options, text = "Regex", variable = self.regex_var).pack(side = 'left')
+        tk.Checkbutton(options, text = "Ignore case", variable = self.nocase_var).pack(side = 'left')
+        tk.Button(options, text = "Search", command = self.search).pack(side = 'left')
+
+        # results panel
+        results = tk.Frame(self.top)
+        results.pack(expand = True, fill = 'both')
+        scrollbar = ttk.Scrollbar(results)
+        scrollbar.pack(side = 'right', fill = 'y')
+        self.results = tk.Listbox(results, activestyle = 'none', yscrollcommand = scrollbar.set)
+        self.results.pack(expand = True, fill = 'both')
+        scrollbar.config(command = self.results.yview)
+        self.results.bind("<<ListboxSelect>>", self.open_result)
+        self.results.bind("<Return>", self.open_result)
+
+        self.summary = tk.Label(self.top, anchor = 'w')
+        self.summary.pack(fill = 'x')
+
+        self.top.protocol("WM_DELETE_WINDOW", self.close)
+        self.entry.focus_set()
+
+    def search(self):
+        """Starting the search of every tab"""
+        query = self.entry.get()
+        if not query:
+            return
+        if self.job is not None:
+            self.job.cancel()
+        self.results.delete(0, 'end')
+        self.locations = []
+        self.files = 0
+        from search import SearchAllJob
+        self.summary.config(text = "Searching...")
+        self.job = SearchAllJob(
+            self.top, self.documents(), query, self.regex_var.get(), self.nocase_var.get(),
+            on_result = self.add_results, on_done = self.search_done
+        )
+
+    def add_results(self, key, count, results):
+        """Listing the matches of one tab, as soon as its search is finished"""
+        if not count:
+            return
+        editor, frame = key
+        if not frame.winfo_exists():
+            return
+        self.files += 1
+        shown = f", first {len(results)}" if len(results) < count else ""
+        self.results.insert('end', f"{editor.tab_name(frame)} ({count} matches{shown})")
+        self.results.itemconfig('end', foreground = 'gray30')
+        self.locations.append(None)
+        for line, col, preview in results:
+            self.results.insert('end', f"    {line}: {preview}")
+            self.locations.append((editor, frame, line, col))
+        self.summary.config(text = f"{self.job.total} matches in {self.files} tab(s)...")
+
+    def search_done(self, job):
+        """All the tabs are searched"""
+        self.job = None
+        if isinstance(job.error, re.error):
+            self.summary.config(text = "Invalid pattern")
+            from tkinter import messagebox
+            messagebox.showerror("Invalid pattern", str(job.error))
+            return
+        text = f"{job.total} matches in {self.files} tab(s)"
+        if job.error:
+            text += " (some tabs could not be searched)"
+        self.summary.config(text = text)
+        if self.status_label is not None:
+            self.status_label.config(text = text)
+
+    def open_result(self, event = None):
+        """Showing the clicked match in its tab"""
+        selection = self.results.curselection()
+        if not selection or selection[0] >= len(self.locations):
+            return
+        location = self.locations[selection[0]]
+        if location is None:
+            return
+        editor, frame, line, col = location
+        if not editor.go_to(frame, line, col):
+            self.summary.config(text = "This tab was closed")
+
+    def close(self):
+        """Closing the window : the search still running is dropped"""
+        if self.job is not None:
+            self.job.cancel()
+        self.top.destroy()
 
 
 class CustomWindow():
@@ -596,17 +1677,18 @@ class CustomWindow():
         self.family_var = tk.StringVar()
 
         # dropdown for all options
-        sorted_families = sorted(tkfont.families())
+        sorted_families = font_families()
         self.family_dropdown = ttk.Combobox(
             self.top,
             textvariable=self.family_var,
             values = sorted_families
         )
 
-        # getting the current font and then family for setting default value of dropdown to that one
-        current_font = tkfont.Font(font = self.text.cget('font'))
-        current_family = current_font.cget('family')
-        self.family_dropdown.current(sorted_families.index(current_family))
+        # the font shared by all the tabs, its family is the default value of the dropdown
+        self.font = get_font()
+        current_family = self.font.cget('family')
+        if current_family in sorted_families:
+            self.family_dropdown.current(sorted_families.index(current_family))
         self.family_dropdown.pack()
         # binding the change text on selecting one
         self.family_dropdown.bind("<<ComboboxSelected>>", self.apply_family)
@@ -641,7 +1723,7 @@ class CustomWindow():
         size_button.pack()
 
         # get current size and insert it as default value in the size entry
-        current_size = current_font.cget('size')
+        current_size = self.font.cget('size')
         self.entry.insert(0,  current_size)
 
         # text color change
@@ -655,22 +1737,17 @@ class CustomWindow():
 
         # getting the family from our variable
         selected_family = self.family_var.get()
-        # configuring font
-        font = tkfont.Font(font = self.text.cget("font"))
-        font.configure(family= selected_family)
-
-        # configuring text
-        self.text.configure(font = font)
-        
+        # configuring the shared font repaints every tab
+        self.font.configure(family= selected_family)
 
     def apply_style(self):
         """changes font style (weight | slant)"""
 
         # getting the text selected on dropdown
         style = self.style_var.get()
-        # getting the current Font
-        font = tkfont.Font(font=self.text.cget("font"))
-                                
+        # the shared Font of all the tabs
+        font = self.font
+
         # checks if the selected text is bold or italic, and toggles or clears the formatting.
         if style == "Bold":
             if font.actual("weight") == "bold":
@@ -686,32 +1763,32 @@ class CustomWindow():
             # Remove formatting
             font.configure(weight = "normal", slant="roman")
 
-        self.text.configure(font = font)
-
     def change_size(self):
         """Configurating new text size"""
         new_size = int(self.entry.get())
-        size = tkfont.Font(font = self.text.cget("font"))
-        size.configure(size = int(new_size))
-        self.text.configure(font = size)
+        self.font.configure(size = int(new_size))
 
     def choose_text_color(self):
         """Function for selecting and configurating text color"""
         # bring the custom window to the front
         self.top.lift()  
 
+        from tkinter import colorchooser
         color = colorchooser.askcolor(parent=self.top, title="Choose text color")
         if color and color[1]:
-            self.text.config(fg=color[1])
+            for text in TextEditor.all_texts():
+                text.config(fg=color[1])
 
     def choose_bg_color(self):
         """Function for selecting and configurating background color"""
         # keep the custom window to the front
         self.top.lift()
 
+        from tkinter import colorchooser
         color = colorchooser.askcolor(parent = self.top, title = "Choose background color")
         if color and color[1]:
-            self.text.config(bg = color[1])
+            for text in TextEditor.all_texts():
+                text.config(bg = color[1])
 
     def close(self):
         """Automatically saves changes made to font when closing the custom window"""
@@ -720,36 +1797,76 @@ class CustomWindow():
 
     def save_settings(self):
         """Saving actual font style, size, color"""
-
-        # geting all the text settings needed
-        font = tkfont.Font(font = self.text.cget("font"))
-        family = font.cget('family')
-        size = font.cget('size')
-        slant = font.cget('slant')
-        weight = font.cget('weight')
-
-        # storing the settings in a dictionary
-        current_settings = {
-            'family' : family,
-            'size' : size,
-            'weight' : weight,
-            'slant' : slant,
+        # the other settings (e.g. the editor mode) are kept
+        save_settings({
+            'family' : self.font.cget('family'),
+            'size' : self.font.cget('size'),
+            'weight' : self.font.cget('weight'),
+            'slant' : self.font.cget('slant'),
             'fg_color' : self.text.cget('fg'),
             'bg_color' : self.text.cget('bg')
-        }
+        })
 
-        # saving the settings in the FONT_FILE
-        try:
-            with open(FONT_FILE, "w") as f:
-                json.dump(current_settings, f, indent = 4)
-        except json.JSONDecodeError:
-            return
-        
 
 if __name__ == "__main__":
+    # batch mode : the commands run on the files without any window (see headless.py)
+    if '--headless' in sys.argv[1:]:
+        from headless import main
+        sys.exit(main([arg for arg in sys.argv[1:] if arg != '--headless']))
+
+    parser = argparse.ArgumentParser(prog = 'text_editor.py', description = 'Labeled Text Editor')
+    parser.add_argument('files', nargs = '*', metavar = '[+LINE] FILE',
+                        help = "files to open, each in a tab ; +LINE puts the cursor on a line of the next file")
+    parser.add_argument('--new-instance', action = 'store_true',
+                        help = "start a new editor instead of opening the files in the one running")
+    parser.add_argument('--headless', action = 'store_true', help = "batch mode, see --headless --help")
+    parser.add_argument('--instrument', action = 'store_true', help = "measure the latency of the callbacks")
+    parser.add_argument('--slow-ms', type = float, help = "with --instrument : callbacks slower than this are logged")
+    parser.add_argument('--latency-report', help = "with --instrument : where the histograms are written")
+    parser.add_argument('--slow-log', help = "with --instrument : where the slow callbacks are logged")
+    parser.add_argument('--profile-startup', action = 'store_true',
+                        help = "print the time taken by the imports and the phases of the start")
+    args = parser.parse_args()
+    if profile is not None:
+        profile.phase('imports')
+
+    # opt-in latency measures : tkinter is patched before any widget registers a callback
+    instruments = None
+    if args.instrument:
+        from instrumentation import Instrumentation
+        instruments = Instrumentation.from_argv(sys.argv[1:])
+        instruments.install()
+
     root = tk.Tk()
+    if profile is not None:
+        profile.phase('Tk()')
+        profile.watch(root)
     editor = TextEditor(root)
-
-    # print(tkfont.families())
-
-    root.mainloop()
\ No newline at end of file
+    if profile is not None:
+        profile.phase('TextEditor()')
+    # the windows and tabs of the last run, only the shown tabs are loaded
+    editor.restore_session()
+    editor.open_files(parse_files(args.files))
+    if profile is not None:
+        profile.phase('session and files')
+    if instruments is not None:
+        instruments.attach(root, editor.status_bar)
+
+    # the files of later starts are opened here, in new tabs (see single_instance.py)
+    server = InstanceServer(root, editor.open_files)
+    if not args.new_instance:
+        server.start()
+
+    # tabs left behind by a crash are reopened once the window is up
+    root.after_idle(editor.recover_journals)
+
+    root.mainloop()
+    server.close()
+
+    # the histograms are written once the editor is closed (--latency-report)
+    if instruments is not None:
+        instruments.finish()
+
+    # the journals still queued are written before leaving
+    from journal import get_writer
+    get_writer().stop()
@@ -1,18 +1,157 @@
+import re
 import tkinter as tk
 
+from vim_keys import Command, KeyTrie, CommandParser, key_token, split_keys
+from registers import get_registers
+from word_motion import next_word_start, prev_word_start, word_end, text_object
+from search import compile_pattern, replace_all, matching_lines, FindAllJob, LiveMatches
+from ex_commands import ExError, split_range, parse_range, parse_substitute, parse_global
+
+# THE DISPATCH TABLE : keys -> command, a method of VimEditor
+COMMANDS = {
+    # navigating
+    'h' : Command('motion', 'motion_left'),
+    '<Left>' : Command('motion', 'motion_left'),
+    'l' : Command('motion', 'motion_right'),
+    '<Right>' : Command('motion', 'motion_right'),
+    'j' : Command('motion', 'motion_down', linewise = True),
+    '<Down>' : Command('motion', 'motion_down', linewise = True),
+    'k' : Command('motion', 'motion_up', linewise = True),
+    '<Up>' : Command('motion', 'motion_up', linewise = True),
+    '0' : Command('motion', 'motion_line_start'),
+    '$' : Command('motion', 'motion_line_end', inclusive = True),
+    'gg' : Command('motion', 'motion_first_line', linewise = True),
+    'G' : Command('motion', 'motion_last_line', linewise = True),
+    'w' : Command('motion', 'motion_word_start'),
+    'W' : Command('motion', 'motion_big_word_start'),
+    'b' : Command('motion', 'motion_word_back'),
+    'B' : Command('motion', 'motion_big_word_back'),
+    'e' : Command('motion', 'motion_word_end', inclusive = True),
+    'E' : Command('motion', 'motion_big_word_end', inclusive = True),
+    'n' : Command('motion', 'motion_next_match'),
+    'N' : Command('motion', 'motion_prev_match'),
+
+    # operators : followed by a motion, or doubled for whole lines (dd, yy, cc)
+    'd' : Command('operator', 'delete_range', change = True),
+    'y' : Command('operator', 'yank_range'),
+    'c' : Command('operator', 'change_range', change = True),
+    '>' : Command('operator', 'indent_range', change = True),
+    '<' : Command('operator', 'dedent_range', change = True),
+
+    # editing
+    'x' : Command('action', 'delete_char', change = True),
+    'p' : Command('action', 'paste', change = True),
+    'o' : Command('action', 'open_line', change = True),
+    'u' : Command('action', 'undo'),
+    '<C-r>' : Command('action', 'redo'),
+    '.' : Command('action', 'repeat_last_change'),
+
+    # macros
+    'q' : Command('action', 'record_macro', argument = True),
+    '@' : Command('action', 'play_macro', argument = True),
+
+    # modes
+    'i' : Command('action', 'enter_insert'),
+    ':' : Command('action', 'enter_command'),
+    '/' : Command('action', 'enter_search'),
+    '?' : Command('action', 'enter_search_backwards'),
+    'v' : Command('action', 'enter_visual'),
+    'V' : Command('action', 'enter_visual_line'),
+    '<C-v>' : Command('action', 'enter_visual_block'),
+}
+
+# text objects : after an operator only, they give the whole range (diw, caw)
+OBJECTS = {
+    'iw' : Command('object', 'object_inner_word'),
+    'aw' : Command('object', 'object_a_word'),
+    'iW' : Command('object', 'object_inner_big_word'),
+    'aW' : Command('object', 'object_a_big_word'),
+}
+
+# visual mode : the motions move the cursor end of the selection, these keys work on the selection
+VISUAL_COMMANDS = {keys: command for keys, command in COMMANDS.items() if command.kind == 'motion'}
+VISUAL_COMMANDS.update({
+    'd' : Command('action', 'visual_delete', change = True),
+    'x' : Command('action', 'visual_delete', change = True),
+    'y' : Command('action', 'visual_yank'),
+    'c' : Command('action', 'visual_change', change = True),
+    '>' : Command('action', 'visual_indent', change = True),
+    '<' : Command('action', 'visual_dedent', change = True),
+    '~' : Command('action', 'visual_toggle_case', change = True),
+    'I' : Command('action', 'visual_insert', change = True),
+    'A' : Command('action', 'visual_append', change = True),
+    'o' : Command('action', 'visual_other_end'),
+    'v' : Command('action', 'enter_visual'),
+    'V' : Command('action', 'enter_visual_line'),
+    '<C-v>' : Command('action', 'enter_visual_block'),
+    ':' : Command('action', 'visual_command'),
+})
+
+# what > adds in front of a line, and what < takes away (a tab or up to 4 spaces)
+INDENT = '    '
+DEDENT = re.compile(r'^(?:\t| {1,4})', re.MULTILINE)
+NOT_EMPTY_LINE = re.compile(r'^(?=.)', re.MULTILINE)
+
+VISUAL_NAMES = {'v' : '-- VISUAL --', 'V' : '-- VISUAL LINE --', 'block' : '-- VISUAL BLOCK --'}
+
+# pause in the typing of a search before the match is looked for (milliseconds)
+SEARCH_DELAY = 150
+
+# most macros running inside each other (a macro calling itself stops there)
+MAX_MACRO_DEPTH = 100
+
+# built once for every tab : a trie of all the commands, and one of what can follow an operator
+NORMAL_KEYS = KeyTrie(COMMANDS)
+PENDING_KEYS = KeyTrie({**{keys: command for keys, command in COMMANDS.items() if command.kind == 'motion'}, **OBJECTS})
+VISUAL_KEYS = KeyTrie(VISUAL_COMMANDS)
+
+
 class VimEditor():
-    def __init__(self, text, status_label):
+    def __init__(self, text, status_label, buffer = None):
         self.text = text
         self.status_label = status_label
+        # the TextBuffer mirroring the widget : lines are read from it instead of asking Tk
+        self.buffer = buffer
+        # the LargeFileView when the tab shows a huge file : positions are the file's, not the widget's
+        self.view = None
         self.enabled = False
-        self.cutting = False
-        self.copying = False
-        self.whole_line_copied = False
-        self.last_action = None
-        self.args_last_action = None
-        # self.full_command = ''
-        self.mode = 'normal' # normal | insert | command
+        # yanks and deletes go in the registers (shared by all the tabs), not in the clipboard
+        self.registers = get_registers()
+        # the register given to the command being run ("a), None for the unnamed one
+        self.register = None
+        # the last command that changed the text, repeated by '.'
+        self.last_change = None
+        self.mode = 'normal' # normal | insert | command | visual
+        # visual mode : 'v' (characters), 'V' (lines) or 'block', and the end of the selection that stays
+        self.visual = None
+        self.visual_anchor = None
+        # I / A on a block : (first line, last line, column, pad, line count, length of the first line),
+        # what is typed on the first line goes on the others when insert mode is left
+        self.block_insert = None
+        # macros : register being recorded (None if not recording), keys recorded so far
+        self.recording = None
+        self.recorded = []
+        self.last_macro = None
+        # depth of the macros running : while > 0 the screen is updated only at the end
+        self.replaying = 0
+        # last text given to show_status (shown once a macro is over)
+        self.status = ''
         self.command_buffer = ''
+        # line marks used by ex ranges ('< and '> : the last visual selection)
+        self.marks = {}
+        # the last pattern searched (/, ?) or substituted (:s), reused by n, N and empty patterns
+        self.last_pattern = None
+        self.search_backwards = False
+        # / and ? : the debounced incremental search, the scan running in the background and what
+        # to do once it is over
+        self.search_after = None
+        self.search_job = None
+        self.search_ready = None
+        # the matches of the last search, kept up to date while the text is edited
+        self.matches = None
+        # reads [count][operator][count][motion] one key at a time
+        self.parser = CommandParser(NORMAL_KEYS, PENDING_KEYS)
+        self.visual_parser = CommandParser(VISUAL_KEYS, PENDING_KEYS)
 
         # save and exit functions callback from text_editor
         self.save_callback = None
@@ -21,8 +160,11 @@ class VimEditor():
         # bind functions used for recognising commands
         self.text.bind("<Key>", self.on_key, add = '+')
         self.text.bind('<Escape>', self.on_escape, add = '+')
+        # the system clipboard gets the last yank only when another application may want it
+        self.text.bind('<FocusOut>', lambda event: self.registers.sync_clipboard(self.text), add = '+')
+        self.text.tag_config('search_match', background = 'orange')
 
-    # ENABLE | DISABLE : 
+    # ENABLE | DISABLE :
     def enable(self):
         """enable vim mode"""
         self.enabled = True
@@ -32,31 +174,37 @@ class VimEditor():
         """disable vim mode"""
         self.enabled = False
         self.show_status('Standard')
-    
+
     # ENTER MODES FUNCTIONS
     def enter_normal(self):
         """enter normal mode"""
+        if self.block_insert is not None:
+            self.finish_block_insert()
         self.mode = 'normal'
+        self.parser.reset()
         self.show_status('-- NORMAL --')
         self.text.config(insertontime = 700, insertofftime = 100)
 
 
-    def enter_insert(self):
+    def enter_insert(self, count = None):
         """enter insert mode : 'i'"""
         self.mode = 'insert'
         self.show_status('-- INSERT --')
         self.text.config(insertontime = 600, insertofftime = 600)
 
-    def enter_command(self):
+    def enter_command(self, count = None):
         """enter command mode : ':'"""
         self.mode = 'command'
         self.command_buffer += ':'
         self.show_status(self.command_buffer)
 
-    # AUXILIARY FUNCTIONS : 
+    # AUXILIARY FUNCTIONS :
     def show_status(self, text: str):
         """Update the bottom status label if provided."""
-        if self.status_label is None:
+        if self.recording is not None:
+            text = f"{text}  recording @{self.recording}"
+        self.status = text
+        if self.status_label is None or self.replaying:
             return
         if self.status_label.cget("text") != text:
             self.status_label.config(text=text)
@@ -65,346 +213,1012 @@ class VimEditor():
 
     def current_line_col(self):
         """return: current line and column index"""
+        if self.view is not None:
+            return self.view.current_line_col()
         line, col = self.text.index('insert').split('.')
         return int(line), int(col)
-    
-    def jump_start_line(self):
-        """0 : jump to the start of the line"""
-        line = self.current_line_col()[0]
-        self.text.mark_set('insert', f"{line}.0")
-        # return "break"
-
-    def jump_end_line(self):
-        """$ : jump to the end of the line"""
-        line= self.current_line_col()[0]
-        self.text.mark_set('insert', f"{line}.0 lineend-1c")
-    
-    def undo(self):
-        """undo function"""
-        try:
-            self.text.edit_undo()
-        except tk.TclError:
-            pass
-    
-    def redo(self):
-        """redo function"""
-        try:
-            self.text.edit_redo()
-        except tk.TclError:
-            pass
 
-    def delete_whole_line(self):
-        """auxiliary function for deleting an entire line"""
-        line = self.current_line_col()[0]
-        # getting the indexes of the beginning of the line and one character after the newline
-        start_index = f"{line}.0"
-        end_index = f"{line}.0 lineend +1c"
-        self.text.delete(start_index, end_index)
-        # updating cursor position
-        line = self.current_line_col()[0]
-        self.text.mark_set('insert', f"{line}.0")
+    def line_count(self):
+        """return: number of lines in the document"""
+        if self.view is not None:
+            return self.view.line_count()
+        if self.buffer is not None:
+            return self.buffer.table.line_count()
+        return int(self.text.index('end-1c').split('.')[0])
 
-    def delete_line_and_above(self):
-        """auxiliary function for deleting a line and above"""
-        line = self.current_line_col()[0]
-        start_index = f"{line-1}.0"
-        end_index = f"{line}.0 lineend + 1c"
-        self.text.delete(start_index, end_index)
-        self.text.mark_set('insert',f"{start_index}")
+    def line_length(self, line):
+        """return: number of characters on a line"""
+        if self.view is not None:
+            return self.view.line_length(line)
+        if self.buffer is not None:
+            table = self.buffer.table
+            return table.line_end(line) - table.line_start(line)
+        return int(self.text.index(f"{line}.0 lineend").split('.')[1])
 
-    def exit_cut_options(self):
-        """
-        updates cutting variable so the following keys no longer enter cut_options
-        resets command_buffer
-        updates status_label
-        """
-        self.cutting = False
-        self.command_buffer = ''
-        self.show_status('-- NORMAL --')
+    def get_line_text(self, line, col = 0):
+        """return: the text of a line starting from 'col' (without the newline)"""
+        if self.view is not None:
+            return self.view.index.line_bytes(line).decode('utf-8', 'replace')[col:]
+        if self.buffer is not None:
+            table = self.buffer.table
+            return table.get_text(table.index_to_offset(line, col), table.line_end(line))
+        return self.text.get(f"{line}.{col}", f"{line}.0 lineend")
 
-    def exit_copy_options(self):
-        """
-        updates cutting variable so the following keys no longer enter cut_options
-        resets command_buffer
-        updates status_label
-        """
-        self.copying = False
-        self.command_buffer = ''
-        self.show_status('-- NORMAL --')
+    def get_text(self, start, end):
+        """return: the text between two (line, col) positions"""
+        (first, start_col), (last, end_col) = start, end
+        if self.view is not None:
+            lines = [self.get_line_text(line) for line in range(first, last + 1)]
+            lines[-1] = lines[-1][:end_col]
+            lines[0] = lines[0][start_col:]
+            return '\n'.join(lines)
+        if self.buffer is not None:
+            table = self.buffer.table
+            return table.get_text(table.index_to_offset(first, start_col), table.index_to_offset(last, end_col))
+        return self.text.get(f"{first}.{start_col}", f"{last}.{end_col}")
+
+    def lines_span(self, first, last):
+        """return: the widget indexes to delete for removing lines first..last with their newlines"""
+        if last < self.line_count():
+            return f"{first}.0", f"{last + 1}.0"
+        # the last line has no newline of its own : the one before it goes instead
+        if first > 1:
+            return f"{first - 1}.0 lineend", 'end-1c'
+        return '1.0', 'end-1c'
 
+    # KEYS :
     def on_key(self, event = tk.Event):
         """
         handles all normal mode vim functions
         binded: to any key press
-        insert mode | disabled = False : return None 
+        insert mode | disabled = False : return None
         """
         if not self.enabled:
             return None
 
+        key = key_token(event)
+        if key is None:
+            return None
+        self.record_key(key)
+
         if self.mode == 'command':
-            return self.handle_command(event)
+            return self.command_key(key)
 
+        if self.mode == 'visual':
+            return self.visual_key(key)
+
+        # insert mode : tk.Text inserts the key itself
         if self.mode == 'insert':
             return None
-        
-        if self.cutting == True:
-            return self.cut_options(event)
-
-        if self.copying == True:
-            return self.copy_options(event)
 
         # only for normal mode
-        ks = event.keysym
-        ch = event.char
-
-        # navigating in normal mode
-        if ks in ['h', 'Left']:
-            self.move_oriz(-1)      
-        if ks in ['l', 'Right']:
-            self.move_oriz(+1)
-        if ks in ['j', 'Down']:
-            self.move_vert(+1)
-        if ks in ['k', 'Up']:
-            self.move_vert(-1)
-        if ks == '0':
-            self.jump_start_line()
-        if ch == '$':
-            self.jump_end_line()
-
-
-        # deleting a character
-        if ks == 'x':
-            self.delete_char()
-
-        # cutting
-        if ks == 'd':
-            self.command_buffer += 'd'
-            self.cutting = True
-            self.show_status(self.command_buffer)
+        was_idle = self.parser.idle()
+        handled = self.normal_key(key)
+        # not a command : shortcuts of the editor (Ctrl + S ...) still work
+        if not handled and was_idle and not (event.char and event.char.isprintable()):
+            return None
+        return "break"
 
-        # copying
-        if ks == 'y':
-            self.command_buffer += 'y'
-            self.copying = True
-            self.show_status(self.command_buffer)
+    def normal_key(self, key):
+        """handles one key of normal mode ; return: False if the keys typed are not a command"""
+        # q while recording : the macro is over
+        if key == 'q' and self.recording is not None and self.parser.idle():
+            self.stop_recording()
+            return True
 
-        # pasting
-        if ks == 'p':
-            self.paste()
+        parsed = self.parser.feed(key)
+        # the command goes on : showing what was typed so far
+        if parsed is None:
+            self.show_status(self.parser.keys)
+            return True
+        if parsed is False:
+            self.show_status('-- NORMAL --')
+            return False
 
-        # undo and redo
-        if ks == 'u':
-            self.undo()
-        # event state fot Control = 0x4
-        if ks == 'r' and (event.state & 0x4):
-            self.redo()
+        status = self.status
+        self.execute(parsed)
+        # a message of the command stays (Pattern not found ...)
+        if self.mode == 'normal' and self.status == status:
+            self.show_status('-- NORMAL --')
+        return True
 
-        # open line and enter insert mode
-        if ks == 'o':
-            self.open_line()
+    def insert_key(self, key):
+        """handles one key of insert mode when it does not come from tk (macros)"""
+        if key == '<Esc>':
+            self.enter_normal()
+        elif key == '<CR>':
+            self.text.insert('insert', '\n')
+        elif key == '<Tab>':
+            self.text.insert('insert', '\t')
+        elif key == '<BS>':
+            self.text.delete('insert -1c')
+        elif key == '<Del>':
+            self.text.delete('insert')
+        elif key in ('<Left>', '<Right>', '<Up>', '<Down>'):
+            line, col = self.current_line_col()
+            line += {'<Up>' : -1, '<Down>' : 1}.get(key, 0)
+            col += {'<Left>' : -1, '<Right>' : 1}.get(key, 0)
+            self.go_to_line_col(line, col)
+        elif len(key) == 1:
+            self.text.insert('insert', key)
 
-        # repeat last action
-        if ch == '.':
-            self.repeat_last_change()
+    # MACROS :
+    def record_key(self, key):
+        """adds a typed key to the macro being recorded"""
+        if self.recording is None or self.replaying:
+            return
+        # the q ending the recording is not part of the macro
+        if key == 'q' and self.mode == 'normal' and self.parser.idle():
+            return
+        self.recorded.append(key)
 
-        # entering insert mode
-        if ks == 'i':
-            self.enter_insert()
+    def record_macro(self, count, name):
+        """q{register} : starts recording the keys typed in a register"""
+        if not name.isalnum():
+            return
+        self.recording = name
+        self.recorded = []
+        self.show_status('-- NORMAL --')
 
-        # entering command mode
-        if event.char == ':':
-            self.enter_command()  
+    def stop_recording(self):
+        """q : stops recording, the keys go in the register"""
+        name = self.recording
+        self.recording = None
+        self.registers.set(name, ''.join(self.recorded), False)
+        self.recorded = []
+        self.show_status('-- NORMAL --')
+
+    def play_macro(self, count, name):
+        """@{register} | @@ : runs the keys of a register 'count' times"""
+        if name == '@':
+            name = self.last_macro
+        if name is None:
+            return
+        register = self.registers.get(name, self.text)
+        if register is None or not register.text:
+            return
+        self.last_macro = name
+        self.run_keys(split_keys(register.text), count or 1)
+
+    def run_keys(self, keys, times = 1):
+        """runs keys as if they were typed, as one batch : the status bar and the scrolling are
+        updated once at the end instead of after every key"""
+        if self.replaying >= MAX_MACRO_DEPTH:
+            return
+        self.replaying += 1
+        try:
+            for _ in range(times):
+                i = 0
+                while i < len(keys):
+                    key = keys[i]
+                    if self.mode == 'insert' and len(key) == 1:
+                        # the characters typed in a row are inserted at once
+                        j = i + 1
+                        while j < len(keys) and len(keys[j]) == 1:
+                            j += 1
+                        self.text.insert('insert', ''.join(keys[i:j]))
+                        i = j
+                        continue
+                    if self.mode == 'insert':
+                        self.insert_key(key)
+                    elif self.mode == 'command':
+                        self.command_key(key)
+                    elif self.mode == 'visual':
+                        self.visual_key(key)
+                    else:
+                        self.normal_key(key)
+                    i += 1
+                    # the next keys may depend on where a search goes (/foo<CR>dd)
+                    if self.search_job is not None and self.search_ready is not None:
+                        self.search_job.wait()
+        finally:
+            self.replaying -= 1
+            if not self.replaying:
+                self.text.see('insert')
+                self.show_status(self.status)
+
+    def execute(self, parsed):
+        """runs a parsed command"""
+        command = parsed.command
+        operator = parsed.operator
+        changes = (operator or command).change
+        # large file mode is read-only
+        if changes and self.view is not None:
+            self.show_status('read-only')
+            return
+
+        self.register = parsed.register
+        try:
+            if operator is not None:
+                self.apply_operator(operator, command, parsed.count)
+            elif command.kind == 'motion':
+                target = getattr(self, command.function)(parsed.count)
+                if target is not None:
+                    self.go_to_line_col(*target)
+            elif command.argument:
+                getattr(self, command.function)(parsed.count, parsed.argument)
+            else:
+                getattr(self, command.function)(parsed.count)
+        finally:
+            self.register = None
+
+        if changes:
+            self.last_change = parsed
+
+    def apply_operator(self, operator, motion, count):
+        """runs an operator once over the whole range of its motion : 1000dd is one delete"""
+        line, col = self.current_line_col()
+        if motion is None:
+            # doubled operator : 'count' lines from the current one
+            last = min(self.line_count(), line + (count or 1) - 1)
+            start, end, linewise = (line, 0), (last, self.line_length(last)), True
+        elif motion.kind == 'object':
+            # a text object is already a range
+            span = getattr(self, motion.function)(count)
+            if span is None:
+                return
+            start, end, linewise = span[0], span[1], False
+        else:
+            # cw works like ce, as in vim
+            if operator.function == 'change_range' and motion.function in ('motion_word_start', 'motion_big_word_start'):
+                line_text = self.get_line_text(line)
+                if col < len(line_text) and not line_text[col].isspace():
+                    motion = COMMANDS['e' if motion.function == 'motion_word_start' else 'E']
+            # w and e running out of words (the last word of the text) go to the end of it, as in vim
+            if motion.function in ('motion_word_start', 'motion_big_word_start', 'motion_word_end', 'motion_big_word_end'):
+                target = getattr(self, motion.function)(count, to_end = True)
+            else:
+                target = getattr(self, motion.function)(count)
+            if target is None:
+                return
+            # dw on the last word of a line stops at the end of that word's line, not on the next word
+            if motion.function in ('motion_word_start', 'motion_big_word_start') and target[0] > line \
+                    and not self.get_line_text(target[0])[:target[1]].strip():
+                last = target[0] - 1
+                # lines of blanks hold no word
+                while last > line and self.get_line_text(last) and not self.get_line_text(last).strip():
+                    last -= 1
+                target = (last, self.line_length(last))
+            # a count past the end (d100G) stops at the last line
+            target = (max(1, min(target[0], self.line_count())), target[1])
+            linewise = motion.linewise
+            if linewise:
+                first, last = sorted((line, target[0]))
+                start, end = (first, 0), (last, self.line_length(last))
+            else:
+                start, end = sorted(((line, col), target))
+                if motion.inclusive:
+                    end = (end[0], min(end[1] + 1, self.line_length(end[0])))
+        getattr(self, operator.function)(start, end, linewise)
+
+    # MOTIONS : return the (line, col) the motion goes to, None if it cannot move
+    def motion_left(self, count):
+        """h : 'count' characters left"""
+        line, col = self.current_line_col()
+        return (line, max(0, col - (count or 1))) if col > 0 else None
+
+    def motion_right(self, count):
+        """l : 'count' characters right"""
+        line, col = self.current_line_col()
+        return line, min(self.line_length(line), col + (count or 1))
+
+    def motion_down(self, count):
+        """j : 'count' lines down"""
+        line, col = self.current_line_col()
+        if line >= self.line_count():
+            return None
+        return min(self.line_count(), line + (count or 1)), col
+
+    def motion_up(self, count):
+        """k : 'count' lines up"""
+        line, col = self.current_line_col()
+        if line <= 1:
+            return None
+        return max(1, line - (count or 1)), col
+
+    def motion_line_start(self, count):
+        """0 : start of the line"""
+        return self.current_line_col()[0], 0
+
+    def motion_line_end(self, count):
+        """$ : last character of the line ('count' - 1 lines down)"""
+        line = min(self.line_count(), self.current_line_col()[0] + (count or 1) - 1)
+        return line, max(0, self.line_length(line) - 1)
+
+    def word_motion(self, function, count, *args, to_end = False, **options):
+        """runs a word_motion function 'count' times from the cursor, reading the lines as strings
+        to_end : running out of words goes to the end of the text (operators : dw, de on the last word)"""
+        position = self.current_line_col()
+        target = None
+        for _ in range(count or 1):
+            position = function(self.get_line_text, *args, *position, **options)
+            if position is None:
+                if to_end:
+                    last = self.line_count()
+                    target = (last, self.line_length(last))
+                break
+            target = position
+        return target
+
+    def motion_word_start(self, count, to_end = False):
+        """w : start of the 'count'th next word"""
+        return self.word_motion(next_word_start, count, self.line_count(), to_end = to_end)
+
+    def motion_big_word_start(self, count, to_end = False):
+        """W : start of the 'count'th next WORD (blank separated)"""
+        return self.word_motion(next_word_start, count, self.line_count(), to_end = to_end, big = True)
+
+    def motion_word_back(self, count):
+        """b : start of the 'count'th previous word"""
+        return self.word_motion(prev_word_start, count)
+
+    def motion_big_word_back(self, count):
+        """B : start of the 'count'th previous WORD"""
+        return self.word_motion(prev_word_start, count, big = True)
+
+    def motion_word_end(self, count, to_end = False):
+        """e : end of the 'count'th word"""
+        return self.word_motion(word_end, count, self.line_count(), to_end = to_end)
+
+    def motion_big_word_end(self, count, to_end = False):
+        """E : end of the 'count'th WORD"""
+        return self.word_motion(word_end, count, self.line_count(), to_end = to_end, big = True)
+
+    def motion_first_line(self, count):
+        """gg : first line, or line 'count'"""
+        return count or 1, 0
+
+    def motion_last_line(self, count):
+        """G : last line, or line 'count'"""
+        return count or self.line_count(), 0
+
+    # TEXT OBJECTS : return the (start, end) positions of the range, None if there is none
+    def word_object(self, count, around, big):
+        """the words around the cursor, on its line"""
+        line, col = self.current_line_col()
+        start, end = text_object(self.get_line_text(line), col, around, big, count or 1)
+        if end <= start:
+            return None
+        return (line, start), (line, end)
+
+    def object_inner_word(self, count):
+        """iw : the word under the cursor (or the blanks)"""
+        return self.word_object(count, False, False)
+
+    def object_a_word(self, count):
+        """aw : the word under the cursor with its blanks"""
+        return self.word_object(count, True, False)
+
+    def object_inner_big_word(self, count):
+        """iW : the WORD under the cursor"""
+        return self.word_object(count, False, True)
+
+    def object_a_big_word(self, count):
+        """aW : the WORD under the cursor with its blanks"""
+        return self.word_object(count, True, True)
 
-        # if ks is any other character, nothing happens
-        if event.char and event.char.isprintable():
-            return "break"
-        return None
-    
     # NORMAL MODE FUNCTIONS :
     def go_to_line_col(self, line, col):
         """cursor navigates to a specified position"""
+        # in large file mode the index finds the line, wherever it is in the file
+        if self.view is not None:
+            self.view.go_to_line_col(line, col)
+            return
 
         # max_line: the last line. line is bound to take a value between 1(first) and last line
-        max_line = int(self.text.index('end-1c').split('.')[0])
+        max_line = self.line_count()
         line = max(1, min(line, max_line))
 
         # max_col: the last column. col is bound to take a value between 0 (first) and last col
-        max_col = int(self.text.index(f"{line}.0 lineend").split('.')[1])
+        max_col = self.line_length(line)
         col = max(0, min(col, max_col))
 
         # we move cursor to the line and col
         self.text.mark_set("insert", f"{line}.{col}")
-        self.text.see('insert')
+        # a macro scrolls once, when it is over
+        if not self.replaying:
+            self.text.see('insert')
 
-    def move_vert(self, val):
-        """move the cursor up | down"""
-        line, col = self.current_line_col()
-        # moves cursor +1 (down) or -1 (up)
-        self.go_to_line_col(line + val, col)
+    def undo(self, count = None):
+        """u : undo function, 'count' times"""
+        for _ in range(count or 1):
+            try:
+                self.text.edit_undo()
+            except tk.TclError:
+                break
 
-    def move_oriz(self, val):
-        """move the cursor left | right"""
-        line, col = self.current_line_col()
-        # moves cursor -1 (left) or +1 (right)
-        self.go_to_line_col(line, col + val)
+    def redo(self, count = None):
+        """Ctrl + r : redo function, 'count' times"""
+        for _ in range(count or 1):
+            try:
+                self.text.edit_redo()
+            except tk.TclError:
+                break
 
-    def open_line(self):
+    def open_line(self, count = None):
         """o : opens line and changes to insert mode"""
         line = self.current_line_col()[0]
         line_end = self.text.index(f"{line}.0 lineend+1c")
         self.text.insert(line_end, '\n')
         self.text.mark_set('insert', f"{line + 1}.0")
-        self.last_action = self.open_line
         self.enter_insert()
 
-    def delete_char(self, val = 0):
-        """ x : delete a single character"""
-        # position
-        index = self.text.index('insert')
-        line = index.split('.')[0]
+    def delete_char(self, count = None):
+        """ x : delete 'count' characters, in one delete"""
+        line, col = self.current_line_col()
+        end = min(self.line_length(line), col + (count or 1))
         # be it different than endline
-        if index != self.text.index(f"{line}.0 lineend"):
-            self.text.delete(index, f"{index} + {val + 1}c")
-            self.last_action = self.delete_char
-
-    def cut_options(self, event):
-        """d : handle cutting functions in normal mode"""
-        ks = event.keysym
-        # if 'dd' - delete whole line
-        if ks == 'd':
-            # calling function for deleting the line
-            self.delete_whole_line()
-            # set last action to deleting an entire line
-            self.last_action = self.delete_whole_line
-
-            # leaving cut_options, command_buffer and status_label update 
-            self.exit_cut_options()
-            return "break"
-        # if dk - delete current line and above
-        elif ks == 'k':
+        if end > col:
+            self.registers.delete(self.get_text((line, col), (line, end)), False, self.register, self.text)
+            self.text.delete(f"{line}.{col}", f"{line}.{end}")
+
+    # OPERATORS : work on the text between two (line, col) positions, on whole lines if linewise
+    def delete_range(self, start, end, linewise):
+        """d : deletes the range in one delete"""
+        self.registers.delete(self.get_text(start, end), linewise, self.register, self.text)
+        if linewise:
+            first, last = start[0], end[0]
+            self.text.delete(*self.lines_span(first, last))
+            self.go_to_line_col(first, 0)
+        else:
+            self.text.delete(f"{start[0]}.{start[1]}", f"{end[0]}.{end[1]}")
+            self.go_to_line_col(*start)
+
+    def yank_range(self, start, end, linewise):
+        """y : copies the range in a register"""
+        self.registers.yank(self.get_text(start, end), linewise, self.register, self.text)
+        self.go_to_line_col(*start)
+
+    def change_range(self, start, end, linewise):
+        """c : deletes the range (keeping one empty line if linewise) and enters insert mode"""
+        self.registers.delete(self.get_text(start, end), linewise, self.register, self.text)
+        self.text.delete(f"{start[0]}.{start[1]}", f"{end[0]}.{end[1]}")
+        self.go_to_line_col(*start)
+        self.enter_insert()
+
+    def indent_range(self, start, end, linewise):
+        """>> / >{motion} : indents the lines of the range, as one edit"""
+        self.transform_lines(start[0], end[0], lambda text: NOT_EMPTY_LINE.sub(INDENT, text))
+        self.go_to_line_col(start[0], 0)
+
+    def dedent_range(self, start, end, linewise):
+        """<< / <{motion} : removes one level of indentation from the lines of the range, as one edit"""
+        self.transform_lines(start[0], end[0], lambda text: DEDENT.sub('', text))
+        self.go_to_line_col(start[0], 0)
+
+    def transform_lines(self, first, last, function):
+        """rewrites lines first..last with function(text of the lines) : one replace, one undo step"""
+        self.check_writable()
+        offset, span = self.lines_text(first, last)
+        new = function(span)
+        if new != span:
+            self.replace_offsets(offset, offset + len(span), new)
+
+    def paste(self, count = None):
+        """p : paste a register (the unnamed one by default), 'count' times in one insert"""
+        # only "+p and "*p ask the X server for the clipboard
+        register = self.registers.get(self.register or '"', self.text)
+        if register is None:
+            return
+        if register.linewise:
             line = self.current_line_col()[0]
-            # if the cursor is on a line > 2nd : delete line and above
-            if line > 1:
-                self.delete_line_and_above()
-
-                self.last_action = self.delete_line_and_above
-                self.exit_cut_options()
-                return "break"
-            # else : don't delete anything -> exit back to NORMAL mode
-            else:
-                self.exit_cut_options()
-                return "break"
-        # deleting behind cursor
-        elif ks == 'h' or ks == 'Shift':
-            index = self.text.index('insert')
-            col = self.current_line_col()[1]
-            if col > 0:
-                self.text.delete(f"{index} - 1c", f"{index}")
-
-                self.exit_cut_options()
-                return "break"
-            else:
-                self.exit_cut_options()
-                return "break"
-        # exiting d cut options
-        elif ks == 'Escape':
-            self.exit_cut_options()
-            return "break"
+            line_end = self.text.index(f"{line}.0 lineend")
+            self.text.insert(line_end, ('\n' + register.text) * (count or 1))
         else:
-            self.exit_cut_options()
+            self.text.insert('insert', register.text * (count or 1))
+
+    def repeat_last_change(self, count = None):
+        """'.' : repeat the last change such as commands 'x' or 'dd' (with a new count if given)"""
+        last = self.last_change
+        if last is None:
+            return
+        if count is not None:
+            last = type(last)(count, last.operator, last.command, last.argument, last.keys, last.register)
+        self.execute(last)
+
+
+    # VISUAL MODE : every operator is one transform of the text of the selection, written back at once
+    def enter_visual(self, count = None):
+        """v : select characters"""
+        self.start_visual('v')
+
+    def enter_visual_line(self, count = None):
+        """V : select whole lines"""
+        self.start_visual('V')
+
+    def enter_visual_block(self, count = None):
+        """Ctrl + v : select a rectangle"""
+        self.start_visual('block')
+
+    def start_visual(self, kind):
+        """starts visual mode ; the key of the current kind leaves it, another one switches kind"""
+        if self.view is not None:
+            self.show_status("Visual mode is not available in large file mode")
+            return
+        if self.mode == 'visual' and self.visual == kind:
+            self.leave_visual()
+            return
+        if self.mode != 'visual':
+            self.visual_anchor = self.current_line_col()
+        self.mode = 'visual'
+        self.visual = kind
+        self.visual_parser.reset()
+        self.show_selection()
+        self.show_status(VISUAL_NAMES[kind])
+
+    def leave_visual(self):
+        """back to normal mode ; '< and '> keep the lines of the selection (for :'<,'>)"""
+        first, last = self.visual_lines()
+        self.marks['<'], self.marks['>'] = first, last
+        self.visual = None
+        self.text.tag_remove('sel', '1.0', 'end')
+        self.enter_normal()
+
+    def visual_key(self, key):
+        """handles one key of visual mode"""
+        if key == '<Esc>':
+            self.leave_visual()
             return "break"
-        
-    def copy_options(self, event):
-        """y : handles copying functions in normal mode"""
-        ks = event.keysym
-        char = event.char
-        
-        # ignore modifier keys (avoiding cases where: e.g. the key returned by event is 'shift' for 'y$')
-        if ks in ['Shift_L', 'Shift_R', 'Control_L', 'Control_R', 'Alt_L', 'Alt_R']:
-            return None
-        
-        # if 'yy' - copy whole line
-        if ks == 'y':
-            line = self.current_line_col()[0]
-            start_index = f"{line}.0"
-            end_index = f"{line}.0 lineend"
-            selected = self.text.get(start_index, end_index)
-            self.text.clipboard_clear()
-            self.text.clipboard_append(selected)
-            self.whole_line_copied = True
-
-            self.exit_copy_options()
+        parsed = self.visual_parser.feed(key)
+        if parsed is None:
+            self.show_status(self.visual_parser.keys)
             return "break"
-        # if 'y$' - copy whole line starting from the index
-        elif char == '$':
-            line = self.current_line_col()[0]
-            start_index = "insert"
-            end_index = f"{line}.0 lineend"
-            selected = self.text.get(start_index, end_index)
-            self.text.clipboard_clear()
-            self.text.clipboard_append(selected)
-            self.whole_line_copied = False
-
-            self.exit_copy_options()
+        if parsed is False:
+            self.show_status(VISUAL_NAMES[self.visual])
             return "break"
-        else:
-            self.exit_copy_options()
+
+        last_change = self.last_change
+        try:
+            self.execute(parsed)
+        except ExError as error:
+            self.show_status(str(error))
             return "break"
-        
-    def paste(self):
-        """p : paste text from clipboard function"""
+        # '.' repeats normal mode changes only
+        self.last_change = last_change
+        if self.mode == 'visual':
+            self.show_selection()
+            self.show_status(VISUAL_NAMES[self.visual])
+        return "break"
+
+    def selection(self):
+        """return: (start, end) (line, col) of the selection, start first ; the character under
+        the end is selected too"""
+        return tuple(sorted((self.visual_anchor, self.current_line_col())))
+
+    def visual_lines(self):
+        """return: first and last line of the selection"""
+        start, end = self.selection()
+        return start[0], end[0]
+
+    def block_columns(self):
+        """return: the columns left..right (right excluded) of the block"""
+        (_, anchor), (_, col) = self.visual_anchor, self.current_line_col()
+        return min(anchor, col), max(anchor, col) + 1
+
+    def show_selection(self):
+        """shows the selection with the sel tag"""
+        self.text.tag_remove('sel', '1.0', 'end')
+        start, end = self.selection()
+        if self.visual == 'v':
+            self.text.tag_add('sel', f"{start[0]}.{start[1]}", f"{end[0]}.{end[1] + 1}")
+        elif self.visual == 'V':
+            self.text.tag_add('sel', f"{start[0]}.0", f"{end[0] + 1}.0")
+        else:
+            # a block is one range per line : only the lines on the screen are tagged
+            top = int(self.text.index('@0,0').split('.')[0])
+            bottom = int(self.text.index(f"@0,{self.text.winfo_height()}").split('.')[0])
+            left, right = self.block_columns()
+            ranges = []
+            for line in range(max(start[0], top), min(end[0], bottom) + 1):
+                ranges += (f"{line}.{left}", f"{line}.{right}")
+            if ranges:
+                self.text.tag_add('sel', *ranges)
+
+    def char_range(self):
+        """return: (start, end) of the characters of a 'v' selection, end excluded"""
+        start, end = self.selection()
+        return start, (end[0], min(end[1] + 1, self.line_length(end[0])))
+
+    def transform_block(self, function):
+        """rewrites the columns of the block with function(part of a line) : one replace
+        return: the parts of the lines the block covered"""
+        first, last = self.visual_lines()
+        left, right = self.block_columns()
+        offset, span = self.lines_text(first, last)
+        lines = span.split('\n')
+        parts = [line[left:right] for line in lines]
+        new = '\n'.join(line[:left] + function(part) + line[right:] for line, part in zip(lines, parts))
+        if new != span:
+            self.check_writable()
+            self.replace_offsets(offset, offset + len(span), new)
+        return parts
+
+    def visual_delete(self, count = None):
+        """d | x : deletes the selection"""
+        self.check_writable()
+        if self.visual == 'v':
+            start, end = self.char_range()
+            self.leave_visual()
+            self.delete_range(start, end, False)
+        elif self.visual == 'V':
+            first, last = self.visual_lines()
+            self.leave_visual()
+            self.delete_range((first, 0), (last, self.line_length(last)), True)
+        else:
+            first, left = self.visual_lines()[0], self.block_columns()[0]
+            parts = self.transform_block(lambda part: '')
+            self.registers.delete('\n'.join(parts), False, self.register, self.text)
+            self.leave_visual()
+            self.go_to_line_col(first, left)
+
+    def visual_yank(self, count = None):
+        """y : copies the selection in a register"""
+        if self.visual == 'v':
+            start, end = self.char_range()
+            self.leave_visual()
+            self.yank_range(start, end, False)
+        elif self.visual == 'V':
+            first, last = self.visual_lines()
+            self.leave_visual()
+            self.yank_range((first, 0), (last, self.line_length(last)), True)
+        else:
+            first, last = self.visual_lines()
+            left, right = self.block_columns()
+            _, span = self.lines_text(first, last)
+            parts = [line[left:right] for line in span.split('\n')]
+            self.registers.yank('\n'.join(parts), False, self.register, self.text)
+            self.leave_visual()
+            self.go_to_line_col(first, left)
+
+    def visual_change(self, count = None):
+        """c : deletes the selection and enters insert mode (on a block : what is typed goes on
+        every line of it)"""
+        self.check_writable()
+        if self.visual == 'v':
+            start, end = self.char_range()
+            self.leave_visual()
+            self.change_range(start, end, False)
+        elif self.visual == 'V':
+            first, last = self.visual_lines()
+            self.leave_visual()
+            self.change_range((first, 0), (last, self.line_length(last)), True)
+        else:
+            parts = self.transform_block(lambda part: '')
+            self.registers.delete('\n'.join(parts), False, self.register, self.text)
+            self.visual_insert()
+
+    def visual_indent(self, count = None):
+        """> : indents the lines of the selection"""
+        first, last = self.visual_lines()
+        self.leave_visual()
+        self.indent_range((first, 0), (last, 0), True)
+
+    def visual_dedent(self, count = None):
+        """< : removes one level of indentation from the lines of the selection"""
+        first, last = self.visual_lines()
+        self.leave_visual()
+        self.dedent_range((first, 0), (last, 0), True)
+
+    def visual_toggle_case(self, count = None):
+        """~ : switches the case of the selection"""
+        self.check_writable()
+        start, end = self.selection()
+        if self.visual == 'v':
+            start, end = self.char_range()
+            first, span = self.lines_text(start[0], end[0])
+            # the selection inside the text of its lines
+            a = start[1]
+            b = len(span) - (self.line_length(end[0]) - end[1])
+            if b > a:
+                self.replace_offsets(first + a, first + b, span[a:b].swapcase())
+        elif self.visual == 'V':
+            self.transform_lines(start[0], end[0], str.swapcase)
+        else:
+            self.transform_block(str.swapcase)
+            start = (start[0], self.block_columns()[0])
+        self.leave_visual()
+        self.go_to_line_col(*start)
+
+    def visual_insert(self, count = None):
+        """I : on a block, inserts before it on every line ; otherwise, at the start of the selection"""
+        first, last = self.visual_lines()
+        if self.visual == 'block':
+            column = self.block_columns()[0]
+        else:
+            column = self.selection()[0][1] if self.visual == 'v' else 0
+        self.start_block_insert(first, last, column)
+
+    def visual_append(self, count = None):
+        """A : on a block, appends after it on every line ; otherwise, after the selection"""
+        first, last = self.visual_lines()
+        if self.visual == 'block':
+            column = self.block_columns()[1]
+        elif self.visual == 'v':
+            first, column = self.char_range()[1]
+        else:
+            first, column = last, self.line_length(last)
+        self.start_block_insert(first, last, column, pad = True)
+
+    def start_block_insert(self, first, last, column, pad = False):
+        """insert mode at 'column' of line 'first' ; the lines after it up to 'last' get the same
+        text when insert mode is left (only for a block), 'pad' : shorter lines are padded with spaces
+        up to the column instead of being skipped"""
+        block = self.visual == 'block' and last > first
+        self.leave_visual()
+        self.check_writable()
+        line_length = self.line_length(first)
+        if column > line_length:
+            self.text.insert(f"{first}.{line_length}", ' ' * (column - line_length))
+        self.go_to_line_col(first, column)
+        if block:
+            self.block_insert = (first, last, column, pad, self.line_count(), self.line_length(first))
+        self.enter_insert()
+
+    def finish_block_insert(self):
+        """leaving insert mode after I / A on a block : the text typed on the first line goes on the
+        other lines, in the undo step of the typing (nothing if a new line was typed)"""
+        first, last, column, pad, line_count, length = self.block_insert
+        self.block_insert = None
+        added = self.line_length(first) - length
+        if added <= 0 or self.line_count() != line_count:
+            return
+        text = self.get_line_text(first, column)[:added]
+        def insert(span):
+            lines = span.split('\n')
+            for i, line in enumerate(lines):
+                # I skips the lines too short to reach the block, A pads them
+                if len(line) >= column or pad:
+                    lines[i] = line[:column].ljust(column) + text + line[column:]
+            return '\n'.join(lines)
+        offset, span = self.lines_text(first + 1, last)
+        new = insert(span)
+        if new == span:
+            return
+        # no separator before the replace : undo takes the typing and the other lines at once, as in vim
+        start, end = offset, offset + len(span)
+        if self.buffer is not None:
+            start, end = self.buffer.index(start), self.buffer.index(end)
+        else:
+            start, end = f"1.0+{start}c", f"1.0+{end}c"
+        autoseparators = self.text.cget('autoseparators')
+        self.text.config(autoseparators = False)
+        self.text.replace(start, end, new)
+        self.text.edit_separator()
+        self.text.config(autoseparators = autoseparators)
+
+    def visual_other_end(self, count = None):
+        """o : the cursor goes to the other end of the selection"""
+        anchor = self.visual_anchor
+        self.visual_anchor = self.current_line_col()
+        self.go_to_line_col(*anchor)
+
+    def visual_command(self, count = None):
+        """: : an ex command on the lines of the selection"""
+        self.leave_visual()
+        self.mode = 'command'
+        self.command_buffer = ":'<,'>"
+        self.show_status(self.command_buffer)
+
+
+    # SEARCH : / and ? look for python regular expressions ; the matches of the last search are found
+    # once, in the background, then follow the edits (see LiveMatches)
+    def enter_search(self, count = None):
+        """'/' : search forward, the match is shown while typing"""
+        self.start_search('/')
+
+    def enter_search_backwards(self, count = None):
+        """'?' : search backwards"""
+        self.start_search('?')
+
+    def start_search(self, prompt):
+        self.mode = 'command'
+        self.command_buffer = prompt
+        self.show_status(prompt)
+
+    def searching(self):
+        """return: True if the command being typed is a search"""
+        return self.mode == 'command' and self.command_buffer[:1] in ('/', '?')
+
+    def schedule_search(self):
+        """incremental search : runs when the typing pauses for SEARCH_DELAY"""
+        if self.search_after is not None:
+            self.text.after_cancel(self.search_after)
+            self.search_after = None
+        # a macro only searches on Enter
+        if not self.replaying:
+            self.search_after = self.text.after(SEARCH_DELAY, self.incremental_search)
+
+    def incremental_search(self):
+        """shows the match the search being typed would go to, without moving the cursor"""
+        self.search_after = None
+        query = self.command_buffer[1:]
+        if not self.searching() or not query or self.view is not None:
+            return
+        backwards = self.command_buffer[0] == '?'
+        def show():
+            if self.searching() and self.command_buffer[1:] == query:
+                number = self.match_from_cursor(backwards, 1)
+                if number is not None:
+                    self.highlight_match(number)
+        self.find_matches(query, show)
+
+    def cancel_search(self):
+        """Esc while typing a search : the view goes back to the cursor"""
+        if self.search_after is not None:
+            self.text.after_cancel(self.search_after)
+            self.search_after = None
+        if self.search_job is not None:
+            self.search_job.cancel()
+            self.search_job = None
+        self.search_ready = None
+        self.text.tag_remove('search_match', '1.0', 'end')
+        self.text.see('insert')
+
+    def close(self):
+        """the widget is going away (hibernated tab) : the search stops, the matches stop following the buffer"""
+        self.cancel_search()
+        if self.matches is not None:
+            self.matches.close()
+            self.matches = None
+
+    def execute_search(self):
+        """Enter : goes to the match (an empty search repeats the last one)"""
+        backwards = self.command_buffer[0] == '?'
+        query = self.command_buffer[1:] or self.last_pattern
+        self.command_buffer = ''
+        if self.search_after is not None:
+            self.text.after_cancel(self.search_after)
+            self.search_after = None
+        self.enter_normal()
+        if not query:
+            self.show_status("No previous pattern")
+            return
         try:
-            coppied_text = self.text.clipboard_get()
-            if self.whole_line_copied:
-                line = self.current_line_col()[0]
-                line_end = self.text.index(f"{line}.0 lineend")
-                self.text.insert(line_end, '\n' + coppied_text)
-            else:
-                self.text.insert('insert', coppied_text)
-            # saving last action    
-            self.last_action = self.paste
-        except tk.TclError:
-            pass
-
-    def repeat_last_change(self):
-        """'.' : repeat the last change such as commands 'x' or 'dd'"""
-        if self.last_action:
-            if self.args_last_action:
-                self.last_action(self.args_last_action)
+            compile_pattern(query, True)
+        except re.error as error:
+            self.show_status(f"Invalid pattern: {error}")
+            return
+        self.last_pattern = query
+        self.search_backwards = backwards
+        self.jump_to_match(backwards, 1)
+
+    def find_matches(self, query, on_ready):
+        """calls on_ready() once the matches of 'query' are known, scanning the text in the
+        background if they are not"""
+        if self.matches is not None and self.matches.key == (query, True, False):
+            on_ready()
+            return
+        if self.search_job is not None:
+            self.search_job.cancel()
+        self.search_ready = on_ready
+        self.search_job = FindAllJob(self.text, self.buffer, query, regex = True, on_done = self.matches_found)
+
+    def matches_found(self, job):
+        """the background scan is over"""
+        if job is not self.search_job:
+            return
+        self.search_job = None
+        on_ready, self.search_ready = self.search_ready, None
+        if job.error is not None:
+            if not self.searching():
+                self.show_status(f"Invalid pattern: {job.error}")
+            return
+        # the text changed during the scan : once more on the current text
+        if job.matches.version != self.buffer.version:
+            self.find_matches(job.query, on_ready)
+            return
+        if self.matches is not None:
+            self.matches.close()
+        self.matches = LiveMatches(self.buffer, compile_pattern(job.query, True), job.matches)
+        if on_ready is not None:
+            on_ready()
+
+    def match_from_cursor(self, backwards, count):
+        """return: number of the 'count'th match after (before) the cursor, wrapping around, or None"""
+        offset = self.buffer.offset(*self.current_line_col())
+        number = None
+        for _ in range(count or 1):
+            if backwards:
+                number = self.matches.prev_before(offset)
             else:
-                self.last_action()
-        else:
-            "break"
+                number = self.matches.next_after(offset + 1)
+            if number is None:
+                return None
+            offset = self.matches.span(number)[0]
+        return number
+
+    def highlight_match(self, number):
+        """shows match 'number' with the search_match tag"""
+        start, end = (self.buffer.index(offset) for offset in self.matches.span(number))
+        self.text.tag_remove('search_match', '1.0', 'end')
+        self.text.tag_add('search_match', start, end)
+        if not self.replaying:
+            self.text.see(start)
+
+    def search_position(self, backwards, count):
+        """return: (line, col) of the 'count'th match of the last search from the cursor, None if it
+        is not known yet (the cursor moves there once the background scan is over) or not found"""
+        query = self.last_pattern
+        if query is None:
+            self.show_status("No previous pattern")
+            return None
+        # large file mode : the file is searched from the cursor, for the plain text
+        if self.view is not None:
+            for _ in range(count or 1):
+                if not self.view.find(query, backwards = backwards):
+                    self.show_status(f"Pattern not found: {query}")
+                    break
+            return None
+        if self.buffer is None:
+            return None
+        if self.matches is None or self.matches.key != (query, True, False):
+            self.show_status(f"Searching {query} ...")
+            self.find_matches(query, lambda: self.jump_to_match(backwards, count))
+            return None
+        number = self.match_from_cursor(backwards, count)
+        if number is None:
+            self.show_status(f"Pattern not found: {query}")
+            return None
+        self.highlight_match(number)
+        return self.buffer.table.offset_to_index(self.matches.span(number)[0])
+
+    def jump_to_match(self, backwards, count):
+        """moves the cursor to a match of the last search and shows its number"""
+        position = self.search_position(backwards, count)
+        if position is None:
+            return
+        self.go_to_line_col(*position)
+        number = self.matches.next_after(self.buffer.offset(*position))
+        prompt = '?' if backwards else '/'
+        self.show_status(f"{prompt}{self.last_pattern}  [{number + 1}/{len(self.matches)}]")
+
+    def motion_next_match(self, count):
+        """n : next match of the last search, in its direction"""
+        return self.search_position(self.search_backwards, count)
+
+    def motion_prev_match(self, count):
+        """N : previous match of the last search"""
+        return self.search_position(not self.search_backwards, count)
 
 
     # COMMAND MODE FUNCTIONS:
-    def handle_command(self, event):
+    def command_key(self, key):
         """handle keys in command mode"""
-        ks = event.keysym
         # execute command on Enter
-        if ks == 'Return':
-            self.execute_command()
+        if key == '<CR>':
+            if self.searching():
+                self.execute_search()
+            else:
+                self.execute_command()
             return "break"
-        
+
         # return to normal mode
-        if ks == 'Escape':
-            self.command_buffer = ''
-            self.enter_normal()
+        if key == '<Esc>':
+            self.leave_command()
 
         # Backspace
-        if ks == 'Backspace':
+        if key == '<BS>':
             if len(self.command_buffer) > 1:
                 self.command_buffer = self.command_buffer[:-1]
                 self.show_status(self.command_buffer)
 
         # for characters, append on command_buffer
-        if event.char and event.char.isprintable():
-            self.command_buffer += event.char
+        if len(key) == 1:
+            self.command_buffer += key
             self.show_status(self.command_buffer)
-            return "break"
 
+        # / and ? : the match is looked for once the typing pauses
+        if self.searching() and (key == '<BS>' or len(key) == 1):
+            self.schedule_search()
         return "break"
-            
+
+    def leave_command(self):
+        """Esc in command mode : drops the command (and the search being typed)"""
+        if self.searching():
+            self.cancel_search()
+        self.command_buffer = ''
+        self.enter_normal()
+
     def execute_command(self):
         cmd = self.command_buffer[1:]
 
@@ -414,40 +1228,263 @@ class VimEditor():
             self.enter_normal()
 
         # exit file usingexit_callback : exit_tab function from textEditor
-        if cmd == 'q':
+        elif cmd == 'q':
             self.exit_callback()
 
         # wq command - save and exit
-        if cmd == 'wq':
+        elif cmd == 'wq':
             self.save_callback()
             self.exit_callback()
 
+        # other commands : [range]command
+        else:
+            self.enter_normal()
+            try:
+                message = self.run_ex(cmd)
+            except ExError as error:
+                message = str(error)
+            if message:
+                self.show_status(message)
+
         self.command_buffer = ''
+        # an unknown command too goes back to normal mode (unless the tab was closed)
+        if self.mode == 'command' and self.text.winfo_exists():
+            self.enter_normal()
+
+    def run_ex(self, cmd):
+        """runs an ex command with its range (:5, :%s/a/b/g, :'<,'>s/a/b/, :g/DEBUG/d)
+        return: the message for the status bar, None to keep the mode's one"""
+        range_text, rest = split_range(cmd)
+        current = self.current_line_col()[0]
+        first, last = parse_range(range_text, current, self.line_count(), self.marks)
+
+        # :N goes to line N
+        if not rest:
+            if range_text:
+                self.go_to_line_col(last, 0)
+            return None
+        name = re.match(r'[a-z]*', rest).group(0)
+        argument = rest[len(name):]
+        if name in ('s', 'substitute'):
+            return self.ex_substitute(first, last, argument or '/')
+        if name in ('norm', 'normal'):
+            if range_text:
+                raise ExError("A range is not supported by :normal")
+            self.run_keys(split_keys(argument.lstrip()))
+            # an unfinished command ends as if Esc was typed
+            if self.mode == 'visual':
+                self.leave_visual()
+            elif self.mode == 'command':
+                self.leave_command()
+            elif self.mode == 'insert':
+                self.enter_normal()
+            return None
+        if name in ('g', 'global', 'v', 'vglobal'):
+            # :g! is :v
+            invert = name.startswith('v') != argument.startswith('!')
+            if not range_text:
+                first, last = 1, self.line_count()
+            return self.ex_global(first, last, argument.lstrip('!'), invert)
+        raise ExError(f"Not an editor command: {cmd}")
+
+    # EX COMMANDS : they work on the document through offsets, as one edit
+    def check_writable(self):
+        """raises ExError if the text cannot be edited"""
+        if self.view is not None:
+            raise ExError("The file is read-only in large file mode")
+        if str(self.text.cget('state')) == 'disabled':
+            raise ExError("The file is still loading")
+
+    def ex_pattern(self, pattern, nocase = False):
+        """return: the compiled pattern of an ex command ; an empty pattern is the last one used"""
+        if not pattern:
+            if self.last_pattern is None:
+                raise ExError("No previous pattern")
+            pattern = self.last_pattern
+        self.last_pattern = pattern
+        try:
+            return compile_pattern(pattern, True, nocase)
+        except re.error as error:
+            raise ExError(f"Invalid pattern: {error}")
+
+    def lines_text(self, first, last):
+        """return: (offset of line 'first', text of lines first..last without the last newline)"""
+        if self.buffer is not None:
+            table = self.buffer.table
+            offset = table.line_start(first)
+            return offset, table.get_text(offset, table.line_end(last))
+        offset = len(self.text.get('1.0', f"{first}.0"))
+        return offset, self.text.get(f"{first}.0", f"{last}.0 lineend")
+
+    def replace_offsets(self, start, end, text):
+        """replaces the document between two offsets, as one undo step"""
+        if self.buffer is not None:
+            self.buffer.replace(start, end, text)
+            return
+        self.text.edit_separator()
+        self.text.replace(f"1.0+{start}c", f"1.0+{end}c", text)
+        self.text.edit_separator()
+
+    def delete_offsets(self, ranges):
+        """deletes sorted [start, end) offset ranges, from the bottom up, as one undo step"""
+        if self.buffer is not None:
+            self.buffer.delete_ranges(ranges)
+            return
+        indexes = []
+        for start, end in ranges:
+            indexes += (f"1.0+{start}c", f"1.0+{end}c")
+        self.text.edit_separator()
+        self.text.delete(*indexes)
+        self.text.edit_separator()
+
+    def ex_substitute(self, first, last, argument):
+        """:[range]s/pattern/replacement/[flags] : one regex pass over the lines of the range,
+        written back as a single replace (one undo step).
+        flags : g every match of a line (the first one otherwise), i / I ignore / match case,
+        n only count the matches, e no error if there is no match"""
+        self.check_writable()
+        pattern, template, flags = parse_substitute(argument)
+        compiled = self.ex_pattern(pattern, 'i' in flags and 'I' not in flags)
+        offset, span = self.lines_text(first, last)
+        try:
+            count, start, end, new = replace_all(span, compiled, template, regex = True,
+                                                 first_in_line = 'g' not in flags, skip_empty = False)
+        except (re.error, IndexError) as error:
+            raise ExError(f"Invalid replacement: {error}")
+        if not count:
+            if 'e' in flags:
+                return None
+            raise ExError(f"Pattern not found: {compiled.pattern}")
+        if 'n' in flags:
+            return f"{count} match{'es' if count > 1 else ''} on lines {first}-{last}"
+
+        # the cursor ends on the line of the last substitution, as in vim
+        last_line = first + span.count('\n', 0, start) + new.count('\n')
+        self.replace_offsets(offset + start, offset + end, new)
+        self.go_to_line_col(last_line, 0)
+        return f"{count} substitution{'s' if count > 1 else ''} on lines {first}-{last}"
+
+    def ex_global(self, first, last, argument, invert):
+        """:[range]g/pattern/command (:v or :g! : the lines without a match) : the lines are found
+        in one scan of the range, then the command runs on all of them at once.
+        commands : d deletes the lines, s/pattern/replacement/[flags] substitutes in them,
+        none (or p) counts them"""
+        pattern, command = parse_global(argument)
+        compiled = self.ex_pattern(pattern)
+        offset, span = self.lines_text(first, last)
+        lines = matching_lines(span, compiled, invert)
+        if not lines:
+            raise ExError(f"Pattern not found: {compiled.pattern}")
+
+        if command in ('', 'p'):
+            self.go_to_line_col(first + span.count('\n', 0, lines[0][0]), 0)
+            return f"{len(lines)} matching line{'s' if len(lines) > 1 else ''}"
+        self.check_writable()
+        if command == 'd':
+            return self.global_delete(offset, span, first, lines)
+        name = re.match(r'[a-z]*', command).group(0)
+        if name in ('s', 'substitute'):
+            return self.global_substitute(offset, span, first, lines, command[len(name):] or '/')
+        raise ExError(f"Not supported after :g: {command}")
+
+    def global_delete(self, offset, span, first, lines):
+        """:g/pattern/d : deletes the lines (offsets in 'span') with one multi-range delete"""
+        size = len(self.buffer) if self.buffer is not None else len(self.text.get('1.0', 'end-1c'))
+        ranges = []
+        for start, end in lines:
+            start, end = offset + start, min(offset + end + 1, size)
+            # neighbour lines make one range
+            if ranges and start <= ranges[-1][1]:
+                ranges[-1] = (ranges[-1][0], end)
+            else:
+                ranges.append((start, end))
+        # the last line has no newline of its own : the one before it goes instead
+        start, end = ranges[-1]
+        if end == size and start > 0:
+            ranges[-1] = (start - 1, end)
+
+        # as in vim, the register keeps the last line deleted
+        start, end = lines[-1]
+        self.registers.delete(span[start:end], True, self.register, self.text)
+        self.delete_offsets(ranges)
+        self.go_to_line_col(first + span.count('\n', 0, start) - len(lines) + 1, 0)
+        return f"{len(lines)} fewer line{'s' if len(lines) > 1 else ''}"
+
+    def global_substitute(self, offset, span, first, lines, argument):
+        """:g/pattern/s/a/b/ : substitutes in the lines (offsets in 'span'), written back as one replace"""
+        pattern, template, flags = parse_substitute(argument)
+        compiled = self.ex_pattern(pattern, 'i' in flags and 'I' not in flags)
+        parts = []
+        count = 0
+        changed = 0
+        position = lines[0][0]
+        for start, end in lines:
+            try:
+                new, number = compiled.subn(template, span[start:end], 0 if 'g' in flags else 1)
+            except (re.error, IndexError) as error:
+                raise ExError(f"Invalid replacement: {error}")
+            if number:
+                parts.append(span[position:start])
+                parts.append(new)
+                position = end
+                count += number
+                changed += 1
+        if not count:
+            if 'e' in flags:
+                return None
+            raise ExError(f"Pattern not found: {compiled.pattern}")
+        if 'n' in flags:
+            return f"{count} match{'es' if count > 1 else ''} on {changed} line{'s' if changed > 1 else ''}"
+
+        new = ''.join(parts)
+        start = lines[0][0]
+        self.replace_offsets(offset + start, offset + position, new)
+        self.go_to_line_col(first + span.count('\n', 0, start) + new.count('\n'), 0)
+        return f"{count} substitution{'s' if count > 1 else ''} on {changed} line{'s' if changed > 1 else ''}"
 
     def on_escape(self, event):
         """Esc : return to normal mode from insert | command mode"""
         if not self.enabled:
             return None
-        
-        # if vim mode is enabled, and is in insert|command mode, we enter back normal 
-        if self.mode == 'insert' or self.mode == 'command':
+        self.record_key('<Esc>')
+
+        # if vim mode is enabled, and is in insert|command mode, we enter back normal
+        # (in normal mode : the command being typed is dropped)
+        if self.mode == 'command':
+            self.leave_command()
+        elif self.mode == 'visual':
+            self.leave_visual()
+        else:
             self.enter_normal()
-            return "break"
         return "break"
-    
+
 
 
 # implemented functions so far:
-# NORMAL MODE: -navigating (h,j,k,l);
-#              -deleting one character (x)
-#              -cutting options (dd, dk, dh)
-#              -copying options (yy, y$) - gotta make yy always create another line
-#              -pasting (P)
+# NORMAL MODE: -[count][operator][count][motion] commands, read by a trie (see COMMANDS)
+#              -navigating (h,j,k,l, arrows, 0, $, gg, G)
+#              -words : w, b, e, W, B, E ; text objects iw, aw, iW, aW after an operator (ciw, daw)
+#              -deleting characters (x)
+#              -operators : delete (d), copy (y), change (c) ; doubled for whole lines (dd, yy, cc)
+#              -registers ("a .. "z, "A appends, "0 .. "9, "-, "+ / "* clipboard, "_) : "ayy, "ap
+#              -pasting (p)
+#              -undo (u), redo (Ctrl + r)
 #              -open line and change to insert mode (o)
-#              -repeat last change (.) 
+#              -repeat last change (.)
+#              -macros : recording (q{register} ... q), replaying ([count]@{register}, @@)
+#              -search : / and ? (incremental, python regular expressions), n and N
+#              -indenting (>>, <<, >{motion}, <{motion})
+# VISUAL MODE: -characters (v), lines (V), block (Ctrl + v) ; o goes to the other end
+#              -d / x, y, c, >, <, ~ on the selection, each one edit ; I / A on every line of a block
+#              -: runs an ex command on the lines of the selection ('<,'>)
 
-# INSERT MODE: 
+# INSERT MODE:
 
 # COMMAND MODE: -saving the file (:w)
 #               -exiting the file (:q)
-#               -save and exit (:wq)
\ No newline at end of file
+#               -save and exit (:wq)
+#               -ranges : N, ., $, 'a / '< '>, +N / -N offsets, N,M and % (whole file)
+#               -going to a line (:N)
+#               -running keys of normal mode (:normal {keys})
+#               -substitution (:[range]s/pattern/replacement/[flags], flags g i I n e)
+#               -global commands (:[range]g/pattern/command, :v or :g! for the other lines) : d, s, p
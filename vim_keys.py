@@ -0,0 +1,182 @@
+import re
+
+# keysyms of the keys that only modify other keys
+MODIFIERS = {
+    'Shift_L', 'Shift_R', 'Control_L', 'Control_R', 'Alt_L', 'Alt_R',
+    'Meta_L', 'Meta_R', 'Super_L', 'Super_R', 'Caps_Lock', 'ISO_Level3_Shift',
+}
+
+# keys that are written with a name, like vim does
+SPECIAL_KEYS = {
+    'Left' : '<Left>',
+    'Right' : '<Right>',
+    'Up' : '<Up>',
+    'Down' : '<Down>',
+    'Escape' : '<Esc>',
+    'Return' : '<CR>',
+    'BackSpace' : '<BS>',
+    'Tab' : '<Tab>',
+    'Delete' : '<Del>',
+}
+
+# event state bit of the Control key
+CONTROL = 0x4
+
+# one key of a key sequence : a character or a <name>
+KEY = re.compile(r'<[^<>]+>|.', re.DOTALL)
+
+
+def key_token(event):
+    """return: the key of a tk event as vim writes it ('x', '$', '<C-r>', '<Left>'),
+    None for a lone modifier key"""
+    keysym = event.keysym
+    if keysym in MODIFIERS:
+        return None
+    if event.state & CONTROL and len(keysym) == 1:
+        return f"<C-{keysym.lower()}>"
+    if keysym in SPECIAL_KEYS:
+        return SPECIAL_KEYS[keysym]
+    if event.char and event.char.isprintable():
+        return event.char
+    return f"<{keysym}>"
+
+
+def split_keys(keys):
+    """return: the tuple of keys of a key sequence ('gg' -> ('g', 'g'), '<C-r>' -> ('<C-r>',))"""
+    return tuple(KEY.findall(keys))
+
+
+class Command():
+    """One entry of a dispatch table.
+    kind : 'motion' (moves the cursor, or gives the range of an operator), 'operator' (works on
+    the range of a motion : d, y, c), 'object' (gives a whole range to an operator : iw, aw)
+    or 'action' (anything else : x, p, u ...)
+    function : name of the VimEditor method running the command
+    linewise : a motion working on whole lines (j, k, G) ; inclusive : a motion whose target
+    character is part of the range ($, e) ; change : the command is repeated by '.'
+    argument : the command is followed by one more key, given to the function (r{char}, q{reg})"""
+    def __init__(self, kind, function, linewise = False, inclusive = False, change = False, argument = False):
+        self.kind = kind
+        self.function = function
+        self.linewise = linewise
+        self.inclusive = inclusive
+        self.change = change
+        self.argument = argument
+
+
+class KeyTrie():
+    """Key sequences -> commands.
+    A node is a dict of its children, the command of a complete sequence is stored under None.
+    Finding a command is one dict lookup per key, whatever the number of commands"""
+    def __init__(self, table = None):
+        self.root = {}
+        for keys, command in (table or {}).items():
+            self.add(keys, command)
+
+    def add(self, keys, command):
+        """adds a command ; no sequence may be the beginning of another one"""
+        node = self.root
+        for key in split_keys(keys):
+            node = node.setdefault(key, {})
+        node[None] = command
+
+
+class Parsed():
+    """A complete command : ["register][count][operator][count]command[argument]
+    count : None if no count was typed ; register : None if no register was given"""
+    def __init__(self, count, operator, command, argument, keys, register = None):
+        self.count = count
+        self.operator = operator
+        self.command = command
+        self.argument = argument
+        self.keys = keys
+        self.register = register
+
+
+class CommandParser():
+    """Reads the keys of normal mode one at a time, following the [count][operator][count][motion]
+    grammar. A doubled operator (dd, yy, cc) works on whole lines : its command is None"""
+    def __init__(self, normal, pending):
+        # normal : every command ; pending : what can follow an operator (motions)
+        self.normal = normal
+        self.pending = pending
+        self.reset()
+
+    def reset(self):
+        """forgets the keys typed so far"""
+        self.keys = ''
+        self.count = ''
+        self.operator = None
+        self.operator_key = None
+        self.operator_count = ''
+        self.command = None
+        self.register = None
+        self.register_pending = False
+        self.node = self.normal.root
+
+    def idle(self):
+        """return: True if no command is being typed"""
+        return not self.keys
+
+    def total_count(self):
+        """return: the count of the command (both counts multiply, as in 2d3w), None if none was typed"""
+        if not self.count and not self.operator_count:
+            return None
+        return int(self.count or 1) * int(self.operator_count or 1)
+
+    def complete(self, command, argument = None):
+        """return: the parsed command, the parser is ready for the next one"""
+        parsed = Parsed(self.total_count(), self.operator, command, argument, self.keys, self.register)
+        self.reset()
+        return parsed
+
+    def feed(self, key):
+        """return: None while the command is incomplete, the Parsed command once it is complete,
+        False if the keys are not a command (the parser starts again)"""
+        self.keys += key
+
+        # the key following a command that takes an argument
+        if self.command is not None:
+            return self.complete(self.command, key)
+        # the name of the register following '"'
+        if self.register_pending:
+            self.register = key
+            self.register_pending = False
+            return None
+
+        at_start = self.node is self.normal.root or self.node is self.pending.root
+        if at_start:
+            # "x : the register the command works with
+            if key == '"' and self.operator is None and self.register is None:
+                self.register_pending = True
+                return None
+            count = 'operator_count' if self.operator is not None else 'count'
+            # a count : '0' alone is a motion (start of line)
+            if key.isdigit() and (key != '0' or getattr(self, count)):
+                setattr(self, count, getattr(self, count) + key)
+                return None
+            # dd, yy, cc : the operator on whole lines
+            if self.operator is not None and key == self.operator_key:
+                return self.complete(None)
+
+        node = self.node.get(key)
+        if node is None:
+            self.reset()
+            return False
+        command = node.get(None)
+        if command is None:
+            self.node = node
+            return None
+
+        if command.kind == 'operator':
+            if self.operator is not None:
+                self.reset()
+                return False
+            self.operator = command
+            self.operator_key = key
+            self.node = self.pending.root
+            return None
+        if command.argument:
+            self.command = command
+            return None
+        return self.complete(command)
@@ -0,0 +1,109 @@
+import re
+from bisect import bisect_left, bisect_right
+
+# a word : a run of letters, digits and underscores, or a run of other non-blank characters
+WORD = re.compile(r'\w+|[^\w\s]+')
+# a WORD (vim's W, B, E) : any run of non-blank characters
+BIG_WORD = re.compile(r'\S+')
+
+# the pieces of a line for the text objects : words and the blanks between them
+ITEMS = re.compile(r'\w+|[^\w\s]+|\s+')
+BIG_ITEMS = re.compile(r'\S+|\s+')
+
+# Every function reads a line once, as a string, and finds the words of it with one regex pass.
+# The ones crossing lines get the lines from get_line(line) -> text, lines being 1-based like tk.Text
+
+
+def word_spans(text, big = False):
+    """return: (starts, ends) lists of the words of a line"""
+    starts = []
+    ends = []
+    for match in (BIG_WORD if big else WORD).finditer(text):
+        starts.append(match.start())
+        ends.append(match.end())
+    return starts, ends
+
+
+def next_word_start(get_line, line_count, line, col, big = False):
+    """w | W : (line, col) of the next word start ; an empty line counts as a word, as in vim
+    return: None if there is no word after the cursor"""
+    starts, ends = word_spans(get_line(line), big)
+    i = bisect_right(starts, col)
+    if i < len(starts):
+        return line, starts[i]
+    while line < line_count:
+        line += 1
+        text = get_line(line)
+        if not text:
+            return line, 0
+        starts, ends = word_spans(text, big)
+        if starts:
+            return line, starts[0]
+    return None
+
+
+def prev_word_start(get_line, line, col, big = False):
+    """b | B : (line, col) of the start of the word before the cursor (of the word the cursor is in
+    if it is not at its start) ; an empty line counts as a word
+    return: None at the start of the text"""
+    starts, ends = word_spans(get_line(line), big)
+    i = bisect_left(starts, col)
+    if i > 0:
+        return line, starts[i - 1]
+    while line > 1:
+        line -= 1
+        text = get_line(line)
+        if not text:
+            return line, 0
+        starts, ends = word_spans(text, big)
+        if starts:
+            return line, starts[-1]
+    return None
+
+
+def word_end(get_line, line_count, line, col, big = False, exclusive = False):
+    """e | E : (line, col) of the last character of the word ending after the cursor ;
+    exclusive : the position just after it instead (Ctrl + Right)
+    return: None if there is no word after the cursor"""
+    # e moves at least one character, Ctrl + Right stops at the end of the current word
+    after = col if exclusive else col + 1
+    starts, ends = word_spans(get_line(line), big)
+    i = bisect_right(ends, after)
+    while i == len(ends):
+        if line >= line_count:
+            return None
+        line += 1
+        starts, ends = word_spans(get_line(line), big)
+        i = 0
+    return line, ends[i] if exclusive else ends[i] - 1
+
+
+def text_object(text, col, around = False, big = False, count = 1):
+    """iw | aw | iW | aW : (start, end) columns of 'count' words of a line around the cursor.
+    inner : the word (or the blanks) under the cursor and the pieces following it up to 'count' ;
+    around : the words with the blanks after them (before them if there are none after)"""
+    items = [match.span() for match in (BIG_ITEMS if big else ITEMS).finditer(text)]
+    if not items:
+        return 0, 0
+    starts = [start for start, end in items]
+    i = max(0, min(bisect_right(starts, col) - 1, len(items) - 1))
+
+    def blank(index):
+        return text[items[index][0]].isspace()
+
+    if not around:
+        last = min(len(items) - 1, i + count - 1)
+        return items[i][0], items[last][1]
+
+    # on blanks : the blanks and the words after them
+    first = i
+    if blank(i):
+        i += 1
+    last = min(len(items) - 1, i + 2 * (count - 1))
+    if last + 1 < len(items) and blank(last + 1) and not blank(first):
+        # the blanks after the last word
+        last += 1
+    elif not blank(first) and first > 0 and blank(first - 1):
+        # no blanks after : the ones before the first word go instead
+        first -= 1
+    return items[first][0], items[last][1]